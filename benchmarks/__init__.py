@@ -0,0 +1 @@
+"""Offline throughput and latency benchmarks against local provider stand-ins."""
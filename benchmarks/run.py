@@ -0,0 +1,488 @@
+"""Offline benchmark harness.
+
+Starts the local provider stand-ins from ``benchmarks.servers`` and drives
+each entry point through them, one fresh process per (scenario, provider)
+so peak RSS is measured in isolation:
+
+- ``generate``: sequential ``ImageClient.generate`` calls
+- ``batch``: one ``ImageClient.generate_batch`` over every prompt
+- ``cli``: ``langlearn-imagegen --json generate-batch`` subprocesses
+- ``mcp``: concurrent ``generate_image`` MCP tool calls
+- ``deferred``: one OpenAI Batch API job (``submit_deferred`` then
+  ``collect_deferred``); OpenAI only
+
+``--storage`` picks where the providers write images: ``local`` files,
+``memory`` buffers, or ``s3`` uploads to the server's object store.
+
+Results are written as JSON (schema below) and can be compared against a
+previous run::
+
+    uv run python -m benchmarks.run --images 50 --output bench.json
+    uv run python -m benchmarks.run --baseline bench.json --max-regression 0.15
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections.abc import Callable, Sequence
+from dataclasses import asdict, dataclass
+from datetime import UTC, datetime
+from pathlib import Path
+from typing import Any
+
+from benchmarks.servers import MockProviderServer, MockServerConfig
+
+SCHEMA_VERSION = 1
+SCENARIOS = ("generate", "batch", "cli", "mcp", "deferred")
+PROVIDERS = ("openai", "pexels")
+# Scenarios that only exist for some providers.
+SCENARIO_PROVIDERS = {"deferred": ("openai",)}
+
+_REPO_ROOT = Path(__file__).resolve().parents[1]
+
+
+@dataclass(frozen=True)
+class ScenarioConfig:
+    scenario: str
+    provider: str
+    images: int
+    workers: int
+    cli_rounds: int
+    output_dir: str
+
+
+@dataclass
+class ScenarioResult:
+    scenario: str
+    provider: str
+    images: int
+    errors: int
+    seconds: float
+    images_per_sec: float
+    latency_unit: str
+    latency_ms: dict[str, float]
+    peak_rss_mb: float | None
+    bytes_written: int
+
+
+def _percentile(ordered: Sequence[float], fraction: float) -> float:
+    if not ordered:
+        return 0.0
+    position = (len(ordered) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    weight = position - lower
+    return ordered[lower] * (1 - weight) + ordered[upper] * weight
+
+
+def _latency_summary(samples: Sequence[float]) -> dict[str, float]:
+    ordered = sorted(sample * 1000 for sample in samples)
+    return {
+        "p50": round(_percentile(ordered, 0.50), 3),
+        "p95": round(_percentile(ordered, 0.95), 3),
+        "p99": round(_percentile(ordered, 0.99), 3),
+        "mean": round(sum(ordered) / len(ordered), 3) if ordered else 0.0,
+        "max": round(ordered[-1], 3) if ordered else 0.0,
+    }
+
+
+def _peak_rss_mb() -> float | None:
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    )
+    # ru_maxrss is reported in KiB on Linux and in bytes on macOS.
+    scale = 1 if sys.platform == "darwin" else 1024
+    return round(peak * scale / (1024 * 1024), 2)
+
+
+def _bytes_written(directory: Path) -> int:
+    return sum(path.stat().st_size for path in directory.rglob("*") if path.is_file())
+
+
+def _prompts(config: ScenarioConfig, round_index: int = 0) -> list[str]:
+    # Distinct prompts so single-flight coalescing never merges requests.
+    return [
+        f"benchmark {config.scenario} round {round_index} image {index}"
+        for index in range(config.images)
+    ]
+
+
+def _requests(config: ScenarioConfig) -> list[Any]:
+    from langlearn_types import ImageProviderId, ImageRequest
+
+    return [
+        ImageRequest(
+            prompt=prompt,
+            provider=ImageProviderId(config.provider),
+            metadata={"output_dir": config.output_dir},
+        )
+        for prompt in _prompts(config)
+    ]
+
+
+class _TimedProvider:
+    """Records how long each generate_image call takes."""
+
+    def __init__(self, inner: Any) -> None:
+        self._inner = inner
+        self._lock = threading.Lock()
+        self.samples: list[float] = []
+
+    def generate_image(self, request: Any) -> Any:
+        started = time.perf_counter()
+        try:
+            return self._inner.generate_image(request)
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self.samples.append(elapsed)
+
+    def generate_images(self, requests: Sequence[Any]) -> list[Any]:
+        return [self.generate_image(request) for request in requests]
+
+
+def _run_generate(config: ScenarioConfig) -> tuple[list[float], int, str]:
+    from langlearn_imagegen import ImageClient
+
+    samples: list[float] = []
+    errors = 0
+    with ImageClient(provider_name=config.provider) as client:
+        for request in _requests(config):
+            started = time.perf_counter()
+            try:
+                client.generate(request)
+            except Exception:
+                errors += 1
+            samples.append(time.perf_counter() - started)
+    return samples, errors, "item"
+
+
+def _run_batch(config: ScenarioConfig) -> tuple[list[float], int, str]:
+    from langlearn_imagegen import BatchGenerationError, ImageClient, get_provider
+
+    timed = _TimedProvider(get_provider(config.provider))
+    client = ImageClient(
+        provider_name=config.provider, provider=timed, max_workers=config.workers
+    )
+    try:
+        client.generate_batch(_requests(config))
+        errors = 0
+    except BatchGenerationError as exc:
+        errors = sum(1 for item in exc.items if not item.ok)
+    return timed.samples, errors, "item"
+
+
+def _run_cli(config: ScenarioConfig) -> tuple[list[float], int, str]:
+    samples: list[float] = []
+    errors = 0
+    for round_index in range(config.cli_rounds):
+        prompts_file = Path(config.output_dir) / f".prompts-{round_index}.txt"
+        prompts_file.write_text("\n".join(_prompts(config, round_index)) + "\n")
+        command = [
+            sys.executable,
+            "-m",
+            "langlearn_imagegen",
+            "--json",
+            "generate-batch",
+            str(prompts_file),
+            "--provider",
+            config.provider,
+            "--output-dir",
+            config.output_dir,
+            "--workers",
+            str(config.workers),
+        ]
+        started = time.perf_counter()
+        completed = subprocess.run(command, capture_output=True, text=True)
+        samples.append(time.perf_counter() - started)
+        prompts_file.unlink()
+        try:
+            errors += int(json.loads(completed.stdout)["failed"])
+        except (ValueError, KeyError):
+            errors += config.images
+    return samples, errors, "invocation"
+
+
+def _run_mcp(config: ScenarioConfig) -> tuple[list[float], int, str]:
+    from langlearn_imagegen.server import mcp
+
+    async def call(prompt: str, gate: asyncio.Semaphore) -> tuple[float, bool]:
+        async with gate:
+            started = time.perf_counter()
+            try:
+                await mcp.call_tool(
+                    "generate_image",
+                    {
+                        "prompt": prompt,
+                        "provider": config.provider,
+                        "output_dir": config.output_dir,
+                    },
+                )
+                ok = True
+            except Exception:
+                ok = False
+            return time.perf_counter() - started, ok
+
+    async def drive() -> list[tuple[float, bool]]:
+        gate = asyncio.Semaphore(config.workers)
+        return list(await asyncio.gather(*(call(p, gate) for p in _prompts(config))))
+
+    outcomes = asyncio.run(drive())
+    return (
+        [elapsed for elapsed, _ in outcomes],
+        sum(1 for _, ok in outcomes if not ok),
+        "item",
+    )
+
+
+def _run_deferred(config: ScenarioConfig) -> tuple[list[float], int, str]:
+    from langlearn_imagegen.providers.openai import OpenAIProvider
+
+    provider = OpenAIProvider()
+    started = time.perf_counter()
+    try:
+        job = provider.submit_deferred(_requests(config))
+        outcomes = provider.collect_deferred(job, poll_interval=0.05)
+    finally:
+        provider.close()
+    errors = sum(1 for outcome in outcomes if isinstance(outcome, Exception))
+    return [time.perf_counter() - started], errors, "job"
+
+
+_RUNNERS: dict[str, Callable[[ScenarioConfig], tuple[list[float], int, str]]] = {
+    "generate": _run_generate,
+    "batch": _run_batch,
+    "cli": _run_cli,
+    "mcp": _run_mcp,
+    "deferred": _run_deferred,
+}
+
+
+def run_scenario(config: ScenarioConfig) -> ScenarioResult:
+    """Run one scenario in the current process."""
+    started = time.perf_counter()
+    samples, errors, unit = _RUNNERS[config.scenario](config)
+    seconds = time.perf_counter() - started
+    attempted = config.images * (config.cli_rounds if unit == "invocation" else 1)
+    succeeded = max(0, attempted - errors)
+    return ScenarioResult(
+        scenario=config.scenario,
+        provider=config.provider,
+        images=succeeded,
+        errors=errors,
+        seconds=round(seconds, 4),
+        images_per_sec=round(succeeded / seconds, 3) if seconds else 0.0,
+        latency_unit=unit,
+        latency_ms=_latency_summary(samples),
+        peak_rss_mb=_peak_rss_mb(),
+        bytes_written=_bytes_written(Path(config.output_dir)),
+    )
+
+
+def _child_env(server: MockProviderServer, storage: str = "local") -> dict[str, str]:
+    env = dict(os.environ)
+    for name in (
+        "LANGLEARN_IMAGEGEN_CACHE_DIR",
+        "LANGLEARN_IMAGEGEN_FALLBACK_PROVIDER",
+        "LANGLEARN_IMAGEGEN_PROVIDER",
+        "LANGLEARN_IMAGEGEN_STORAGE",
+    ):
+        env.pop(name, None)
+    env.update(
+        {
+            "OPENAI_API_KEY": "benchmark",
+            "OPENAI_BASE_URL": server.openai_base_url,
+            "PEXELS_API_KEY": "benchmark",
+            "PEXELS_API_URL": server.pexels_api_url,
+            # Client-side pacing would measure the limiter, not the code path.
+            "LANGLEARN_IMAGEGEN_RATE_LIMIT_OPENAI": "off",
+            "LANGLEARN_IMAGEGEN_RATE_LIMIT_PEXELS": "off",
+        }
+    )
+    if storage == "s3":
+        env.update(
+            {
+                "LANGLEARN_IMAGEGEN_STORAGE": "s3://benchmark/images",
+                "LANGLEARN_IMAGEGEN_S3_ENDPOINT": server.s3_endpoint,
+                "AWS_ACCESS_KEY_ID": "benchmark",
+                "AWS_SECRET_ACCESS_KEY": "benchmark",
+            }
+        )
+    elif storage != "local":
+        env["LANGLEARN_IMAGEGEN_STORAGE"] = storage
+    return env
+
+
+def _spawn(config: ScenarioConfig, env: dict[str, str]) -> ScenarioResult:
+    completed = subprocess.run(
+        [
+            sys.executable,
+            "-m",
+            "benchmarks.run",
+            "--child",
+            json.dumps(asdict(config)),
+        ],
+        capture_output=True,
+        text=True,
+        cwd=_REPO_ROOT,
+        env=env,
+        check=False,
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(
+            f"{config.scenario}/{config.provider} failed:\n{completed.stderr}"
+        )
+    return ScenarioResult(**json.loads(completed.stdout.splitlines()[-1]))
+
+
+def _git_commit() -> str | None:
+    completed = subprocess.run(
+        ["git", "rev-parse", "--short", "HEAD"],
+        capture_output=True,
+        text=True,
+        cwd=_REPO_ROOT,
+        check=False,
+    )
+    return completed.stdout.strip() or None
+
+
+def run_suite(args: argparse.Namespace) -> dict[str, Any]:
+    """Run every requested scenario and return the JSON report."""
+    from langlearn_imagegen import __version__
+
+    server_config = MockServerConfig(
+        latency=args.latency,
+        jitter=args.jitter,
+        payload_bytes=args.payload_bytes,
+        error_rate=args.error_rate,
+        seed=args.seed,
+    )
+    results: list[ScenarioResult] = []
+    with MockProviderServer(server_config) as server:
+        env = _child_env(server, args.storage)
+        for scenario in args.scenarios:
+            for provider in args.providers:
+                if provider not in SCENARIO_PROVIDERS.get(scenario, PROVIDERS):
+                    continue
+                with tempfile.TemporaryDirectory(prefix="imagegen-bench-") as tmp:
+                    config = ScenarioConfig(
+                        scenario=scenario,
+                        provider=provider,
+                        images=args.images,
+                        workers=args.workers,
+                        cli_rounds=args.cli_rounds,
+                        output_dir=tmp,
+                    )
+                    result = _spawn(config, env)
+                results.append(result)
+                print(
+                    f"{scenario:>8} {provider:<7} {result.images_per_sec:9.2f} img/s"
+                    f"  p95 {result.latency_ms['p95']:9.1f} ms"
+                    f"  rss {result.peak_rss_mb} MiB",
+                    file=sys.stderr,
+                )
+    return {
+        "schema": SCHEMA_VERSION,
+        "version": __version__,
+        "git_commit": _git_commit(),
+        "timestamp": datetime.now(UTC).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "server": asdict(server_config),
+        "images": args.images,
+        "workers": args.workers,
+        "storage": args.storage,
+        "results": [asdict(result) for result in results],
+    }
+
+
+def compare(
+    report: dict[str, Any], baseline: dict[str, Any], max_regression: float
+) -> list[str]:
+    """Return a line per scenario whose throughput fell beyond the tolerance."""
+    previous = {
+        (item["scenario"], item["provider"]): item for item in baseline["results"]
+    }
+    regressions: list[str] = []
+    for item in report["results"]:
+        before = previous.get((item["scenario"], item["provider"]))
+        if before is None or not before["images_per_sec"]:
+            continue
+        change = item["images_per_sec"] / before["images_per_sec"] - 1
+        line = (
+            f"{item['scenario']}/{item['provider']}: "
+            f"{before['images_per_sec']:.2f} -> {item['images_per_sec']:.2f} img/s "
+            f"({change:+.1%}), p95 {before['latency_ms']['p95']:.1f} -> "
+            f"{item['latency_ms']['p95']:.1f} ms"
+        )
+        print(line, file=sys.stderr)
+        if change < -max_regression:
+            regressions.append(line)
+    return regressions
+
+
+def _parse_args(argv: Sequence[str] | None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS)
+    )
+    parser.add_argument(
+        "--providers", nargs="+", choices=PROVIDERS, default=list(PROVIDERS)
+    )
+    parser.add_argument("--images", type=int, default=40)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--cli-rounds", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="seconds")
+    parser.add_argument("--payload-bytes", type=int, default=256 * 1024)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--storage", choices=("local", "memory", "s3"), default="local")
+    parser.add_argument("--output", type=Path, help="write the JSON report here")
+    parser.add_argument("--baseline", type=Path, help="earlier report to compare")
+    parser.add_argument(
+        "--max-regression",
+        type=float,
+        default=0.10,
+        help="fail when throughput drops by more than this fraction",
+    )
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    args = _parse_args(argv)
+    if args.child:
+        result = run_scenario(ScenarioConfig(**json.loads(args.child)))
+        print(json.dumps(asdict(result)))
+        return 0
+
+    report = run_suite(args)
+    encoded = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(encoded + "\n")
+    else:
+        print(encoded)
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text())
+        if compare(report, baseline, args.max_regression):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,446 @@
+"""Local stand-ins for the OpenAI images and Pexels search/photo endpoints.
+
+One threaded HTTP server answers both APIs (and a MinIO-style object
+store) so benchmarks run without network access or API keys:
+
+- ``POST /v1/images/generations`` returns ``n`` images as ``b64_json`` or,
+  with ``response_format=url``, links to ``/files/<name>.png``.
+- ``GET /v1/search`` returns ``per_page`` photos whose ``src`` URLs point at
+  ``/photos/<id>.jpeg``.
+- ``GET /files/...`` and ``GET /photos/...`` stream ``payload_bytes`` of
+  image data.
+- ``POST /v1/files``, ``POST /v1/batches``, ``GET /v1/batches/<id>`` and
+  ``GET /v1/files/<id>/content`` implement the Batch API file workflow for
+  image generation. A batch reports ``in_progress`` until ``batch_delay``
+  seconds after it was created, then ``completed``; each of its lines
+  fails with probability ``error_rate`` and lands in the error file.
+- ``/s3/<bucket>/<key>`` accepts S3 ``PUT`` object and the multipart
+  upload calls (create, upload part, complete, abort), path-style, from
+  any SigV4-signed client. Objects are kept in memory.
+
+Every provider request sleeps for ``latency`` (plus up to ``jitter``) seconds and
+fails with a 503 with probability ``error_rate``.
+"""
+
+from __future__ import annotations
+
+import base64
+import itertools
+import json
+import os
+import random
+import threading
+import time
+from dataclasses import dataclass
+from email.parser import BytesParser
+from email.policy import HTTP
+from functools import cached_property
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import TracebackType
+from typing import Self
+from urllib.parse import parse_qs, urlsplit
+
+__all__ = ["MockProviderServer", "MockServerConfig"]
+
+_STREAM_CHUNK = 64 * 1024
+
+
+@dataclass(frozen=True)
+class MockServerConfig:
+    """Behaviour of the stand-in endpoints."""
+
+    latency: float = 0.05
+    jitter: float = 0.0
+    payload_bytes: int = 256 * 1024
+    error_rate: float = 0.0
+    seed: int | None = None
+    batch_delay: float = 0.0
+
+
+@dataclass
+class _Batch:
+    id: str
+    input_file_id: str
+    endpoint: str
+    created_at: float
+    output_file_id: str
+    error_file_id: str | None
+    total: int
+    failed: int
+
+
+class _Payload:
+    def __init__(self, size: int) -> None:
+        self._size = size
+
+    @cached_property
+    def raw(self) -> bytes:
+        return os.urandom(self._size)
+
+    @cached_property
+    def b64(self) -> str:
+        return base64.b64encode(self.raw).decode("ascii")
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: _Server
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format: str, *args: object) -> None:
+        return
+
+    def do_POST(self) -> None:
+        length = int(self.headers.get("Content-Length", "0"))
+        raw = self.rfile.read(length)
+        if self.path.startswith("/s3/"):
+            self._s3(raw)
+            return
+        if not self._delay_or_fail():
+            return
+        path = urlsplit(self.path).path
+        if path == "/v1/images/generations":
+            self._send_json(200, self._images(json.loads(raw or b"{}")))
+        elif path == "/v1/files":
+            self._send_json(200, self._upload(raw))
+        elif path == "/v1/batches":
+            self._send_json(200, self._create_batch(json.loads(raw or b"{}")))
+        else:
+            self._send_json(404, {"error": {"message": "not found"}})
+
+    def _images(self, body: dict[str, object]) -> dict[str, object]:
+        count = int(str(body.get("n", 1)))
+        if body.get("response_format") == "url":
+            host = self.headers.get("Host", "127.0.0.1")
+            items = [
+                {"url": f"http://{host}/files/{time.time_ns()}_{i}.png"}
+                for i in range(count)
+            ]
+        else:
+            items = [{"b64_json": self.server.payload.b64} for _ in range(count)]
+        for item in items:
+            item["revised_prompt"] = str(body.get("prompt", ""))
+        return {"created": int(time.time()), "data": items}
+
+    def _upload(self, raw: bytes) -> dict[str, object]:
+        content_type = self.headers.get("Content-Type", "")
+        message = BytesParser(policy=HTTP).parsebytes(
+            f"Content-Type: {content_type}\r\n\r\n".encode() + raw
+        )
+        fields: dict[str, tuple[str | None, bytes]] = {}
+        for part in message.iter_parts():
+            name = part.get_param("name", header="content-disposition")
+            payload = part.get_payload(decode=True)
+            fields[str(name)] = (part.get_filename(), bytes(payload or b""))
+        filename, content = fields["file"]
+        purpose = fields.get("purpose", (None, b""))[1].decode()
+        file_id = self.server.store_file(content)
+        return _file_object(file_id, filename or "upload", purpose, len(content))
+
+    def _create_batch(self, body: dict[str, object]) -> dict[str, object]:
+        lines = self.server.files[str(body["input_file_id"])].decode().splitlines()
+        outputs: list[str] = []
+        errors: list[str] = []
+        for line in filter(None, lines):
+            request = json.loads(line)
+            record: dict[str, object] = {
+                "id": f"batch_req_{time.time_ns()}",
+                "custom_id": request["custom_id"],
+            }
+            if self.server.config.error_rate and self.server.random_uniform(
+                0.0, 1.0
+            ) < (self.server.config.error_rate):
+                record["response"] = {
+                    "status_code": 500,
+                    "body": {"error": {"message": "injected failure"}},
+                }
+                errors.append(json.dumps(record))
+            else:
+                record["response"] = {
+                    "status_code": 200,
+                    "body": self._images(request["body"]),
+                }
+                outputs.append(json.dumps(record))
+        batch = _Batch(
+            id=f"batch_{next(self.server.ids)}",
+            input_file_id=str(body["input_file_id"]),
+            endpoint=str(body.get("endpoint", "")),
+            created_at=time.time(),
+            output_file_id=self.server.store_file("\n".join(outputs).encode()),
+            error_file_id=self.server.store_file("\n".join(errors).encode())
+            if errors
+            else None,
+            total=len(outputs) + len(errors),
+            failed=len(errors),
+        )
+        self.server.batches[batch.id] = batch
+        return self._batch_object(batch)
+
+    def _batch_object(self, batch: _Batch) -> dict[str, object]:
+        done = time.time() >= batch.created_at + self.server.config.batch_delay
+        return {
+            "id": batch.id,
+            "object": "batch",
+            "endpoint": batch.endpoint,
+            "input_file_id": batch.input_file_id,
+            "completion_window": "24h",
+            "created_at": int(batch.created_at),
+            "status": "completed" if done else "in_progress",
+            "output_file_id": batch.output_file_id if done else None,
+            "error_file_id": batch.error_file_id if done else None,
+            "request_counts": {
+                "total": batch.total,
+                "completed": batch.total - batch.failed if done else 0,
+                "failed": batch.failed if done else 0,
+            },
+        }
+
+    def do_GET(self) -> None:
+        if not self._delay_or_fail():
+            return
+        parts = urlsplit(self.path)
+        batch_id = parts.path.removeprefix("/v1/batches/")
+        file_id = parts.path.removeprefix("/v1/files/").removesuffix("/content")
+        if batch_id in self.server.batches:
+            self._send_json(200, self._batch_object(self.server.batches[batch_id]))
+        elif parts.path.endswith("/content") and file_id in self.server.files:
+            self._send_bytes(self.server.files[file_id], "application/jsonl")
+        elif parts.path == "/v1/search":
+            query = parse_qs(parts.query)
+            per_page = int(query.get("per_page", ["15"])[0])
+            self._send_json(200, self._search_page(per_page))
+        elif parts.path.startswith(("/photos/", "/files/")):
+            self._send_image()
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_PUT(self) -> None:
+        length = int(self.headers.get("Content-Length", "0"))
+        self._s3(self.rfile.read(length))
+
+    def do_DELETE(self) -> None:
+        self._s3(b"")
+
+    def _s3(self, raw: bytes) -> None:
+        # Storage is local to the benchmark, so no latency or failures.
+        parts = urlsplit(self.path)
+        key = parts.path.removeprefix("/s3/")
+        query = {
+            name: values[0]
+            for name, values in parse_qs(parts.query, keep_blank_values=True).items()
+        }
+        server = self.server
+        if not self.headers.get("Authorization", "").startswith("AWS4-HMAC-SHA256"):
+            self._send_xml(403, "<Error><Code>AccessDenied</Code></Error>")
+        elif self.command == "POST" and "uploads" in query:
+            upload_id = server.start_upload()
+            self._send_xml(
+                200,
+                "<InitiateMultipartUploadResult>"
+                f"<UploadId>{upload_id}</UploadId>"
+                "</InitiateMultipartUploadResult>",
+            )
+        elif self.command == "PUT" and "uploadId" in query:
+            etag = server.store_part(query["uploadId"], int(query["partNumber"]), raw)
+            self._send_xml(200, "", {"ETag": etag})
+        elif self.command == "POST" and "uploadId" in query:
+            server.complete_upload(query["uploadId"], key)
+            self._send_xml(200, "<CompleteMultipartUploadResult/>")
+        elif self.command == "DELETE" and "uploadId" in query:
+            server.uploads.pop(query["uploadId"], None)
+            self._send_xml(204, "")
+        elif self.command == "PUT":
+            server.objects[key] = raw
+            self._send_xml(200, "", {"ETag": f'"{len(raw)}"'})
+        else:
+            self._send_xml(404, "<Error><Code>NoSuchKey</Code></Error>")
+
+    def _send_xml(
+        self, status: int, body: str, headers: dict[str, str] | None = None
+    ) -> None:
+        encoded = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/xml")
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(encoded)))
+        self.end_headers()
+        self.wfile.write(encoded)
+
+    def _search_page(self, per_page: int) -> dict[str, object]:
+        host = self.headers.get("Host", "127.0.0.1")
+        photos = [
+            {
+                "id": photo_id,
+                "url": f"http://{host}/photo/{photo_id}",
+                "photographer": "Benchmark",
+                "photographer_url": f"http://{host}/@benchmark",
+                "src": {"original": f"http://{host}/photos/{photo_id}.jpeg"},
+            }
+            for photo_id in range(1, per_page + 1)
+        ]
+        return {"page": 1, "per_page": per_page, "photos": photos}
+
+    def _send_image(self) -> None:
+        data = self.server.payload.raw
+        self.send_response(200)
+        self.send_header("Content-Type", "image/jpeg")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        view = memoryview(data)
+        for start in range(0, len(view), _STREAM_CHUNK):
+            self.wfile.write(view[start : start + _STREAM_CHUNK])
+
+    def _delay_or_fail(self) -> bool:
+        config = self.server.config
+        delay = config.latency
+        if config.jitter:
+            delay += self.server.random_uniform(0.0, config.jitter)
+        if delay > 0:
+            time.sleep(delay)
+        self.server.record_request()
+        if config.error_rate and self.server.random_uniform(0.0, 1.0) < (
+            config.error_rate
+        ):
+            self._send_json(
+                503,
+                {"error": {"message": "injected failure", "type": "server_error"}},
+            )
+            return False
+        return True
+
+    def _send_bytes(self, data: bytes, content_type: str) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_json(self, status: int, payload: object) -> None:
+        encoded = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(encoded)))
+        self.end_headers()
+        self.wfile.write(encoded)
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, config: MockServerConfig) -> None:
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.config = config
+        self.payload = _Payload(config.payload_bytes)
+        self.requests = 0
+        self.files: dict[str, bytes] = {}
+        self.batches: dict[str, _Batch] = {}
+        self.objects: dict[str, bytes] = {}
+        self.uploads: dict[str, dict[int, bytes]] = {}
+        self.ids = itertools.count(1)
+        self._random = random.Random(config.seed)
+        self._lock = threading.Lock()
+
+    def store_file(self, content: bytes) -> str:
+        file_id = f"file-{next(self.ids)}"
+        with self._lock:
+            self.files[file_id] = content
+        return file_id
+
+    def start_upload(self) -> str:
+        upload_id = f"upload-{next(self.ids)}"
+        with self._lock:
+            self.uploads[upload_id] = {}
+        return upload_id
+
+    def store_part(self, upload_id: str, number: int, data: bytes) -> str:
+        with self._lock:
+            self.uploads[upload_id][number] = data
+        return f'"{upload_id}-{number}"'
+
+    def complete_upload(self, upload_id: str, key: str) -> None:
+        with self._lock:
+            parts = self.uploads.pop(upload_id)
+            self.objects[key] = b"".join(parts[number] for number in sorted(parts))
+
+    def random_uniform(self, low: float, high: float) -> float:
+        with self._lock:
+            return self._random.uniform(low, high)
+
+    def record_request(self) -> None:
+        with self._lock:
+            self.requests += 1
+
+
+def _file_object(
+    file_id: str, filename: str, purpose: str, size: int
+) -> dict[str, object]:
+    return {
+        "id": file_id,
+        "object": "file",
+        "bytes": size,
+        "created_at": int(time.time()),
+        "filename": filename,
+        "purpose": purpose,
+        "status": "processed",
+    }
+
+
+class MockProviderServer:
+    """Run the stand-in endpoints on a background thread.
+
+    Use as a context manager; ``url`` is the server root, ``openai_base_url``
+    and ``pexels_api_url`` are what the providers should be pointed at, and
+    ``s3_endpoint`` is an S3-compatible endpoint for the storage sink.
+    """
+
+    def __init__(self, config: MockServerConfig | None = None) -> None:
+        self._server = _Server(config or MockServerConfig())
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="mock-provider", daemon=True
+        )
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host!s}:{port}"
+
+    @property
+    def openai_base_url(self) -> str:
+        return f"{self.url}/v1"
+
+    @property
+    def pexels_api_url(self) -> str:
+        return f"{self.url}/v1"
+
+    @property
+    def s3_endpoint(self) -> str:
+        return f"{self.url}/s3"
+
+    @property
+    def requests(self) -> int:
+        return self._server.requests
+
+    @property
+    def stored_bytes(self) -> int:
+        """Bytes held by the object store stand-in."""
+        return sum(len(data) for data in self._server.objects.values())
+
+    def start(self) -> Self:
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    def __enter__(self) -> Self:
+        return self.start()
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self.stop()
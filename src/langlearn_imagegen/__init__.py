@@ -1,8 +1,53 @@
 from __future__ import annotations
 
-from .core import ImageClient, generate
-from .providers import get_provider
+from importlib import import_module
+from typing import TYPE_CHECKING, Any
 
-__all__ = ["ImageClient", "__version__", "generate", "get_provider"]
+if TYPE_CHECKING:
+    from .core import (
+        BatchGenerationError,
+        BatchItemResult,
+        ImageClient,
+        agenerate,
+        generate,
+    )
+    from .providers import get_provider, invalidate_provider_cache
+
+__all__ = [
+    "BatchGenerationError",
+    "BatchItemResult",
+    "ImageClient",
+    "__version__",
+    "agenerate",
+    "generate",
+    "get_provider",
+    "invalidate_provider_cache",
+]
 
 __version__ = "0.1.0"
+
+# Resolved on first access so that importing a submodule (or just reading
+# __version__) does not pay for asyncio, the orchestration layer and the
+# provider registry.
+_LAZY_EXPORTS = {
+    "BatchGenerationError": ".core",
+    "BatchItemResult": ".core",
+    "ImageClient": ".core",
+    "agenerate": ".core",
+    "generate": ".core",
+    "get_provider": ".providers",
+    "invalidate_provider_cache": ".providers",
+}
+
+
+def __getattr__(name: str) -> Any:
+    module = _LAZY_EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(import_module(module, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> list[str]:
+    return sorted(set(globals()) | set(__all__))
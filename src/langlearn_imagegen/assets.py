@@ -0,0 +1,250 @@
+"""SQLite catalog of generated images and their provider metadata."""
+
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from functools import lru_cache
+from pathlib import Path
+from types import TracebackType
+from typing import Any, Self
+
+from langlearn_types import ImageProviderId, ImageRequest, ImageResult
+
+__all__ = [
+    "ASSET_INDEX_ENV",
+    "DEFAULT_LIST_LIMIT",
+    "Asset",
+    "AssetIndex",
+    "asset_index_from_env",
+]
+
+ASSET_INDEX_ENV = "LANGLEARN_IMAGEGEN_ASSET_INDEX"
+
+DEFAULT_LIST_LIMIT = 100
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS assets (
+    path TEXT PRIMARY KEY,
+    request_hash TEXT NOT NULL,
+    prompt TEXT NOT NULL,
+    language TEXT,
+    cultural_context TEXT,
+    provider TEXT NOT NULL,
+    model TEXT,
+    revised_prompt TEXT,
+    metadata TEXT NOT NULL,
+    created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS assets_prompt ON assets (prompt, language);
+CREATE INDEX IF NOT EXISTS assets_hash ON assets (request_hash);
+CREATE INDEX IF NOT EXISTS assets_provider ON assets (provider, created);
+"""
+
+_COLUMNS = (
+    "path, request_hash, prompt, language, cultural_context, provider, model, "
+    "revised_prompt, metadata, created"
+)
+
+
+@dataclass(frozen=True)
+class Asset:
+    """One indexed image and the ImageResult metadata it was written with."""
+
+    path: Path
+    request_hash: str
+    prompt: str
+    language: str | None
+    cultural_context: str | None
+    provider: str
+    model: str | None
+    revised_prompt: str | None
+    metadata: dict[str, str] = field(default_factory=dict[str, str])
+    created: float = 0.0
+
+    def to_result(self) -> ImageResult:
+        return ImageResult(
+            path=self.path,
+            prompt=self.prompt,
+            provider=ImageProviderId(self.provider),
+            revised_prompt=self.revised_prompt,
+            model=self.model,
+            metadata=dict(self.metadata),
+        )
+
+    def as_dict(self) -> dict[str, object]:
+        return {
+            "path": str(self.path),
+            "request_hash": self.request_hash,
+            "prompt": self.prompt,
+            "language": self.language,
+            "cultural_context": self.cultural_context,
+            "provider": self.provider,
+            "model": self.model,
+            "revised_prompt": self.revised_prompt,
+            "metadata": dict(self.metadata),
+            "created": self.created,
+        }
+
+
+class AssetIndex:
+    """Maps prompt, language, provider and request hash to written images.
+
+    ImageClient adds a row for every image it delivers (re-writing a path
+    replaces its row), so callers can ask whether an image for a prompt
+    already exists without scanning the output directory. Rows whose file
+    has since been deleted are skipped by queries and dropped by ``prune``.
+    """
+
+    def __init__(self, path: Path | str) -> None:
+        self._path = Path(path)
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self._path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(_SCHEMA)
+
+    @property
+    def path(self) -> Path:
+        return self._path
+
+    def add(
+        self, request_hash: str, request: ImageRequest, result: ImageResult
+    ) -> None:
+        """Record ``result`` as the image for ``request``."""
+        row = (
+            str(result.path.resolve()),
+            request_hash,
+            request.prompt,
+            request.language,
+            request.cultural_context,
+            result.provider.value,
+            result.model,
+            result.revised_prompt,
+            json.dumps(dict(result.metadata)),
+            time.time(),
+        )
+        with self._lock, self._db:
+            self._db.execute(
+                f"INSERT OR REPLACE INTO assets ({_COLUMNS}) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                row,
+            )
+
+    def lookup(
+        self,
+        prompt: str,
+        *,
+        language: str | None = None,
+        provider: str | None = None,
+    ) -> list[Asset]:
+        """Return existing images for ``prompt``, newest first."""
+        return self._select(
+            {"prompt": prompt, "language": language, "provider": provider}
+        )
+
+    def get(self, request_hash: str) -> list[Asset]:
+        """Return existing images generated for a request fingerprint."""
+        return self._select({"request_hash": request_hash})
+
+    def list_assets(
+        self,
+        *,
+        language: str | None = None,
+        provider: str | None = None,
+        limit: int = DEFAULT_LIST_LIMIT,
+        offset: int = 0,
+    ) -> list[Asset]:
+        """Page through existing images, newest first."""
+        return self._select(
+            {"language": language, "provider": provider}, limit=limit, offset=offset
+        )
+
+    def prune(self) -> int:
+        """Drop rows whose image no longer exists; return how many."""
+        with self._lock:
+            paths = [row[0] for row in self._db.execute("SELECT path FROM assets")]
+            missing = [(path,) for path in paths if not Path(path).exists()]
+            with self._db:
+                self._db.executemany("DELETE FROM assets WHERE path = ?", missing)
+        return len(missing)
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self.close()
+
+    def _select(
+        self,
+        filters: dict[str, str | None],
+        *,
+        limit: int | None = None,
+        offset: int = 0,
+    ) -> list[Asset]:
+        clauses = [f"{column} = ?" for column, value in filters.items() if value]
+        params: list[str | int] = [value for value in filters.values() if value]
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        query = f"SELECT {_COLUMNS} FROM assets{where} ORDER BY created DESC"
+        if limit is not None:
+            query += " LIMIT ? OFFSET ?"
+            params += [limit, offset]
+        with self._lock:
+            rows = self._db.execute(query, params).fetchall()
+        # Deleted files are filtered per page, so a page can come back short
+        # until prune() is run.
+        assets = (_asset(row) for row in rows)
+        return [asset for asset in assets if asset.path.exists()]
+
+
+def _asset(row: tuple[Any, ...]) -> Asset:
+    (
+        path,
+        request_hash,
+        prompt,
+        language,
+        cultural_context,
+        provider,
+        model,
+        revised_prompt,
+        metadata,
+        created,
+    ) = row
+    return Asset(
+        path=Path(path),
+        request_hash=request_hash,
+        prompt=prompt,
+        language=language,
+        cultural_context=cultural_context,
+        provider=provider,
+        model=model,
+        revised_prompt=revised_prompt,
+        metadata=json.loads(metadata),
+        created=float(created),
+    )
+
+
+def asset_index_from_env() -> AssetIndex | None:
+    """Return the process-wide asset index configured through the environment."""
+    path = os.environ.get(ASSET_INDEX_ENV)
+    if not path:
+        return None
+    return _shared_index(path)
+
+
+@lru_cache(maxsize=4)
+def _shared_index(path: str) -> AssetIndex:
+    return AssetIndex(path)
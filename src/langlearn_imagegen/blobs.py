@@ -0,0 +1,86 @@
+"""Content-addressed blob store shared by every output path."""
+
+from __future__ import annotations
+
+import hashlib
+import os
+from functools import lru_cache
+from pathlib import Path
+
+from langlearn_imagegen.metrics import timed_stage
+from langlearn_imagegen.utils import file_sha256, link_atomic, write_atomic
+
+__all__ = ["BLOB_DIR_ENV", "BlobStore", "blob_store_from_env"]
+
+BLOB_DIR_ENV = "LANGLEARN_IMAGEGEN_BLOB_DIR"
+
+
+class BlobStore:
+    """Keeps one copy of each distinct image and links output paths to it.
+
+    Blobs are named by the SHA-256 of their bytes. An alias (for example a
+    Pexels photo id and size) can point at a blob, so a download is skipped
+    when its alias is already stored. Output paths become hardlinks to the
+    blob, falling back to a reflink and then a copy where the filesystem
+    cannot link.
+    """
+
+    def __init__(self, directory: Path | str) -> None:
+        self._directory = Path(directory)
+
+    @property
+    def directory(self) -> Path:
+        return self._directory
+
+    def lookup(self, alias: str) -> Path | None:
+        """Return the blob stored under ``alias``, if it still exists."""
+        try:
+            name = self._alias_path(alias).read_text("utf-8").strip()
+        except OSError:
+            return None
+        blob = self._directory / name[:2] / name
+        return blob if blob.exists() else None
+
+    def adopt(self, path: Path, alias: str | None = None) -> tuple[Path, str]:
+        """Store the file at ``path`` and link ``path`` to its blob.
+
+        When identical bytes are already stored, ``path`` is replaced by a
+        link to the existing blob. Returns the blob and the link method.
+        """
+        with timed_stage("blob_store"):
+            digest = file_sha256(path)
+            name = f"{digest}{path.suffix}"
+            blob = self._directory / name[:2] / name
+            blob.parent.mkdir(parents=True, exist_ok=True)
+            if blob.exists():
+                method = link_atomic(blob, path)
+            else:
+                method = link_atomic(path, blob)
+            if alias is not None:
+                alias_path = self._alias_path(alias)
+                alias_path.parent.mkdir(parents=True, exist_ok=True)
+                write_atomic(alias_path, name.encode("utf-8"))
+        return blob, method
+
+    def link(self, blob: Path, destination: Path) -> str:
+        """Materialise ``blob`` at ``destination``; return the link method."""
+        with timed_stage("blob_link"):
+            destination.parent.mkdir(parents=True, exist_ok=True)
+            return link_atomic(blob, destination)
+
+    def _alias_path(self, alias: str) -> Path:
+        key = hashlib.sha256(alias.encode("utf-8")).hexdigest()
+        return self._directory / "aliases" / key[:2] / key
+
+
+def blob_store_from_env() -> BlobStore | None:
+    """Return the process-wide blob store configured through the environment."""
+    directory = os.environ.get(BLOB_DIR_ENV)
+    if not directory:
+        return None
+    return _shared_store(directory)
+
+
+@lru_cache(maxsize=4)
+def _shared_store(directory: str) -> BlobStore:
+    return BlobStore(directory)
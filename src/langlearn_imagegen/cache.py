@@ -0,0 +1,254 @@
+"""Content-addressed on-disk cache of generated images."""
+
+from __future__ import annotations
+
+import contextlib
+import json
+import os
+import threading
+import time
+from functools import lru_cache
+from pathlib import Path
+from typing import Any
+
+from langlearn_types import ImageProviderId, ImageRequest, ImageResult
+
+from langlearn_imagegen.blobs import BLOB_DIR_ENV
+from langlearn_imagegen.utils import (
+    OUTPUT_LOCATION_KEYS,
+    copy_atomic,
+    link_atomic,
+    resolve_output_path,
+    write_atomic,
+)
+
+__all__ = [
+    "CACHE_DIR_ENV",
+    "CACHE_MAX_BYTES_ENV",
+    "CACHE_TTL_ENV",
+    "DEFAULT_MAX_BYTES",
+    "DEFAULT_TTL_SECONDS",
+    "ResultCache",
+    "result_cache_from_env",
+]
+
+CACHE_DIR_ENV = "LANGLEARN_IMAGEGEN_CACHE_DIR"
+CACHE_TTL_ENV = "LANGLEARN_IMAGEGEN_CACHE_TTL"
+CACHE_MAX_BYTES_ENV = "LANGLEARN_IMAGEGEN_CACHE_MAX_BYTES"
+
+DEFAULT_TTL_SECONDS = 30 * 24 * 60 * 60
+DEFAULT_MAX_BYTES = 2 * 1024 * 1024 * 1024
+
+# Eviction trims to this fraction of max_bytes so puts do not rescan each time.
+_EVICTION_TARGET = 0.9
+
+
+class ResultCache:
+    """Stores image bytes plus ImageResult metadata under a request hash.
+
+    Keys come from ``utils.request_fingerprint``. Entries older than ``ttl``
+    seconds are treated as misses, and once the cache grows past
+    ``max_bytes`` the least recently used entries are evicted. Pass None
+    for either limit to disable it.
+
+    Images are copied in and out of the cache. With ``link=True`` they are
+    hardlinked (or reflinked) instead, which saves space but means an
+    output edited in place also changes the cached blob; the environment
+    enables it together with the blob store.
+    """
+
+    def __init__(
+        self,
+        directory: Path | str,
+        *,
+        ttl: float | None = DEFAULT_TTL_SECONDS,
+        max_bytes: int | None = DEFAULT_MAX_BYTES,
+        link: bool = False,
+    ) -> None:
+        self._directory = Path(directory)
+        self._link = link
+        self._ttl = ttl
+        self._max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._size: int | None = None
+
+    @property
+    def directory(self) -> Path:
+        return self._directory
+
+    def lookup(
+        self, key: str, request: ImageRequest, provider: str
+    ) -> ImageResult | None:
+        """Materialise a cached result at the request's output path."""
+        record_path = self._record_path(key)
+        record = self._read_record(record_path)
+        if record is None:
+            return None
+        try:
+            blob_path = record_path.with_name(str(record["blob"]))
+            extension = str(record["extension"])
+            provider_id = ImageProviderId(record["provider"])
+        except (KeyError, TypeError, ValueError):
+            # Truncated or foreign records are dropped rather than fatal.
+            self._remove(key)
+            return None
+        if self._expired(record) or not blob_path.exists():
+            self._remove(key)
+            return None
+
+        output_path = resolve_output_path(
+            request.prompt, provider, request.metadata, extension
+        )
+        self._place(blob_path, output_path)
+        with contextlib.suppress(OSError):
+            os.utime(record_path)
+
+        cached_metadata: dict[str, str] = record.get("metadata", {})
+        metadata = {
+            name: value
+            for name, value in cached_metadata.items()
+            if name not in OUTPUT_LOCATION_KEYS
+        }
+        metadata.update(request.metadata)
+        metadata["cache"] = "hit"
+        return ImageResult(
+            path=output_path,
+            prompt=request.prompt,
+            provider=provider_id,
+            revised_prompt=record.get("revised_prompt"),
+            model=record.get("model"),
+            metadata=metadata,
+        )
+
+    def store(self, key: str, result: ImageResult) -> None:
+        """Copy a freshly generated result into the cache."""
+        extension = result.path.suffix.lstrip(".") or "bin"
+        record_path = self._record_path(key)
+        blob_path = record_path.with_suffix(f".{extension}")
+        record_path.parent.mkdir(parents=True, exist_ok=True)
+        self._place(result.path, blob_path)
+
+        record = {
+            "blob": blob_path.name,
+            "extension": extension,
+            "created": time.time(),
+            "provider": result.provider.value,
+            "prompt": result.prompt,
+            "revised_prompt": result.revised_prompt,
+            "model": result.model,
+            "metadata": dict(result.metadata),
+        }
+        write_atomic(record_path, json.dumps(record).encode("utf-8"))
+
+        added = blob_path.stat().st_size + record_path.stat().st_size
+        with self._lock:
+            if self._size is not None:
+                self._size += added
+            over_budget = (
+                self._max_bytes is not None and self._current_size() > self._max_bytes
+            )
+        if over_budget:
+            self.evict()
+
+    def evict(self) -> int:
+        """Drop expired entries, then LRU entries beyond max_bytes."""
+        with self._lock:
+            entries: list[tuple[float, str, int]] = []
+            removed = 0
+            for record_path in self._directory.glob("*/*.json"):
+                key = record_path.stem
+                record = self._read_record(record_path)
+                if record is None or self._expired(record):
+                    self._remove(key)
+                    removed += 1
+                    continue
+                try:
+                    blob_path = record_path.with_name(str(record["blob"]))
+                    size = record_path.stat().st_size + blob_path.stat().st_size
+                    last_used = record_path.stat().st_mtime
+                except (KeyError, TypeError, OSError):
+                    self._remove(key)
+                    removed += 1
+                    continue
+                entries.append((last_used, key, size))
+
+            total = sum(size for _, _, size in entries)
+            if self._max_bytes is not None and total > self._max_bytes:
+                target = int(self._max_bytes * _EVICTION_TARGET)
+                for _, key, size in sorted(entries):
+                    if total <= target:
+                        break
+                    self._remove(key)
+                    total -= size
+                    removed += 1
+            self._size = total
+            return removed
+
+    def clear(self) -> None:
+        """Remove every cached entry."""
+        with self._lock:
+            for record_path in self._directory.glob("*/*.json"):
+                self._remove(record_path.stem)
+            self._size = 0
+
+    def _place(self, source: Path, destination: Path) -> None:
+        if self._link:
+            link_atomic(source, destination)
+        else:
+            copy_atomic(source, destination)
+
+    def _current_size(self) -> int:
+        if self._size is None:
+            self._size = sum(
+                path.stat().st_size
+                for path in self._directory.glob("*/[!.]*")
+                if path.is_file()
+            )
+        return self._size
+
+    def _expired(self, record: dict[str, Any]) -> bool:
+        if self._ttl is None:
+            return False
+        return time.time() - float(record.get("created", 0.0)) > self._ttl
+
+    def _record_path(self, key: str) -> Path:
+        return self._directory / key[:2] / f"{key}.json"
+
+    def _read_record(self, record_path: Path) -> dict[str, Any] | None:
+        try:
+            record: dict[str, Any] = json.loads(record_path.read_text("utf-8"))
+        except (OSError, ValueError):
+            return None
+        return record
+
+    def _remove(self, key: str) -> None:
+        shard = self._directory / key[:2]
+        for path in shard.glob(f"{key}.*"):
+            with contextlib.suppress(OSError):
+                path.unlink()
+
+
+def result_cache_from_env() -> ResultCache | None:
+    """Return the process-wide cache configured through the environment.
+
+    Cached images are linked rather than copied only when the blob store
+    (``LANGLEARN_IMAGEGEN_BLOB_DIR``) is enabled as well.
+    """
+    directory = os.environ.get(CACHE_DIR_ENV)
+    if not directory:
+        return None
+    ttl = os.environ.get(CACHE_TTL_ENV)
+    max_bytes = os.environ.get(CACHE_MAX_BYTES_ENV)
+    return _shared_cache(
+        directory,
+        float(ttl) if ttl else DEFAULT_TTL_SECONDS,
+        int(max_bytes) if max_bytes else DEFAULT_MAX_BYTES,
+        bool(os.environ.get(BLOB_DIR_ENV)),
+    )
+
+
+@lru_cache(maxsize=8)
+def _shared_cache(
+    directory: str, ttl: float, max_bytes: int, link: bool
+) -> ResultCache:
+    return ResultCache(directory, ttl=ttl, max_bytes=max_bytes, link=link)
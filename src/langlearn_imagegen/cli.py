@@ -1,11 +1,15 @@
 from __future__ import annotations
 
+import contextlib
+import csv
 import json
-from collections.abc import Mapping
-from dataclasses import asdict
+import sys
+from collections import deque
+from collections.abc import Callable, Iterable, Iterator, Mapping
+from dataclasses import asdict, replace
 from importlib import import_module
 from pathlib import Path
-from typing import Any, cast
+from typing import TYPE_CHECKING, Any, cast
 
 import typer
 from langlearn_types import (
@@ -16,13 +20,52 @@ from langlearn_types import (
     ImageResult,
 )
 
-from langlearn_imagegen import __version__, generate
+from langlearn_imagegen import __version__
+from langlearn_imagegen.assets import (
+    ASSET_INDEX_ENV,
+    DEFAULT_LIST_LIMIT,
+    AssetIndex,
+    asset_index_from_env,
+)
+from langlearn_imagegen.defaults import DEFAULT_MAX_WORKERS
+
+if TYPE_CHECKING:
+    from langlearn_imagegen.core import BatchItemResult
+    from langlearn_imagegen.providers.openai import OpenAIProvider
+    from langlearn_imagegen.providers.openai_batch import DeferredBatch
+
+# Commands import the generation stack (asyncio, provider SDKs, Pillow)
+# inside their bodies, so version, doctor, dry-run and list-providers start
+# without it; test_smoke.py guards the import-time budget.
 
 app = typer.Typer(help="langlearn-imagegen: langlearn-imagegen CLI")
 
 json_output_enabled = False
 
 METADATA_OPTION = typer.Option(None, "--metadata", "-m")
+PROMPTS_FILE_ARGUMENT = typer.Argument(
+    None,
+    help="Prompts (one per line), JSONL or CSV requests; reads stdin when "
+    "omitted or '-'.",
+)
+INPUT_FORMATS = ("auto", "lines", "jsonl", "csv")
+INPUT_FORMAT_OPTION = typer.Option(
+    "auto",
+    "--input-format",
+    help="lines, jsonl or csv; auto picks by file suffix (stdin: JSONL if the "
+    "first line is an object, else lines).",
+)
+MANIFEST_OPTION = typer.Option(
+    None, "--manifest", help="JSONL file recording each finished item."
+)
+DEFERRED_OPTION = typer.Option(
+    None,
+    "--deferred",
+    help="Submit through the OpenAI Batch API and save the job to this file.",
+)
+INDEX_OPTION = typer.Option(
+    None, "--index", help=f"Asset index database (default: ${ASSET_INDEX_ENV})."
+)
 
 
 def _emit(payload: Mapping[str, object], text: str) -> None:
@@ -32,6 +75,21 @@ def _emit(payload: Mapping[str, object], text: str) -> None:
         typer.echo(text)
 
 
+def _provider_id(provider: str | None) -> ImageProviderId | None:
+    """Pin requests to a concrete provider; ``routed`` leaves them unpinned."""
+    if provider is None:
+        return None
+    known = {member.value for member in ImageProviderId}
+    if provider.lower() in known:
+        return ImageProviderId(provider.lower())
+    from langlearn_imagegen.providers import PROVIDER_REGISTRY
+
+    if provider.lower() not in PROVIDER_REGISTRY:
+        names = ", ".join(sorted(PROVIDER_REGISTRY))
+        raise typer.BadParameter(f"unknown provider {provider!r}; expected {names}")
+    return None
+
+
 def _parse_metadata(pairs: list[str] | None) -> dict[str, str]:
     metadata: dict[str, str] = {}
     if not pairs:
@@ -56,6 +114,7 @@ def _merge_metadata(
     pexels_size: str | None = None,
     orientation: str | None = None,
     color: str | None = None,
+    postprocess: str | None = None,
 ) -> dict[str, str]:
     merged = dict(base)
     if output_path:
@@ -76,6 +135,13 @@ def _merge_metadata(
         merged["orientation"] = orientation
     if color:
         merged["color"] = color
+    if postprocess:
+        from langlearn_imagegen.postprocess import POSTPROCESS_KEY, PostProcessSpec
+
+        try:
+            merged[POSTPROCESS_KEY] = str(PostProcessSpec.parse(postprocess))
+        except ValueError as exc:
+            raise typer.BadParameter(str(exc)) from exc
     return merged
 
 
@@ -96,6 +162,243 @@ def _result_payload(result: ImageResult) -> dict[str, object]:
     }
 
 
+def _batch_item_payload(item: BatchItemResult) -> dict[str, object]:
+    return {
+        "index": item.index,
+        "prompt": item.request.prompt,
+        "ok": item.ok,
+        "result": _result_payload(item.result) if item.result is not None else None,
+        "error": str(item.error) if item.error is not None else None,
+        "evaluation": _evaluation_payload(item.evaluation)
+        if item.evaluation is not None
+        else None,
+    }
+
+
+def _batch_item_line(item: BatchItemResult) -> str:
+    if item.error is not None or item.result is None:
+        return f"error {item.request.prompt!r}: {item.error}"
+    if not item.ok and item.evaluation is not None:
+        reason = item.evaluation.reason or "evaluation failed"
+        return f"rejected {item.result.path}: {reason}"
+    if item.result.metadata.get("manifest") == "resumed":
+        return f"resumed {item.result.path}"
+    return f"ok {item.result.path}"
+
+
+def _has_entries(path: Path) -> bool:
+    return path.exists() and path.stat().st_size > 0
+
+
+def _asset_index(path: Path | None, stack: contextlib.ExitStack) -> AssetIndex | None:
+    # An index opened from --index is closed with ``stack``; the shared one
+    # from the environment stays open for the process.
+    if path is None:
+        return asset_index_from_env()
+    return stack.enter_context(AssetIndex(path))
+
+
+def _require_asset_index(path: Path | None, stack: contextlib.ExitStack) -> AssetIndex:
+    index = _asset_index(path, stack)
+    if index is None:
+        raise typer.BadParameter(f"pass --index or set {ASSET_INDEX_ENV}")
+    return index
+
+
+# ImageRequest fields a JSONL object or CSV column may set; any other key
+# becomes request metadata (e.g. filename, output_dir, pexels_size).
+_RECORD_FIELDS = ("size", "style", "language", "cultural_context", "quality")
+
+
+def _input_lines(source: Path | None) -> Iterator[str]:
+    if source is None or str(source) == "-":
+        yield from sys.stdin
+        return
+    with source.open(encoding="utf-8", newline="") as handle:
+        yield from handle
+
+
+def _detect_format(
+    source: Path | None, lines: Iterator[str]
+) -> tuple[str, Iterator[str]]:
+    if source is not None and str(source) != "-":
+        suffix = source.suffix.lower()
+        if suffix in {".jsonl", ".ndjson"}:
+            return "jsonl", lines
+        return ("csv" if suffix == ".csv" else "lines"), lines
+    head: list[str] = []
+    for line in lines:
+        head.append(line)
+        if line.strip():
+            break
+    found = "jsonl" if head and head[-1].lstrip().startswith("{") else "lines"
+    return found, _chain(head, lines)
+
+
+def _chain(head: list[str], rest: Iterator[str]) -> Iterator[str]:
+    yield from head
+    yield from rest
+
+
+def _iter_requests(
+    source: Path | None, input_format: str, defaults: ImageRequest
+) -> Iterator[ImageRequest | typer.BadParameter]:
+    """Read requests one at a time, so input of any length streams through.
+
+    A malformed record is yielded as the BadParameter describing it, so
+    one bad line does not abort the records around it.
+    """
+    if input_format not in INPUT_FORMATS:
+        raise typer.BadParameter(f"--input-format must be one of {INPUT_FORMATS}")
+    lines = _input_lines(source)
+    if input_format == "auto":
+        input_format, lines = _detect_format(source, lines)
+    if input_format == "csv":
+        reader = csv.DictReader(lines)
+        for record in reader:
+            yield _parse_record(record, defaults, reader.line_num)
+        return
+    for number, line in enumerate(lines, start=1):
+        text = line.strip()
+        if not text:
+            continue
+        if input_format == "lines":
+            yield replace(defaults, prompt=text, metadata=dict(defaults.metadata))
+            continue
+        try:
+            record = json.loads(text)
+        except ValueError as exc:
+            yield typer.BadParameter(f"line {number}: invalid JSON: {exc}")
+            continue
+        if not isinstance(record, dict):
+            yield typer.BadParameter(f"line {number}: expected a JSON object")
+            continue
+        fields = cast("dict[str | None, object]", record)
+        yield _parse_record(fields, defaults, number)
+
+
+def _parse_record(
+    record: Mapping[str | None, object], defaults: ImageRequest, line: int
+) -> ImageRequest | typer.BadParameter:
+    try:
+        return _request_from_record(record, defaults, line)
+    except typer.BadParameter as exc:
+        return exc
+
+
+def _with_rejected(
+    records: Iterable[ImageRequest | typer.BadParameter],
+    run: Callable[[Iterator[ImageRequest]], Iterator[BatchItemResult]],
+) -> Iterator[BatchItemResult]:
+    """Run the valid records as a batch and report the others as failed items.
+
+    Every item is indexed by its position in the input. Rejected records
+    are reported as soon as the batch yields after reading them.
+    """
+    from langlearn_imagegen.core import BatchItemResult
+
+    positions: dict[int, int] = {}
+    rejected: deque[BatchItemResult] = deque()
+
+    def requests() -> Iterator[ImageRequest]:
+        accepted = 0
+        for position, record in enumerate(records):
+            if isinstance(record, typer.BadParameter):
+                prompt = ImageRequest(prompt="")
+                item = BatchItemResult(index=position, request=prompt, error=record)
+                rejected.append(item)
+                continue
+            positions[accepted] = position
+            accepted += 1
+            yield record
+
+    for item in run(requests()):
+        while rejected:
+            yield rejected.popleft()
+        yield replace(item, index=positions.pop(item.index))
+    while rejected:
+        yield rejected.popleft()
+
+
+def _request_from_record(
+    record: Mapping[str | None, object], defaults: ImageRequest, line: int
+) -> ImageRequest:
+    fields: dict[str, Any] = {}
+    metadata = dict(defaults.metadata)
+    for key, value in record.items():
+        # Empty CSV cells fall back to the command-line defaults.
+        if key is None or value is None or value == "":
+            continue
+        if key == "metadata":
+            try:
+                extra = json.loads(value) if isinstance(value, str) else value
+            except ValueError:
+                raise typer.BadParameter(
+                    f"line {line}: metadata is not valid JSON"
+                ) from None
+            if not isinstance(extra, dict):
+                raise typer.BadParameter(f"line {line}: metadata must be an object")
+            pairs = cast("dict[object, object]", extra).items()
+            metadata.update({str(k): str(v) for k, v in pairs})
+        elif key in {"prompt", *_RECORD_FIELDS}:
+            fields[key] = str(value)
+        elif key == "seed":
+            try:
+                fields["seed"] = int(str(value))
+            except ValueError:
+                raise typer.BadParameter(
+                    f"line {line}: seed must be an integer"
+                ) from None
+        elif key == "provider":
+            # One batch runs against one provider client.
+            current = defaults.provider.value if defaults.provider else None
+            if str(value) != current:
+                raise typer.BadParameter(
+                    f"line {line}: provider {value!r} does not match --provider"
+                )
+        else:
+            metadata[key] = str(value)
+    if not fields.get("prompt", "").strip():
+        raise typer.BadParameter(f"line {line}: missing prompt")
+    return replace(defaults, **fields, metadata=metadata)
+
+
+def _openai_provider(provider: str | None) -> OpenAIProvider:
+    from langlearn_imagegen.providers import auto_detect_provider, get_provider
+    from langlearn_imagegen.providers.openai import OpenAIProvider
+
+    instance = get_provider(provider or auto_detect_provider(), cache=True)
+    if not isinstance(instance, OpenAIProvider):
+        raise typer.BadParameter("deferred batches require the openai provider")
+    return instance
+
+
+def _deferred_payload(job: DeferredBatch, path: Path) -> dict[str, object]:
+    return {
+        "job": str(path),
+        "batch_id": job.batch_id,
+        "status": job.status,
+        "requests": len(job.requests),
+        "calls": len(job.groups),
+        "completed": job.completed,
+        "failed": job.failed,
+    }
+
+
+def _is_resumed(item: BatchItemResult) -> bool:
+    return item.result is not None and bool(item.result.metadata.get("manifest"))
+
+
+def _stream_items(items: Iterable[BatchItemResult]) -> tuple[int, int, int]:
+    total = failed = resumed = 0
+    for item in items:
+        _emit(_batch_item_payload(item), _batch_item_line(item))
+        total += 1
+        failed += not item.ok
+        resumed += _is_resumed(item)
+    return total, failed, resumed
+
+
 def _evaluation_payload(result: EvaluationResult) -> dict[str, object]:
     return {
         "passed": result.passed,
@@ -145,6 +448,15 @@ def install() -> None:
     _emit(payload, "install not implemented")
 
 
+@app.command()
+def list_providers() -> None:
+    "List available image providers."
+    from langlearn_imagegen.providers import PROVIDER_REGISTRY
+
+    names = sorted(PROVIDER_REGISTRY)
+    _emit({"providers": names}, "\n".join(names))
+
+
 @app.command()
 def serve() -> None:
     "Start MCP server."
@@ -172,10 +484,19 @@ def generate_image(
     pexels_size: str | None = typer.Option(None, "--pexels-size"),
     orientation: str | None = typer.Option(None, "--orientation"),
     color: str | None = typer.Option(None, "--color"),
+    postprocess: str | None = typer.Option(None, "--postprocess"),
+    candidates: int | None = typer.Option(None, "--candidates", min=1),
+    threshold: float | None = typer.Option(None, "--threshold"),
+    evaluator: str | None = typer.Option(None, "--evaluator"),
     metadata: list[str] | None = METADATA_OPTION,
 ) -> None:
-    """Generate an image and write it to disk."""
-    provider_id = ImageProviderId(provider) if provider else None
+    """Generate an image and write it to disk.
+
+    With --candidates and --evaluator, several candidates are generated at
+    once and the first to pass evaluation (scoring at least --threshold,
+    when given) is kept.
+    """
+    provider_id = _provider_id(provider)
     metadata_map = _parse_metadata(metadata)
     metadata_map = _merge_metadata(
         metadata_map,
@@ -188,6 +509,7 @@ def generate_image(
         pexels_size=pexels_size,
         orientation=orientation,
         color=color,
+        postprocess=postprocess,
     )
     request = ImageRequest(
         prompt=prompt,
@@ -200,11 +522,222 @@ def generate_image(
         seed=seed,
         metadata=metadata_map,
     )
-    result = generate(request)
+    from langlearn_imagegen.core import ImageClient, generate
+
+    if candidates is None:
+        result = generate(request)
+    else:
+        if evaluator is None:
+            raise typer.BadParameter("--candidates requires --evaluator")
+        with ImageClient(
+            provider_name=provider, evaluator=_load_evaluator(evaluator)
+        ) as client:
+            result = client.generate_best(request, candidates, threshold=threshold)
     payload = _result_payload(result)
     _emit(payload, str(payload))
 
 
+@app.command()
+def generate_batch(
+    prompts_file: Path | None = PROMPTS_FILE_ARGUMENT,
+    provider: str | None = typer.Option(None, "--provider"),
+    size: str | None = typer.Option(None, "--size"),
+    style: str | None = typer.Option(None, "--style"),
+    language: str | None = typer.Option(None, "--language"),
+    cultural_context: str | None = typer.Option(None, "--cultural-context"),
+    quality: str | None = typer.Option(None, "--quality"),
+    seed: int | None = typer.Option(None, "--seed"),
+    output_dir: str | None = typer.Option(None, "--output-dir"),
+    response_format: str | None = typer.Option(None, "--response-format"),
+    output_format: str | None = typer.Option(None, "--output-format"),
+    pexels_src: str | None = typer.Option(None, "--pexels-src"),
+    pexels_size: str | None = typer.Option(None, "--pexels-size"),
+    orientation: str | None = typer.Option(None, "--orientation"),
+    color: str | None = typer.Option(None, "--color"),
+    postprocess: str | None = typer.Option(None, "--postprocess"),
+    workers: int = typer.Option(DEFAULT_MAX_WORKERS, "--workers", min=1),
+    cache_dir: str | None = typer.Option(None, "--cache-dir"),
+    fallback_provider: str | None = typer.Option(None, "--fallback-provider"),
+    evaluator: str | None = typer.Option(None, "--evaluator"),
+    evaluation_workers: int | None = typer.Option(None, "--evaluation-workers", min=1),
+    manifest: Path | None = MANIFEST_OPTION,
+    resume: bool = typer.Option(False, "--resume"),
+    index: Path | None = INDEX_OPTION,
+    input_format: str = INPUT_FORMAT_OPTION,
+    stream: bool = typer.Option(False, "--stream"),
+    deferred: Path | None = DEFERRED_OPTION,
+    metadata: list[str] | None = METADATA_OPTION,
+) -> None:
+    """Generate one image per prompt concurrently.
+
+    Input is read lazily: plain prompts, or JSONL/CSV records of
+    ImageRequest fields (other keys become metadata) that override the
+    command-line options. A malformed record is reported as a failed item
+    and the rest of the batch still runs. With --stream, each item is written (one JSON
+    line with --json) as soon as it finishes, in completion order, and the
+    totals go to stderr.
+
+    With --evaluator, each image is evaluated as soon as it is written and
+    the verdict is reported per item. With --manifest, every finished item
+    is recorded in a JSONL manifest; rerun with --resume to skip completed
+    items and retry failed ones.
+
+    With --deferred (OpenAI only), the requests are submitted as one Batch
+    API job instead, which is cheaper but can take up to a day; the job is
+    saved to the given file for collect-deferred.
+    """
+    if resume and manifest is None:
+        raise typer.BadParameter("--resume requires --manifest")
+    if manifest is not None and not resume and _has_entries(manifest):
+        raise typer.BadParameter(
+            f"manifest {manifest} already exists; pass --resume to continue it"
+        )
+    provider_id = _provider_id(provider)
+    metadata_map = _parse_metadata(metadata)
+    metadata_map = _merge_metadata(
+        metadata_map,
+        output_dir=output_dir,
+        response_format=response_format,
+        output_format=output_format,
+        pexels_src=pexels_src,
+        pexels_size=pexels_size,
+        orientation=orientation,
+        color=color,
+        postprocess=postprocess,
+    )
+    defaults = ImageRequest(
+        prompt="",
+        provider=provider_id,
+        size=size,
+        style=style,
+        language=language,
+        cultural_context=cultural_context,
+        quality=quality,
+        seed=seed,
+        metadata=metadata_map,
+    )
+    records = _iter_requests(prompts_file, input_format, defaults)
+    if deferred is not None:
+        if stream or manifest is not None or evaluator is not None:
+            raise typer.BadParameter(
+                "--deferred cannot be combined with --stream, --manifest or --evaluator"
+            )
+        requests: list[ImageRequest] = []
+        for record in records:
+            if isinstance(record, typer.BadParameter):
+                raise record
+            requests.append(record)
+        job = _openai_provider(provider).submit_deferred(requests)
+        job.save(deferred)
+        _emit(
+            _deferred_payload(job, deferred),
+            f"submitted {job.batch_id}: {len(job.requests)} requests in "
+            f"{len(job.groups)} calls; collect with "
+            f"'langlearn-imagegen collect-deferred {deferred}'",
+        )
+        return
+    from langlearn_imagegen.cache import ResultCache, result_cache_from_env
+    from langlearn_imagegen.core import ImageClient
+    from langlearn_imagegen.manifest import JobManifest
+    from langlearn_imagegen.metrics import METRICS
+    from langlearn_imagegen.phash import perceptual_index_from_env
+
+    result_cache = ResultCache(cache_dir) if cache_dir else result_cache_from_env()
+    evaluator_impl = _load_evaluator(evaluator) if evaluator else None
+    with contextlib.ExitStack() as stack:
+        client = stack.enter_context(
+            ImageClient(
+                provider_name=provider,
+                evaluator=evaluator_impl,
+                max_workers=workers,
+                result_cache=result_cache,
+                fallback_provider=fallback_provider,
+                evaluation_workers=evaluation_workers,
+                asset_index=_asset_index(index, stack),
+                perceptual_index=perceptual_index_from_env(),
+            )
+        )
+        job_manifest = (
+            stack.enter_context(JobManifest(manifest)) if manifest is not None else None
+        )
+        batch = _with_rejected(
+            records, lambda valid: client.iter_batch(valid, manifest=job_manifest)
+        )
+        if stream:
+            total, failed, resumed = _stream_items(batch)
+            typer.echo(f"{total} items, {failed} failed, {resumed} resumed", err=True)
+            if failed:
+                raise typer.Exit(code=1)
+            return
+        items = sorted(batch, key=lambda item: item.index)
+    failed = sum(1 for item in items if not item.ok)
+    resumed = sum(1 for item in items if _is_resumed(item))
+    payload: dict[str, object] = {
+        "total": len(items),
+        "failed": failed,
+        "resumed": resumed,
+        "items": [_batch_item_payload(item) for item in items],
+        "metrics": METRICS.snapshot(),
+    }
+    lines = [_batch_item_line(item) for item in items]
+    _emit(payload, "\n".join(lines))
+    if failed:
+        raise typer.Exit(code=1)
+
+
+@app.command()
+def collect_deferred(
+    job_path: Path,
+    wait: bool = typer.Option(True, "--wait/--no-wait"),
+    poll_interval: float | None = typer.Option(
+        None, "--poll-interval", min=0.1, help="Seconds between polls (default 30)."
+    ),
+    timeout: float | None = typer.Option(None, "--timeout", min=0),
+) -> None:
+    """Write the images of a --deferred batch once OpenAI completes it.
+
+    With --no-wait, a job that is still running only has its status
+    reported (and saved to the job file).
+    """
+    from langlearn_imagegen.core import BatchItemResult
+    from langlearn_imagegen.providers.openai_batch import (
+        DEFAULT_POLL_INTERVAL,
+        DeferredBatch,
+    )
+
+    provider = _openai_provider("openai")
+    job = provider.poll_deferred(DeferredBatch.load(job_path))
+    job.save(job_path)
+    if not job.done and not wait:
+        _emit(_deferred_payload(job, job_path), f"{job.batch_id} is {job.status}")
+        return
+    try:
+        outcomes = provider.collect_deferred(
+            job, poll_interval=poll_interval or DEFAULT_POLL_INTERVAL, timeout=timeout
+        )
+    except TimeoutError as exc:
+        typer.echo(str(exc), err=True)
+        raise typer.Exit(code=1) from exc
+    items = [
+        BatchItemResult(index=index, request=request, error=outcome)
+        if isinstance(outcome, Exception)
+        else BatchItemResult(index=index, request=request, result=outcome)
+        for index, (request, outcome) in enumerate(
+            zip(job.requests, outcomes, strict=True)
+        )
+    ]
+    failed = sum(1 for item in items if not item.ok)
+    payload: dict[str, object] = {
+        "batch_id": job.batch_id,
+        "total": len(items),
+        "failed": failed,
+        "items": [_batch_item_payload(item) for item in items],
+    }
+    _emit(payload, "\n".join(_batch_item_line(item) for item in items))
+    if failed:
+        raise typer.Exit(code=1)
+
+
 @app.command()
 def dry_run(
     prompt: str,
@@ -224,10 +757,11 @@ def dry_run(
     pexels_size: str | None = typer.Option(None, "--pexels-size"),
     orientation: str | None = typer.Option(None, "--orientation"),
     color: str | None = typer.Option(None, "--color"),
+    postprocess: str | None = typer.Option(None, "--postprocess"),
     metadata: list[str] | None = METADATA_OPTION,
 ) -> None:
     """Print the ImageRequest payload without generating."""
-    provider_id = ImageProviderId(provider) if provider else None
+    provider_id = _provider_id(provider)
     metadata_map = _parse_metadata(metadata)
     metadata_map = _merge_metadata(
         metadata_map,
@@ -240,6 +774,7 @@ def dry_run(
         pexels_size=pexels_size,
         orientation=orientation,
         color=color,
+        postprocess=postprocess,
     )
     request = ImageRequest(
         prompt=prompt,
@@ -281,3 +816,41 @@ def evaluate_only(
     evaluation = evaluator_impl.evaluate(result)
     payload = _evaluation_payload(evaluation)
     _emit(payload, str(payload))
+
+
+@app.command()
+def lookup(
+    prompt: str,
+    language: str | None = typer.Option(None, "--language"),
+    provider: str | None = typer.Option(None, "--provider"),
+    index: Path | None = INDEX_OPTION,
+) -> None:
+    """List indexed images already generated for a prompt."""
+    with contextlib.ExitStack() as stack:
+        assets = _require_asset_index(index, stack).lookup(
+            prompt, language=language, provider=provider
+        )
+    payload: dict[str, object] = {"assets": [asset.as_dict() for asset in assets]}
+    _emit(payload, "\n".join(str(asset.path) for asset in assets))
+    if not assets:
+        raise typer.Exit(code=1)
+
+
+@app.command()
+def list_assets(
+    language: str | None = typer.Option(None, "--language"),
+    provider: str | None = typer.Option(None, "--provider"),
+    limit: int = typer.Option(DEFAULT_LIST_LIMIT, "--limit", min=1),
+    offset: int = typer.Option(0, "--offset", min=0),
+    index: Path | None = INDEX_OPTION,
+) -> None:
+    """Page through indexed images, newest first."""
+    with contextlib.ExitStack() as stack:
+        assets = _require_asset_index(index, stack).list_assets(
+            language=language, provider=provider, limit=limit, offset=offset
+        )
+    payload: dict[str, object] = {"assets": [asset.as_dict() for asset in assets]}
+    lines = [
+        f"{asset.path}\t{asset.language or '-'}\t{asset.prompt}" for asset in assets
+    ]
+    _emit(payload, "\n".join(lines))
@@ -2,53 +2,1524 @@
 
 from __future__ import annotations
 
-from collections.abc import Sequence
-from typing import TYPE_CHECKING
+import asyncio
+import contextlib
+import contextvars
+import os
+import threading
+import weakref
+from collections import deque
+from collections.abc import (
+    AsyncGenerator,
+    Awaitable,
+    Callable,
+    Iterable,
+    Iterator,
+    Sequence,
+)
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, replace
+from functools import partial
+from types import TracebackType
+from typing import TYPE_CHECKING, Self
 
-from langlearn_imagegen.providers import get_provider
+from langlearn_types import ImageProviderId
+
+from langlearn_imagegen.assets import AssetIndex, asset_index_from_env
+from langlearn_imagegen.cache import ResultCache, result_cache_from_env
+from langlearn_imagegen.defaults import DEFAULT_MAX_WORKERS
+from langlearn_imagegen.metrics import (
+    METRICS,
+    StageTimings,
+    collect_stages,
+    timed_stage,
+)
+from langlearn_imagegen.phash import PerceptualIndex, perceptual_index_from_env
+from langlearn_imagegen.postprocess import (
+    POSTPROCESS_KEY,
+    PostProcessor,
+    PostProcessSpec,
+    get_postprocessor,
+)
+from langlearn_imagegen.providers import (
+    AsyncCandidateProvider,
+    AsyncClosable,
+    AsyncImageProvider,
+    CandidateProvider,
+    SinkBacked,
+    auto_detect_provider,
+    get_circuit_breaker,
+    get_provider,
+    get_retry_policy,
+)
+from langlearn_imagegen.resilience import (
+    CircuitOpenError,
+    RetryPolicy,
+    acall_with_retry,
+    call_with_retry,
+)
+from langlearn_imagegen.singleflight import AsyncSingleFlight, SingleFlight
+from langlearn_imagegen.storage import LOCAL_SINK, StorageSink, storage_metadata
+from langlearn_imagegen.utils import request_fingerprint, resolve_output_path
 
 if TYPE_CHECKING:
-    from langlearn_types import ImageEvaluator, ImageRequest, ImageResult
+    from langlearn_types import (
+        EvaluationResult,
+        ImageEvaluator,
+        ImageProvider,
+        ImageRequest,
+        ImageResult,
+    )
+
+    from langlearn_imagegen.manifest import JobManifest
+    from langlearn_imagegen.transport import HttpSettings
+
+__all__ = [
+    "DEFAULT_CANDIDATES",
+    "DEFAULT_MAX_WORKERS",
+    "FALLBACK_PROVIDER_ENV",
+    "PROVIDER_CONCURRENCY",
+    "BatchGenerationError",
+    "BatchItemResult",
+    "ImageClient",
+    "agenerate",
+    "arun_batch",
+    "generate",
+    "set_provider_concurrency",
+]
+
+DEFAULT_CANDIDATES = 4
+
+FALLBACK_PROVIDER_ENV = "LANGLEARN_IMAGEGEN_FALLBACK_PROVIDER"
+
+# Process-wide ceiling on in-flight calls per provider, shared by every client.
+PROVIDER_CONCURRENCY: dict[str, int] = {
+    ImageProviderId.openai.value: 4,
+    ImageProviderId.pexels.value: 8,
+}
+
+_provider_slots: dict[str, _ProviderSlot] = {}
+_provider_slots_lock = threading.Lock()
+
+# Clients built for the module-level helpers are shared while in use, so
+# concurrent generate()/agenerate() calls (e.g. from MCP tools) coalesce.
+_shared_clients: weakref.WeakValueDictionary[tuple[object, ...], ImageClient] = (
+    weakref.WeakValueDictionary()
+)
+_shared_clients_lock = threading.Lock()
+
+ItemCallback = Callable[["BatchItemResult"], Awaitable[None]]
+
+Scored = tuple["ImageResult", "EvaluationResult"]
+
+# A batch position and its request.
+Member = tuple[int, "ImageRequest"]
+
+# What producing one batch item gave: (result, shared) or its error.
+Produced = tuple["ImageResult", bool] | Exception
+
+
+def set_provider_concurrency(name: str, limit: int) -> None:
+    """Change the concurrency ceiling for a provider."""
+    if limit < 1:
+        raise ValueError("provider concurrency limit must be at least 1")
+    key = name.lower()
+    with _provider_slots_lock:
+        PROVIDER_CONCURRENCY[key] = limit
+        _provider_slots.pop(key, None)
+
+
+class _ProviderSlot:
+    """Per-provider concurrency ceiling shared by threads and event loops.
+
+    Waiters are served first come, first served. A thread waits on an
+    Event; a coroutine waits on a future of its own loop, so it holds no
+    worker thread while queued and can be cancelled safely.
+    """
+
+    def __init__(self, limit: int) -> None:
+        self._lock = threading.Lock()
+        self._free = limit
+        self._waiters: deque[threading.Event | asyncio.Future[None]] = deque()
+
+    def acquire(self) -> None:
+        with self._lock:
+            if self._free and not self._waiters:
+                self._free -= 1
+                return
+            granted = threading.Event()
+            self._waiters.append(granted)
+        granted.wait()
+
+    async def aacquire(self) -> None:
+        with self._lock:
+            if self._free and not self._waiters:
+                self._free -= 1
+                return
+            granted = asyncio.get_running_loop().create_future()
+            self._waiters.append(granted)
+        try:
+            await granted
+        except asyncio.CancelledError:
+            with self._lock:
+                queued = granted in self._waiters
+                if queued:
+                    self._waiters.remove(granted)
+            # A grant that landed anyway is passed on; one still on its way
+            # finds the future cancelled and passes itself on (_grant).
+            if not queued and granted.done() and not granted.cancelled():
+                self.release()
+            raise
+
+    def release(self) -> None:
+        with self._lock:
+            while self._waiters:
+                waiter = self._waiters.popleft()
+                if isinstance(waiter, threading.Event):
+                    waiter.set()
+                    return
+                # The slot passes straight to the waiter, never via _free.
+                with contextlib.suppress(RuntimeError):  # its loop is closed
+                    waiter.get_loop().call_soon_threadsafe(_grant, self, waiter)
+                    return
+            self._free += 1
+
+
+def _grant(slot: _ProviderSlot, waiter: asyncio.Future[None]) -> None:
+    if waiter.done():
+        # Cancelled while the grant was on its way.
+        slot.release()
+    else:
+        waiter.set_result(None)
+
+
+def _provider_slot(name: str) -> _ProviderSlot:
+    with _provider_slots_lock:
+        slot = _provider_slots.get(name)
+        if slot is None:
+            limit = PROVIDER_CONCURRENCY.get(name, DEFAULT_MAX_WORKERS)
+            slot = _ProviderSlot(limit)
+            _provider_slots[name] = slot
+        return slot
+
 
-__all__ = ["ImageClient", "generate"]
+@contextlib.asynccontextmanager
+async def _aprovider_slot(name: str) -> AsyncGenerator[None]:
+    slot = _provider_slot(name)
+    with timed_stage("queue_wait"):
+        await slot.aacquire()
+    try:
+        yield
+    finally:
+        slot.release()
+
+
+@dataclass(frozen=True)
+class BatchItemResult:
+    """Outcome of a single request within a batch.
+
+    With an evaluator, ``evaluation`` holds its verdict and ``result`` is
+    kept even when the image is rejected; ``ok`` is False for rejected
+    images as well as for errors.
+    """
+
+    index: int
+    request: ImageRequest
+    result: ImageResult | None = None
+    error: Exception | None = None
+    evaluation: EvaluationResult | None = None
+
+    @property
+    def ok(self) -> bool:
+        if self.error is not None or self.result is None:
+            return False
+        return self.evaluation is None or self.evaluation.passed
+
+
+class BatchGenerationError(RuntimeError):
+    """Raised when one or more items in a batch fail.
+
+    The per-item outcomes, including the successful ones, are kept on
+    ``items`` so callers do not lose work that already completed.
+    """
+
+    def __init__(self, items: list[BatchItemResult]) -> None:
+        self.items = items
+        failed = sum(1 for item in items if not item.ok)
+        super().__init__(f"{failed} of {len(items)} batch items failed")
 
 
 class ImageClient:
-    """Thin wrapper around ImageProvider with optional evaluation."""
+    """Thin wrapper around ImageProvider with optional evaluation.
+
+    The provider keeps pooled HTTP connections alive between calls; use the
+    client as a (async) context manager, or call close/aclose, to release
+    them. A ``provider`` passed in (for example a cached instance from
+    get_provider) is shared and is never closed by the client.
+
+    With a ``result_cache`` the client serves repeated requests from disk
+    and only calls the provider on a miss; results that fail evaluation
+    are never cached. Identical requests (including output location) that
+    are in flight on the same client at the same time share one provider
+    call and one write; each caller receives its own copy of the result.
+
+    Provider calls are retried per the provider's RetryPolicy (or
+    ``retry_policy``) behind a process-wide circuit breaker. When retries
+    are exhausted or the circuit is open, ``fallback_provider`` (if set)
+    serves the request instead and the result is tagged ``fallback_from``.
+
+    Batches send requests that differ only in output location to the
+    provider together through generate_images (for OpenAI, one call with
+    ``n`` images), up to ``max_workers`` at a time.
+
+    In batches, evaluation is pipelined: each image is handed to a separate
+    pool of ``evaluation_workers`` as soon as it is written, so generation
+    and evaluation overlap, and the verdict is attached to the item instead
+    of raising.
+
+    With a JobManifest, batches record each finished item durably and skip
+    items the manifest already holds as completed, so an interrupted batch
+    resumes where it stopped; failed and rejected items run again.
+
+    With an ``asset_index``, every delivered image (not rejected ones) is
+    catalogued with its request and provider metadata. With a
+    ``perceptual_index``, its perceptual hash is recorded too, so providers
+    sharing the index can avoid near-duplicates of it.
+
+    Requests with ``postprocess`` metadata are resized, re-encoded and
+    thumbnailed right after they are written, on ``postprocessor`` (by
+    default the shared process pool from postprocess.get_postprocessor).
+
+    generate_best implements two-stage generation: several candidates are
+    produced at once and the first to pass evaluation is kept.
+
+    Every result carries per-stage ``timing_<stage>_ms`` and
+    ``bytes_<stage>`` metadata, and each generation is recorded in the
+    process-wide ``metrics.METRICS`` registry.
+    """
 
     def __init__(
         self,
         provider_name: str | None = None,
         evaluator: ImageEvaluator | None = None,
+        *,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        http_settings: HttpSettings | None = None,
+        provider: ImageProvider | None = None,
+        result_cache: ResultCache | None = None,
+        retry_policy: RetryPolicy | None = None,
+        fallback_provider: str | None = None,
+        evaluation_workers: int | None = None,
+        asset_index: AssetIndex | None = None,
+        perceptual_index: PerceptualIndex | None = None,
+        postprocessor: PostProcessor | None = None,
     ) -> None:
-        self._provider = get_provider(provider_name)
+        if max_workers < 1:
+            raise ValueError("max_workers must be at least 1")
+        if evaluation_workers is not None and evaluation_workers < 1:
+            raise ValueError("evaluation_workers must be at least 1")
+        self._provider_name = (
+            provider_name.lower() if provider_name else auto_detect_provider()
+        )
+        self._owns_provider = provider is None
+        self._provider = provider or get_provider(
+            self._provider_name, http_settings=http_settings
+        )
         self._evaluator = evaluator
+        self._max_workers = max_workers
+        self._evaluation_workers = evaluation_workers or max_workers
+        self._result_cache = result_cache
+        self._asset_index = asset_index
+        self._perceptual_index = perceptual_index
+        self._postprocessor = postprocessor
+        self._retry_policy = retry_policy
+        self._fallback_name = fallback_provider.lower() if fallback_provider else None
+        if self._fallback_name == self._provider_name:
+            self._fallback_name = None
+        self._inflight: SingleFlight[ImageResult] = SingleFlight()
+        self._ainflight: AsyncSingleFlight[ImageResult] = AsyncSingleFlight()
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        tb: TracebackType | None,
+    ) -> None:
+        self.close()
+
+    async def __aenter__(self) -> Self:
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        tb: TracebackType | None,
+    ) -> None:
+        await self.aclose()
+
+    @property
+    def provider_name(self) -> str:
+        return self._provider_name
+
+    def close(self) -> None:
+        """Release connections held by the provider."""
+        if not self._owns_provider:
+            return
+        close = getattr(self._provider, "close", None)
+        if callable(close):
+            close()
+
+    async def aclose(self) -> None:
+        """Release sync and async connections held by the provider."""
+        if not self._owns_provider:
+            return
+        if isinstance(self._provider, AsyncClosable):
+            await self._provider.aclose()
+        else:
+            self.close()
 
     def generate(self, request: ImageRequest) -> ImageResult:
-        result = self._provider.generate_image(request)
-        self._maybe_evaluate(result)
+        with collect_stages() as timings:
+            try:
+                result, shared = self._produce(request)
+                self._maybe_evaluate(result)
+                if not shared:
+                    self._cache_store(request, result)
+            except Exception:
+                METRICS.record_generation(self._provider_name, timings, "error")
+                raise
+            return self._finish(request, result, timings)
+
+    def _produce(
+        self,
+        request: ImageRequest,
+        fetch: Callable[[], ImageResult] | None = None,
+        *,
+        variant: str = "",
+    ) -> tuple[ImageResult, bool]:
+        result, shared = self._inflight.do(
+            self._flight_key(request) + variant,
+            fetch or (lambda: self._fetch(request)),
+        )
+        if shared:
+            result = _coalesced_copy(result)
+        return result, shared
+
+    def _fetch(self, request: ImageRequest) -> ImageResult:
+        cached = self._cache_lookup(request)
+        if cached is not None:
+            return self._postprocess(request, cached)
+        try:
+            result = self._call_provider(self._provider_name, self._provider, request)
+        except Exception as exc:
+            if not self._should_fall_back(exc) or self._fallback_name is None:
+                raise
+            fallback = get_provider(self._fallback_name, cache=True)
+            result = self._call_provider(self._fallback_name, fallback, request)
+            result = _fallback_copy(result, self._provider_name)
+        return self._postprocess(request, result)
+
+    def _postprocess(self, request: ImageRequest, result: ImageResult) -> ImageResult:
+        spec = _pending_postprocess(request, result)
+        if spec is None:
+            return result
+        return (self._postprocessor or get_postprocessor()).process(result, spec)
+
+    def _call_provider(
+        self, name: str, provider: ImageProvider, request: ImageRequest
+    ) -> ImageResult:
+        return self._call_in_slot(name, lambda: provider.generate_image(request))
+
+    def _call_provider_group(
+        self, name: str, provider: ImageProvider, requests: Sequence[ImageRequest]
+    ) -> list[ImageResult]:
+        return self._call_in_slot(name, lambda: provider.generate_images(requests))
+
+    def _call_in_slot[T](self, name: str, call: Callable[[], T]) -> T:
+        def attempt() -> T:
+            slot = _provider_slot(name)
+            with timed_stage("queue_wait"):
+                slot.acquire()
+            try:
+                return call()
+            finally:
+                slot.release()
+
+        return call_with_retry(
+            attempt, self._policy_for(name), get_circuit_breaker(name)
+        )
+
+    def generate_best(
+        self,
+        request: ImageRequest,
+        candidates: int = DEFAULT_CANDIDATES,
+        *,
+        threshold: float | None = None,
+    ) -> ImageResult:
+        """Generate several candidates at once and keep the first that passes.
+
+        The provider produces ``candidates`` images concurrently (``n`` for
+        OpenAI, extra search hits for Pexels) and each is scored by the
+        evaluator as soon as it is written. The first to pass, with a score
+        of at least ``threshold`` when one is given, wins: outstanding
+        candidates are abandoned, the others are deleted and only the
+        winner is moved to the request's output path. Raises ValueError
+        when no candidate passes.
+
+        Like generate, the winner is served from and stored in the result
+        cache, identical concurrent calls share one search, and the
+        provider call is retried behind the circuit breaker.
+        """
+        provider, evaluator = self._candidate_setup(candidates)
+        if not isinstance(provider, CandidateProvider):
+            raise TypeError(
+                f"Provider '{self._provider_name}' cannot generate candidates."
+            )
+
+        def fetch() -> ImageResult:
+            cached = self._cache_lookup(request)
+            if cached is not None:
+                return self._postprocess(request, cached)
+            winner, evaluated = call_with_retry(
+                lambda: self._pick_candidate(
+                    provider, evaluator, request, candidates, threshold
+                ),
+                self._policy_for(self._provider_name),
+                get_circuit_breaker(self._provider_name),
+            )
+            return self._promote(request, winner, evaluated)
+
+        with collect_stages() as timings:
+            try:
+                result, shared = self._produce(
+                    request, fetch, variant=_best_variant(candidates, threshold)
+                )
+                if not shared:
+                    self._cache_store(request, result)
+            except Exception:
+                METRICS.record_generation(self._provider_name, timings, "error")
+                raise
+            return self._finish(request, result, timings)
+
+    def _candidate_setup(self, candidates: int) -> tuple[object, ImageEvaluator]:
+        if candidates < 1:
+            raise ValueError("candidates must be at least 1")
+        if self._evaluator is None:
+            raise ValueError("Candidate generation requires an evaluator.")
+        return self._provider, self._evaluator
+
+    def _pick_candidate(
+        self,
+        provider: CandidateProvider,
+        evaluator: ImageEvaluator,
+        request: ImageRequest,
+        count: int,
+        threshold: float | None,
+    ) -> tuple[Scored, int]:
+        produced: list[ImageResult] = []
+        scored: list[Scored] = []
+        pending: dict[Future[EvaluationResult], ImageResult] = {}
+        winner: Scored | None = None
+        pool = ThreadPoolExecutor(
+            max_workers=min(self._evaluation_workers, count),
+            thread_name_prefix="imagegen-eval",
+        )
+        slot = _provider_slot(self._provider_name)
+        try:
+            with timed_stage("queue_wait"):
+                slot.acquire()
+            try:
+                stream = provider.iter_candidates(request, count)
+                try:
+                    for candidate in stream:
+                        produced.append(candidate)
+                        future = pool.submit(
+                            contextvars.copy_context().run,
+                            _score,
+                            evaluator,
+                            candidate,
+                        )
+                        pending[future] = candidate
+                        winner = _take_winner(pending, scored, threshold, block=False)
+                        if winner is not None:
+                            break
+                finally:
+                    stream.close()
+            finally:
+                slot.release()
+            while winner is None and pending:
+                winner = _take_winner(pending, scored, threshold, block=True)
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+            _discard_losers(self._sink(), produced, winner)
+        if winner is None:
+            raise ValueError(_rejection_reason(scored))
+        return winner, len(scored)
+
+    def _promote(
+        self, request: ImageRequest, winner: Scored, evaluated: int
+    ) -> ImageResult:
+        candidate, evaluation = winner
+        extension = candidate.path.suffix.lstrip(".") or "png"
+        final_path = resolve_output_path(
+            request.prompt, candidate.provider.value, request.metadata, extension
+        )
+        sink = self._sink()
+        sink.rename(candidate.path, final_path)
+        metadata = dict(candidate.metadata)
+        metadata.update(storage_metadata(sink, final_path))
+        metadata["candidates_evaluated"] = str(evaluated)
+        if evaluation.score is not None:
+            metadata["candidate_score"] = f"{evaluation.score:g}"
+        promoted = replace(candidate, path=final_path, metadata=metadata)
+        return self._postprocess(request, promoted)
+
+    def generate_batch(
+        self,
+        requests: Sequence[ImageRequest],
+        *,
+        max_workers: int | None = None,
+    ) -> list[ImageResult]:
+        """Generate every request concurrently, preserving input order.
+
+        Raises BatchGenerationError after the whole batch has run if any
+        item failed; successful items are still written to disk.
+        """
+        items = self.run_batch(requests, max_workers=max_workers)
+        if not all(item.ok for item in items):
+            raise BatchGenerationError(items)
+        return [item.result for item in items if item.result is not None]
+
+    def run_batch(
+        self,
+        requests: Sequence[ImageRequest],
+        *,
+        max_workers: int | None = None,
+        manifest: JobManifest | None = None,
+    ) -> list[BatchItemResult]:
+        """Generate every request concurrently and report per-item outcomes."""
+        items = self.iter_batch(requests, max_workers=max_workers, manifest=manifest)
+        return sorted(items, key=lambda item: item.index)
+
+    def iter_batch(
+        self,
+        requests: Iterable[ImageRequest],
+        *,
+        max_workers: int | None = None,
+        manifest: JobManifest | None = None,
+    ) -> Iterator[BatchItemResult]:
+        """Yield per-item outcomes in completion order as they finish.
+
+        ``requests`` is consumed lazily, ``max_workers`` at a time so that
+        compatible requests can share a provider call, and at most twice
+        ``max_workers`` items are in flight (generating or being evaluated)
+        at once, so memory stays flat however long the input is. Closing the
+        iterator early cancels items that have not started.
+        """
+        workers = max_workers or self._max_workers
+        window = 2 * workers
+        evaluation_pool = ThreadPoolExecutor(
+            max_workers=self._evaluation_workers, thread_name_prefix="imagegen-eval"
+        )
+        pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="imagegen")
+        in_flight: set[Future[BatchItemResult]] = set()
+        pending: list[Member] = []
+
+        def submit() -> None:
+            for members in self._groups(pending, workers):
+                staged = pool.submit(
+                    self._run_group, members, evaluation_pool, manifest
+                )
+                in_flight.update(_flatten(staged, len(members)))
+            pending.clear()
+
+        try:
+            for index, request in enumerate(requests):
+                resumed = self._resumed(index, request, manifest)
+                if resumed is not None:
+                    yield resumed
+                    continue
+                pending.append((index, request))
+                if len(pending) < workers:
+                    continue
+                submit()
+                while len(in_flight) >= window:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    yield from (future.result() for future in done)
+            submit()
+            while in_flight:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                yield from (future.result() for future in done)
+        finally:
+            pool.shutdown(cancel_futures=True)
+            evaluation_pool.shutdown()
+
+    def _resume(
+        self, requests: Sequence[ImageRequest], manifest: JobManifest | None
+    ) -> list[BatchItemResult | None]:
+        return [
+            self._resumed(index, request, manifest)
+            for index, request in enumerate(requests)
+        ]
+
+    def _resumed(
+        self, index: int, request: ImageRequest, manifest: JobManifest | None
+    ) -> BatchItemResult | None:
+        if manifest is None:
+            return None
+        entry = manifest.get(self._flight_key(request))
+        if entry is None or not entry.resumable_in(self._sink()):
+            return None
+        return BatchItemResult(
+            index=index,
+            request=request,
+            result=entry.to_result(),
+            evaluation=entry.to_evaluation(),
+        )
+
+    def _record(self, manifest: JobManifest | None, item: BatchItemResult) -> None:
+        if manifest is not None:
+            manifest.record(self._flight_key(item.request), item)
+
+    def _groups(self, members: Sequence[Member], limit: int) -> list[list[Member]]:
+        """Group requests that differ only in output location, ``limit`` each."""
+        groups: dict[str, list[Member]] = {}
+        for member in members:
+            groups.setdefault(self._fingerprint(member[1]), []).append(member)
+        return [
+            group[start : start + limit]
+            for group in groups.values()
+            for start in range(0, len(group), limit)
+        ]
+
+    def _run_group(
+        self,
+        members: list[Member],
+        evaluation_pool: ThreadPoolExecutor,
+        manifest: JobManifest | None = None,
+    ) -> list[Future[BatchItemResult]]:
+        timings = StageTimings()
+        with collect_stages(timings):
+            outcomes = self._produce_batch([request for _, request in members])
+        futures: list[Future[BatchItemResult]] = []
+        for (index, request), outcome in zip(members, outcomes, strict=True):
+            item_timings = timings if len(members) == 1 else timings.copy()
+            if isinstance(outcome, Exception):
+                METRICS.record_generation(self._provider_name, item_timings, "error")
+                item = BatchItemResult(index=index, request=request, error=outcome)
+                self._record(manifest, item)
+                done: Future[BatchItemResult] = Future()
+                done.set_result(item)
+                futures.append(done)
+                continue
+            result, shared = outcome
+            # Hand off to the evaluation pool so this worker can start the
+            # next generation while the evaluator looks at this image.
+            futures.append(
+                evaluation_pool.submit(
+                    self._finish_item,
+                    index,
+                    request,
+                    result,
+                    shared,
+                    item_timings,
+                    manifest,
+                )
+            )
+        return futures
+
+    def _produce_batch(self, requests: Sequence[ImageRequest]) -> list[Produced]:
+        if len(requests) == 1:
+            try:
+                return [self._produce(requests[0])]
+            except Exception as exc:
+                return [exc]
+        owners = self._owners(requests)
+        leaders = [index for index, owner in enumerate(owners) if owner == index]
+        fetched = dict(
+            zip(leaders, self._fetch_group([requests[i] for i in leaders]), strict=True)
+        )
+        return [
+            _group_outcome(fetched[owner], shared=owner != index)
+            for index, owner in enumerate(owners)
+        ]
+
+    def _owners(self, requests: Sequence[ImageRequest]) -> list[int]:
+        # Repeats of a request (same output location too) share its result.
+        first: dict[str, int] = {}
+        return [
+            first.setdefault(self._flight_key(request), index)
+            for index, request in enumerate(requests)
+        ]
+
+    def _fetch_group(
+        self, requests: Sequence[ImageRequest]
+    ) -> list[ImageResult | Exception]:
+        cached = [self._cache_lookup(request) for request in requests]
+        misses = [
+            request
+            for request, hit in zip(requests, cached, strict=True)
+            if hit is None
+        ]
+        produced = iter(self._generate_group(misses) if misses else [])
+        outcomes: list[ImageResult | Exception] = []
+        for request, hit in zip(requests, cached, strict=True):
+            result = hit if hit is not None else next(produced)
+            if isinstance(result, Exception):
+                outcomes.append(result)
+                continue
+            try:
+                outcomes.append(self._postprocess(request, result))
+            except Exception as exc:
+                outcomes.append(exc)
+        return outcomes
+
+    def _generate_group(
+        self, requests: list[ImageRequest]
+    ) -> Sequence[ImageResult | Exception]:
+        try:
+            return self._call_provider_group(
+                self._provider_name, self._provider, requests
+            )
+        except Exception as exc:
+            if not self._should_fall_back(exc) or self._fallback_name is None:
+                return [exc] * len(requests)
+        fallback = get_provider(self._fallback_name, cache=True)
+        try:
+            results = self._call_provider_group(self._fallback_name, fallback, requests)
+        except Exception as exc:
+            return [exc] * len(requests)
+        return [_fallback_copy(result, self._provider_name) for result in results]
+
+    def _finish_item(
+        self,
+        index: int,
+        request: ImageRequest,
+        result: ImageResult,
+        shared: bool,
+        timings: StageTimings,
+        manifest: JobManifest | None = None,
+    ) -> BatchItemResult:
+        item = self._evaluate_item(index, request, result, shared, timings)
+        self._record(manifest, item)
+        return item
+
+    def _evaluate_item(
+        self,
+        index: int,
+        request: ImageRequest,
+        result: ImageResult,
+        shared: bool,
+        timings: StageTimings,
+    ) -> BatchItemResult:
+        with collect_stages(timings):
+            evaluation: EvaluationResult | None = None
+            if self._evaluator is not None:
+                try:
+                    with timed_stage("evaluate"):
+                        evaluation = self._evaluator.evaluate(result)
+                except Exception as exc:
+                    METRICS.record_generation(self._provider_name, timings, "error")
+                    return BatchItemResult(
+                        index=index, request=request, result=result, error=exc
+                    )
+            passed = evaluation is None or evaluation.passed
+            if passed and not shared:
+                self._cache_store(request, result)
+            result = self._finish(
+                request, result, timings, outcome=None if passed else "rejected"
+            )
+        return BatchItemResult(
+            index=index, request=request, result=result, evaluation=evaluation
+        )
+
+    async def agenerate(self, request: ImageRequest) -> ImageResult:
+        """Generate a single image without blocking the event loop."""
+        with collect_stages() as timings:
+            try:
+                result, shared = await self._aproduce(request)
+                if self._evaluator is not None:
+                    await asyncio.to_thread(self._maybe_evaluate, result)
+                if not shared and self._result_cache is not None:
+                    await asyncio.to_thread(self._cache_store, request, result)
+            except Exception:
+                METRICS.record_generation(self._provider_name, timings, "error")
+                raise
+            return await self._afinish(request, result, timings)
+
+    async def agenerate_best(
+        self,
+        request: ImageRequest,
+        candidates: int = DEFAULT_CANDIDATES,
+        *,
+        threshold: float | None = None,
+    ) -> ImageResult:
+        """Async counterpart of generate_best."""
+        provider, evaluator = self._candidate_setup(candidates)
+        if not isinstance(provider, AsyncCandidateProvider):
+            return await asyncio.to_thread(
+                self.generate_best, request, candidates, threshold=threshold
+            )
+
+        async def fetch() -> ImageResult:
+            if self._result_cache is not None:
+                cached = await asyncio.to_thread(self._cache_lookup, request)
+                if cached is not None:
+                    return await self._apostprocess(request, cached)
+            winner, evaluated = await acall_with_retry(
+                lambda: self._apick_candidate(
+                    provider, evaluator, request, candidates, threshold
+                ),
+                self._policy_for(self._provider_name),
+                get_circuit_breaker(self._provider_name),
+            )
+            return await asyncio.to_thread(self._promote, request, winner, evaluated)
+
+        with collect_stages() as timings:
+            try:
+                result, shared = await self._aproduce(
+                    request, fetch, variant=_best_variant(candidates, threshold)
+                )
+                if not shared and self._result_cache is not None:
+                    await asyncio.to_thread(self._cache_store, request, result)
+            except Exception:
+                METRICS.record_generation(self._provider_name, timings, "error")
+                raise
+            return await self._afinish(request, result, timings)
+
+    async def _apick_candidate(
+        self,
+        provider: AsyncCandidateProvider,
+        evaluator: ImageEvaluator,
+        request: ImageRequest,
+        count: int,
+        threshold: float | None,
+    ) -> tuple[Scored, int]:
+        produced: list[ImageResult] = []
+        scored: list[Scored] = []
+        pending: dict[asyncio.Future[EvaluationResult], ImageResult] = {}
+        winner: Scored | None = None
+        slots = asyncio.Semaphore(self._evaluation_workers)
+
+        async def score(candidate: ImageResult) -> EvaluationResult:
+            async with slots:
+                return await asyncio.to_thread(_score, evaluator, candidate)
+
+        try:
+            async with _aprovider_slot(self._provider_name):
+                stream = provider.aiter_candidates(request, count)
+                try:
+                    async for candidate in stream:
+                        produced.append(candidate)
+                        pending[asyncio.ensure_future(score(candidate))] = candidate
+                        winner = await _atake_winner(
+                            pending, scored, threshold, block=False
+                        )
+                        if winner is not None:
+                            break
+                finally:
+                    await stream.aclose()
+            while winner is None and pending:
+                winner = await _atake_winner(pending, scored, threshold, block=True)
+        finally:
+            for task in pending:
+                task.cancel()
+            await asyncio.to_thread(_discard_losers, self._sink(), produced, winner)
+        if winner is None:
+            raise ValueError(_rejection_reason(scored))
+        return winner, len(scored)
+
+    async def _aproduce(
+        self,
+        request: ImageRequest,
+        fetch: Callable[[], Awaitable[ImageResult]] | None = None,
+        *,
+        variant: str = "",
+    ) -> tuple[ImageResult, bool]:
+        result, shared = await self._ainflight.do(
+            self._flight_key(request) + variant,
+            fetch or (lambda: self._afetch(request)),
+        )
+        if shared:
+            result = _coalesced_copy(result)
+        return result, shared
+
+    async def _afetch(self, request: ImageRequest) -> ImageResult:
+        if self._result_cache is not None:
+            cached = await asyncio.to_thread(self._cache_lookup, request)
+            if cached is not None:
+                return await self._apostprocess(request, cached)
+        try:
+            result = await self._acall_provider(
+                self._provider_name, self._provider, request
+            )
+        except Exception as exc:
+            if not self._should_fall_back(exc) or self._fallback_name is None:
+                raise
+            fallback = get_provider(self._fallback_name, cache=True)
+            result = await self._acall_provider(self._fallback_name, fallback, request)
+            result = _fallback_copy(result, self._provider_name)
+        return await self._apostprocess(request, result)
+
+    async def _apostprocess(
+        self, request: ImageRequest, result: ImageResult
+    ) -> ImageResult:
+        spec = _pending_postprocess(request, result)
+        if spec is None:
+            return result
+        postprocessor = self._postprocessor or get_postprocessor()
+        return await postprocessor.aprocess(result, spec)
+
+    async def _acall_provider(
+        self, name: str, provider: ImageProvider, request: ImageRequest
+    ) -> ImageResult:
+        async def attempt() -> ImageResult:
+            # The same per-provider slots as the sync path, so both share
+            # one PROVIDER_CONCURRENCY ceiling.
+            async with _aprovider_slot(name):
+                if isinstance(provider, AsyncImageProvider):
+                    return await provider.agenerate_image(request)
+                return await asyncio.to_thread(provider.generate_image, request)
+
+        return await acall_with_retry(
+            attempt, self._policy_for(name), get_circuit_breaker(name)
+        )
+
+    async def _acall_provider_group(
+        self, name: str, provider: ImageProvider, requests: Sequence[ImageRequest]
+    ) -> list[ImageResult]:
+        async def attempt() -> list[ImageResult]:
+            async with _aprovider_slot(name):
+                if isinstance(provider, AsyncImageProvider):
+                    return await provider.agenerate_images(requests)
+                return await asyncio.to_thread(provider.generate_images, requests)
+
+        return await acall_with_retry(
+            attempt, self._policy_for(name), get_circuit_breaker(name)
+        )
+
+    async def _aproduce_batch(self, requests: Sequence[ImageRequest]) -> list[Produced]:
+        if len(requests) == 1:
+            try:
+                return [await self._aproduce(requests[0])]
+            except Exception as exc:
+                return [exc]
+        owners = self._owners(requests)
+        leaders = [index for index, owner in enumerate(owners) if owner == index]
+        fetched = dict(
+            zip(
+                leaders,
+                await self._afetch_group([requests[i] for i in leaders]),
+                strict=True,
+            )
+        )
+        return [
+            _group_outcome(fetched[owner], shared=owner != index)
+            for index, owner in enumerate(owners)
+        ]
+
+    async def _afetch_group(
+        self, requests: Sequence[ImageRequest]
+    ) -> list[ImageResult | Exception]:
+        cached: list[ImageResult | None] = [None] * len(requests)
+        if self._result_cache is not None:
+            cached = [
+                await asyncio.to_thread(self._cache_lookup, request)
+                for request in requests
+            ]
+        misses = [
+            request
+            for request, hit in zip(requests, cached, strict=True)
+            if hit is None
+        ]
+        produced = iter(await self._agenerate_group(misses) if misses else [])
+        outcomes: list[ImageResult | Exception] = []
+        for request, hit in zip(requests, cached, strict=True):
+            result = hit if hit is not None else next(produced)
+            if isinstance(result, Exception):
+                outcomes.append(result)
+                continue
+            try:
+                outcomes.append(await self._apostprocess(request, result))
+            except Exception as exc:
+                outcomes.append(exc)
+        return outcomes
+
+    async def _agenerate_group(
+        self, requests: list[ImageRequest]
+    ) -> Sequence[ImageResult | Exception]:
+        try:
+            return await self._acall_provider_group(
+                self._provider_name, self._provider, requests
+            )
+        except Exception as exc:
+            if not self._should_fall_back(exc) or self._fallback_name is None:
+                return [exc] * len(requests)
+        fallback = get_provider(self._fallback_name, cache=True)
+        try:
+            results = await self._acall_provider_group(
+                self._fallback_name, fallback, requests
+            )
+        except Exception as exc:
+            return [exc] * len(requests)
+        return [_fallback_copy(result, self._provider_name) for result in results]
+
+    async def agenerate_batch(
+        self,
+        requests: Sequence[ImageRequest],
+        *,
+        max_workers: int | None = None,
+    ) -> list[ImageResult]:
+        """Async counterpart of generate_batch."""
+        items = await self.arun_batch(requests, max_workers=max_workers)
+        if not all(item.ok for item in items):
+            raise BatchGenerationError(items)
+        return [item.result for item in items if item.result is not None]
+
+    async def arun_batch(
+        self,
+        requests: Sequence[ImageRequest],
+        *,
+        max_workers: int | None = None,
+        on_complete: ItemCallback | None = None,
+        manifest: JobManifest | None = None,
+    ) -> list[BatchItemResult]:
+        """Async counterpart of run_batch, bounded by a semaphore.
+
+        ``on_complete`` is awaited with each item as soon as it finishes,
+        in completion order, e.g. to report progress. Items resumed from
+        ``manifest`` are reported too.
+        """
+        resumed = await asyncio.to_thread(self._resume, requests, manifest)
+        limit = min(
+            max_workers or self._max_workers,
+            PROVIDER_CONCURRENCY.get(self._provider_name, DEFAULT_MAX_WORKERS),
+        )
+        semaphore = asyncio.Semaphore(limit)
+        evaluation_slots = asyncio.Semaphore(self._evaluation_workers)
+
+        async def report(item: BatchItemResult, *, record: bool) -> BatchItemResult:
+            if manifest is not None and record:
+                await asyncio.to_thread(self._record, manifest, item)
+            if on_complete is not None:
+                await on_complete(item)
+            return item
+
+        async def finish(
+            member: Member, outcome: Produced, timings: StageTimings
+        ) -> BatchItemResult:
+            index, request = member
+            with collect_stages(timings):
+                if isinstance(outcome, Exception):
+                    METRICS.record_generation(self._provider_name, timings, "error")
+                    item = BatchItemResult(index=index, request=request, error=outcome)
+                else:
+                    result, shared = outcome
+                    async with evaluation_slots:
+                        item = await asyncio.to_thread(
+                            self._evaluate_item, index, request, result, shared, timings
+                        )
+            return await report(item, record=True)
+
+        async def run(members: list[Member]) -> list[BatchItemResult]:
+            timings = StageTimings()
+            with collect_stages(timings):
+                # The generation slot is released before evaluation so the
+                # next group can start while these images are evaluated.
+                async with semaphore:
+                    outcomes = await self._aproduce_batch(
+                        [request for _, request in members]
+                    )
+            return list(
+                await asyncio.gather(
+                    *(
+                        finish(
+                            member,
+                            outcome,
+                            timings if len(members) == 1 else timings.copy(),
+                        )
+                        for member, outcome in zip(members, outcomes, strict=True)
+                    )
+                )
+            )
+
+        replayed = [
+            await report(item, record=False) for item in resumed if item is not None
+        ]
+        pending = [
+            (index, request)
+            for index, request in enumerate(requests)
+            if resumed[index] is None
+        ]
+        batches = await asyncio.gather(
+            *(run(members) for members in self._groups(pending, limit))
+        )
+        items = [*replayed, *(item for batch in batches for item in batch)]
+        return sorted(items, key=lambda item: item.index)
+
+    def _policy_for(self, name: str) -> RetryPolicy:
+        return self._retry_policy or get_retry_policy(name)
+
+    def _should_fall_back(self, exc: Exception) -> bool:
+        if isinstance(exc, CircuitOpenError):
+            return True
+        return self._policy_for(self._provider_name).is_retryable(exc)
+
+    def _fingerprint(
+        self, request: ImageRequest, *, include_location: bool = False
+    ) -> str:
+        model: str | None = getattr(self._provider, "model", None)
+        return request_fingerprint(
+            request, self._provider_name, model, include_location=include_location
+        )
+
+    def _sink(self) -> StorageSink:
+        # Candidates live wherever the provider writes images.
+        if isinstance(self._provider, SinkBacked):
+            return self._provider.sink
+        return LOCAL_SINK
+
+    def _flight_key(self, request: ImageRequest) -> str:
+        return self._fingerprint(request, include_location=True)
+
+    def _cache_lookup(self, request: ImageRequest) -> ImageResult | None:
+        if self._result_cache is None:
+            return None
+        with timed_stage("cache_lookup"):
+            return self._result_cache.lookup(
+                self._fingerprint(request), request, self._provider_name
+            )
+
+    def _cache_store(self, request: ImageRequest, result: ImageResult) -> None:
+        if self._result_cache is None or result.metadata.get("cache") == "hit":
+            return
+        # The key names the primary provider; a fallback's image must not
+        # answer later requests once the primary has recovered.
+        if "fallback_from" in result.metadata or not _on_disk(result):
+            return
+        with timed_stage("cache_store"):
+            self._result_cache.store(self._fingerprint(request), result)
+
+    def _finish(
+        self,
+        request: ImageRequest,
+        result: ImageResult,
+        timings: StageTimings,
+        outcome: str | None = None,
+    ) -> ImageResult:
+        indexed = outcome != "rejected" and _on_disk(result)
+        if self._perceptual_index is not None and indexed:
+            result = self._index_hash(result)
+        result = _with_timings(result, timings)
+        if indexed:
+            self._index_asset(request, result)
+        METRICS.record_generation(
+            self._provider_name, timings, outcome or _outcome(result)
+        )
         return result
 
-    def generate_batch(self, requests: Sequence[ImageRequest]) -> list[ImageResult]:
-        results = self._provider.generate_images(requests)
-        if self._evaluator is not None:
-            for result in results:
-                self._maybe_evaluate(result)
-        return results
+    async def _afinish(
+        self, request: ImageRequest, result: ImageResult, timings: StageTimings
+    ) -> ImageResult:
+        indexed = _on_disk(result)
+        if self._perceptual_index is not None and indexed:
+            # Decoding and hashing the image is CPU work; keep it off the loop.
+            result = await asyncio.to_thread(self._index_hash, result)
+        result = _with_timings(result, timings)
+        if indexed and self._asset_index is not None:
+            # The index is a SQLite write; keep it off the event loop.
+            await asyncio.to_thread(self._index_asset, request, result)
+        METRICS.record_generation(self._provider_name, timings, _outcome(result))
+        return result
+
+    def _index_asset(self, request: ImageRequest, result: ImageResult) -> None:
+        if self._asset_index is None:
+            return
+        try:
+            self._asset_index.add(self._fingerprint(request), request, result)
+        except Exception:
+            # The image is already delivered; a failed index write only
+            # keeps it out of lookups, so it must not fail the request.
+            METRICS.inc("asset_index_errors_total", provider=self._provider_name)
+
+    def _index_hash(self, result: ImageResult) -> ImageResult:
+        assert self._perceptual_index is not None
+        try:
+            image_hash = self._perceptual_index.add(result.path)
+        except OSError:
+            # Not a decodable image; there is nothing to compare it with.
+            return result
+        metadata = dict(result.metadata)
+        metadata["phash"] = f"{image_hash:016x}"
+        return replace(result, metadata=metadata)
 
     def _maybe_evaluate(self, result: ImageResult) -> None:
         if self._evaluator is None:
             return
-        evaluation = self._evaluator.evaluate(result)
+        with timed_stage("evaluate"):
+            evaluation = self._evaluator.evaluate(result)
         if not evaluation.passed:
             reason = evaluation.reason or "evaluation failed"
             raise ValueError(reason)
 
 
+def _score(evaluator: ImageEvaluator, candidate: ImageResult) -> EvaluationResult:
+    with timed_stage("evaluate"):
+        return evaluator.evaluate(candidate)
+
+
+def _qualifies(evaluation: EvaluationResult, threshold: float | None) -> bool:
+    if not evaluation.passed:
+        return False
+    if threshold is None:
+        return True
+    return evaluation.score is not None and evaluation.score >= threshold
+
+
+def _best_of(newly_scored: list[Scored], threshold: float | None) -> Scored | None:
+    qualified = [pair for pair in newly_scored if _qualifies(pair[1], threshold)]
+    if not qualified:
+        return None
+    return max(qualified, key=lambda pair: pair[1].score or 0.0)
+
+
+def _take_winner(
+    pending: dict[Future[EvaluationResult], ImageResult],
+    scored: list[Scored],
+    threshold: float | None,
+    *,
+    block: bool,
+) -> Scored | None:
+    done, _ = wait(pending, timeout=None if block else 0, return_when=FIRST_COMPLETED)
+    newly_scored = [(pending.pop(future), future.result()) for future in done]
+    scored.extend(newly_scored)
+    return _best_of(newly_scored, threshold)
+
+
+async def _atake_winner(
+    pending: dict[asyncio.Future[EvaluationResult], ImageResult],
+    scored: list[Scored],
+    threshold: float | None,
+    *,
+    block: bool,
+) -> Scored | None:
+    if not block and not any(task.done() for task in pending):
+        return None
+    done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+    newly_scored = [(pending.pop(task), task.result()) for task in done]
+    scored.extend(newly_scored)
+    return _best_of(newly_scored, threshold)
+
+
+def _flatten(
+    staged: Future[list[Future[BatchItemResult]]], count: int
+) -> list[Future[BatchItemResult]]:
+    """Collapse a group's generation future and its items' evaluation futures.
+
+    Returns one future per item of the group, resolved with its outcome.
+    """
+    flat: list[Future[BatchItemResult]] = [Future() for _ in range(count)]
+
+    def chain(outer: Future[list[Future[BatchItemResult]]]) -> None:
+        if outer.cancelled():
+            for future in flat:
+                future.cancel()
+        elif (exc := outer.exception()) is not None:
+            for future in flat:
+                future.set_exception(exc)
+        else:
+            for future, inner in zip(flat, outer.result(), strict=True):
+                inner.add_done_callback(partial(_forward, future))
+
+    staged.add_done_callback(chain)
+    return flat
+
+
+def _forward(flat: Future[BatchItemResult], inner: Future[BatchItemResult]) -> None:
+    if inner.cancelled():
+        flat.cancel()
+    elif (exc := inner.exception()) is not None:
+        flat.set_exception(exc)
+    else:
+        flat.set_result(inner.result())
+
+
+def _group_outcome(outcome: ImageResult | Exception, *, shared: bool) -> Produced:
+    if isinstance(outcome, Exception):
+        return outcome
+    return (_coalesced_copy(outcome), True) if shared else (outcome, False)
+
+
+def _discard_losers(
+    sink: StorageSink, produced: list[ImageResult], winner: Scored | None
+) -> None:
+    for candidate in produced:
+        if winner is not None and candidate is winner[0]:
+            continue
+        # Best effort: a loser left behind must not hide the winner.
+        with contextlib.suppress(Exception):
+            sink.delete(candidate.path)
+
+
+def _best_variant(candidates: int, threshold: float | None) -> str:
+    # Best-of calls share flights only with identical selection settings.
+    return f"|best:{candidates}:{threshold}"
+
+
+def _rejection_reason(scored: list[Scored]) -> str:
+    if not scored:
+        return "no candidates were produced"
+    _, best = max(scored, key=lambda pair: pair[1].score or 0.0)
+    reason = best.reason or "evaluation failed"
+    return f"none of {len(scored)} candidates passed evaluation: {reason}"
+
+
+def _outcome(result: ImageResult) -> str:
+    if result.metadata.get("cache") == "hit":
+        return "cache_hit"
+    if "coalesced" in result.metadata:
+        return "coalesced"
+    if "fallback_from" in result.metadata:
+        return "fallback"
+    return "ok"
+
+
+def _on_disk(result: ImageResult) -> bool:
+    # Post-processing, caching and indexing read the image back from its path.
+    return result.metadata.get("storage", "local") == "local"
+
+
+def _postprocess_spec(request: ImageRequest) -> PostProcessSpec | None:
+    spec = request.metadata.get(POSTPROCESS_KEY)
+    return PostProcessSpec.parse(spec) if spec else None
+
+
+def _pending_postprocess(
+    request: ImageRequest, result: ImageResult
+) -> PostProcessSpec | None:
+    spec = _postprocess_spec(request)
+    if spec is None or not _on_disk(result):
+        return None
+    if result.metadata.get("cache") == "hit":
+        # Cached images were processed before they were stored; only the
+        # thumbnails next to this output path are still missing.
+        return spec.thumbnails_only() if spec.thumbnails else None
+    return spec
+
+
+def _with_timings(result: ImageResult, timings: StageTimings) -> ImageResult:
+    # Timings are attached last so cached and coalesced copies never carry
+    # the timings of the generation that produced them.
+    metadata = dict(result.metadata)
+    metadata.update(timings.as_metadata())
+    return replace(result, metadata=metadata)
+
+
+def _coalesced_copy(result: ImageResult) -> ImageResult:
+    metadata = dict(result.metadata)
+    metadata["coalesced"] = "true"
+    return replace(result, metadata=metadata)
+
+
+def _fallback_copy(result: ImageResult, primary: str) -> ImageResult:
+    metadata = dict(result.metadata)
+    metadata["fallback_from"] = primary
+    return replace(result, metadata=metadata)
+
+
 def generate(
     request: ImageRequest, evaluator: ImageEvaluator | None = None
 ) -> ImageResult:
-    """Generate a single image with optional evaluation."""
-    provider_name = request.provider.value if request.provider else None
-    client = ImageClient(provider_name=provider_name, evaluator=evaluator)
-    return client.generate(request)
+    """Generate a single image with optional evaluation.
+
+    Reuses the cached provider instance so repeated calls keep their SDK
+    client and warm connection pool.
+    """
+    return _shared_client(request, evaluator).generate(request)
+
+
+async def agenerate(
+    request: ImageRequest, evaluator: ImageEvaluator | None = None
+) -> ImageResult:
+    """Async counterpart of generate."""
+    return await _shared_client(request, evaluator).agenerate(request)
+
+
+async def arun_batch(
+    requests: Sequence[ImageRequest],
+    evaluator: ImageEvaluator | None = None,
+    *,
+    max_workers: int = DEFAULT_MAX_WORKERS,
+    on_complete: ItemCallback | None = None,
+    manifest: JobManifest | None = None,
+) -> list[BatchItemResult]:
+    """Run requests that may target different providers concurrently.
+
+    Requests are grouped by provider and each group runs on the shared
+    client for that provider, bounded by ``max_workers`` and the provider's
+    concurrency ceiling. Items are returned in input order.
+    """
+    groups: dict[str, list[int]] = {}
+    for index, request in enumerate(requests):
+        groups.setdefault(_provider_name_for(request), []).append(index)
+    items: list[BatchItemResult | None] = [None] * len(requests)
+
+    async def run_group(provider_name: str, indexes: list[int]) -> None:
+        async def record(item: BatchItemResult) -> None:
+            item = replace(item, index=indexes[item.index])
+            items[item.index] = item
+            if on_complete is not None:
+                await on_complete(item)
+
+        client = _client_for(provider_name, evaluator)
+        await client.arun_batch(
+            [requests[index] for index in indexes],
+            max_workers=max_workers,
+            on_complete=record,
+            manifest=manifest,
+        )
+
+    await asyncio.gather(
+        *(run_group(name, indexes) for name, indexes in groups.items())
+    )
+    return [item for item in items if item is not None]
+
+
+def _provider_name_for(request: ImageRequest) -> str:
+    return request.provider.value if request.provider else auto_detect_provider()
+
+
+def _shared_client(
+    request: ImageRequest, evaluator: ImageEvaluator | None
+) -> ImageClient:
+    return _client_for(_provider_name_for(request), evaluator)
+
+
+def _client_for(provider_name: str, evaluator: ImageEvaluator | None) -> ImageClient:
+    provider = get_provider(provider_name, cache=True)
+    result_cache = result_cache_from_env()
+    fallback = os.environ.get(FALLBACK_PROVIDER_ENV)
+    asset_index = asset_index_from_env()
+    perceptual_index = perceptual_index_from_env()
+    # The client holds every object keyed by id, so no id can be reused
+    # while its entry is alive.
+    parts = (provider, evaluator, result_cache, asset_index, perceptual_index)
+    key = (provider_name, fallback, *(id(part) for part in parts))
+    with _shared_clients_lock:
+        client = _shared_clients.get(key)
+        if client is None:
+            client = ImageClient(
+                provider_name=provider_name,
+                evaluator=evaluator,
+                provider=provider,
+                result_cache=result_cache,
+                fallback_provider=fallback,
+                asset_index=asset_index,
+                perceptual_index=perceptual_index,
+            )
+            _shared_clients[key] = client
+        return client
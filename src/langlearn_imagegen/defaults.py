@@ -0,0 +1,7 @@
+"""Defaults shared by the client and the CLI, kept free of heavy imports."""
+
+from __future__ import annotations
+
+__all__ = ["DEFAULT_MAX_WORKERS"]
+
+DEFAULT_MAX_WORKERS = 8
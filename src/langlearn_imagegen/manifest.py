@@ -0,0 +1,218 @@
+"""Append-only manifest of finished batch items, for resuming batches."""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from types import TracebackType
+from typing import IO, TYPE_CHECKING, Any, Self
+
+from langlearn_types import EvaluationResult, ImageProviderId, ImageResult
+
+from langlearn_imagegen.storage import LOCAL_SINK
+from langlearn_imagegen.utils import write_atomic
+
+if TYPE_CHECKING:
+    from langlearn_imagegen.core import BatchItemResult
+    from langlearn_imagegen.storage import StorageSink
+
+__all__ = ["JobManifest", "ManifestEntry"]
+
+
+@dataclass(frozen=True)
+class ManifestEntry:
+    """Latest recorded outcome of one batch item.
+
+    ``state`` is ``completed``, ``rejected`` (generated but failed
+    evaluation) or ``failed``. Only completed items whose image is still in
+    the storage sink it was written to are skipped when a batch resumes.
+    """
+
+    key: str
+    state: str
+    prompt: str
+    path: str | None = None
+    provider: str | None = None
+    model: str | None = None
+    revised_prompt: str | None = None
+    metadata: dict[str, str] = field(default_factory=dict[str, str])
+    evaluation: dict[str, Any] | None = None
+    error: str | None = None
+    updated: float = 0.0
+
+    @property
+    def resumable(self) -> bool:
+        """Whether the item completed and its image is still on local disk."""
+        return self.resumable_in(LOCAL_SINK)
+
+    def resumable_in(self, sink: StorageSink) -> bool:
+        """Whether the item completed and its image is still in ``sink``."""
+        return (
+            self.state == "completed"
+            and self.path is not None
+            and self.provider is not None
+            and self.metadata.get("storage", LOCAL_SINK.name) == sink.name
+            and sink.exists(Path(self.path))
+        )
+
+    def to_result(self) -> ImageResult:
+        if self.path is None or self.provider is None:
+            raise ValueError(f"Manifest entry {self.key} has no image.")
+        metadata = dict(self.metadata)
+        metadata["manifest"] = "resumed"
+        return ImageResult(
+            path=Path(self.path),
+            prompt=self.prompt,
+            provider=ImageProviderId(self.provider),
+            revised_prompt=self.revised_prompt,
+            model=self.model,
+            metadata=metadata,
+        )
+
+    def to_evaluation(self) -> EvaluationResult | None:
+        if self.evaluation is None:
+            return None
+        return EvaluationResult(
+            passed=bool(self.evaluation["passed"]),
+            score=self.evaluation.get("score"),
+            reason=self.evaluation.get("reason"),
+            metadata=dict(self.evaluation.get("metadata", {})),
+        )
+
+
+class JobManifest:
+    """Durable JSONL record of batch items keyed by request fingerprint.
+
+    Each finished item appends one line, flushed and fsynced before the
+    batch moves on, so a crash loses at most the item being written. The
+    last line for a key wins, and a torn final line is ignored on load.
+    Retries append rather than rewrite; ``compact`` drops superseded lines.
+    """
+
+    def __init__(self, path: Path | str) -> None:
+        self._path = Path(path)
+        self._lock = threading.Lock()
+        self._handle: IO[str] | None = None
+        self._entries = self._load()
+
+    @property
+    def path(self) -> Path:
+        return self._path
+
+    def get(self, key: str) -> ManifestEntry | None:
+        with self._lock:
+            return self._entries.get(key)
+
+    def entries(self) -> list[ManifestEntry]:
+        with self._lock:
+            return list(self._entries.values())
+
+    def summary(self) -> dict[str, int]:
+        """Count the latest entries per state."""
+        counts: dict[str, int] = {}
+        for entry in self.entries():
+            counts[entry.state] = counts.get(entry.state, 0) + 1
+        return counts
+
+    def record(self, key: str, item: BatchItemResult) -> ManifestEntry:
+        """Append the outcome of ``item`` under ``key``."""
+        result = item.result
+        evaluation = item.evaluation
+        if item.error is not None:
+            state = "failed"
+        elif item.ok:
+            state = "completed"
+        else:
+            state = "rejected"
+        entry = ManifestEntry(
+            key=key,
+            state=state,
+            prompt=item.request.prompt,
+            path=str(result.path) if result is not None else None,
+            provider=result.provider.value if result is not None else None,
+            model=result.model if result is not None else None,
+            revised_prompt=result.revised_prompt if result is not None else None,
+            metadata=dict(result.metadata) if result is not None else {},
+            evaluation=(
+                {
+                    "passed": evaluation.passed,
+                    "score": evaluation.score,
+                    "reason": evaluation.reason,
+                    "metadata": dict(evaluation.metadata),
+                }
+                if evaluation is not None
+                else None
+            ),
+            error=str(item.error) if item.error is not None else None,
+            updated=time.time(),
+        )
+        line = json.dumps(asdict(entry)) + "\n"
+        with self._lock:
+            handle = self._open()
+            handle.write(line)
+            handle.flush()
+            os.fsync(handle.fileno())
+            self._entries[key] = entry
+        return entry
+
+    def compact(self) -> None:
+        """Rewrite the manifest with only the latest line per key."""
+        with self._lock:
+            self._close()
+            lines = [
+                json.dumps(asdict(entry)) + "\n" for entry in self._entries.values()
+            ]
+            write_atomic(self._path, "".join(lines).encode("utf-8"))
+
+    def close(self) -> None:
+        with self._lock:
+            self._close()
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self.close()
+
+    def _open(self) -> IO[str]:
+        if self._handle is None:
+            self._path.parent.mkdir(parents=True, exist_ok=True)
+            torn = False
+            if self._path.exists() and self._path.stat().st_size:
+                with self._path.open("rb") as existing:
+                    existing.seek(-1, os.SEEK_END)
+                    torn = existing.read(1) != b"\n"
+            handle = self._path.open("a", encoding="utf-8")
+            # Terminate a torn line left by a crash so the next entry parses.
+            if torn:
+                handle.write("\n")
+            self._handle = handle
+        return self._handle
+
+    def _close(self) -> None:
+        if self._handle is not None:
+            self._handle.close()
+            self._handle = None
+
+    def _load(self) -> dict[str, ManifestEntry]:
+        entries: dict[str, ManifestEntry] = {}
+        try:
+            text = self._path.read_text("utf-8")
+        except FileNotFoundError:
+            return entries
+        for line in text.splitlines():
+            try:
+                entry = ManifestEntry(**json.loads(line))
+            except (TypeError, ValueError):
+                continue
+            entries[entry.key] = entry
+        return entries
@@ -0,0 +1,374 @@
+"""Per-stage generation timings and process-wide metrics.
+
+Code on the generation path reports what it spends with ``record_stage`` or
+``timed_stage``. Inside ``collect_stages`` (which ImageClient opens around
+every generation) those reports accumulate on a StageTimings that ends up in
+``ImageResult.metadata`` as ``timing_<stage>_ms`` and ``bytes_<stage>``
+entries; outside it they are ignored. Finished generations are folded into
+the process-wide METRICS registry, which can be read as JSON, rendered in
+the Prometheus text format, served over HTTP or forwarded to OpenTelemetry.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import os
+import threading
+import time
+from collections.abc import Callable, Generator, Mapping
+from contextvars import ContextVar
+from importlib import import_module
+from importlib.util import find_spec
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from http.server import ThreadingHTTPServer
+
+__all__ = [
+    "DEFAULT_BUCKETS",
+    "METRICS",
+    "METRICS_PORT_ENV",
+    "OTEL_ENV",
+    "MetricsRegistry",
+    "StageTimings",
+    "collect_stages",
+    "enable_opentelemetry",
+    "record_stage",
+    "serve_prometheus",
+    "start_exporters_from_env",
+    "timed_stage",
+]
+
+METRICS_PORT_ENV = "LANGLEARN_IMAGEGEN_METRICS_PORT"
+OTEL_ENV = "LANGLEARN_IMAGEGEN_OTEL"
+
+# Histogram upper bounds in seconds, from cache hits to slow generations.
+DEFAULT_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+)
+
+_PREFIX = "langlearn_imagegen_"
+
+Labels = tuple[tuple[str, str], ...]
+Listener = Callable[[str, str, float, Mapping[str, str]], None]
+
+
+class StageTimings:
+    """Seconds and bytes spent per stage of one generation.
+
+    Repeated stages (retries, several candidates) add up. Safe to share
+    between the threads and tasks serving a single generation.
+    """
+
+    def __init__(self) -> None:
+        self._started = time.perf_counter()
+        self._lock = threading.Lock()
+        self._seconds: dict[str, float] = {}
+        self._bytes: dict[str, int] = {}
+
+    def add(self, stage: str, seconds: float, nbytes: int | None = None) -> None:
+        with self._lock:
+            self._seconds[stage] = self._seconds.get(stage, 0.0) + seconds
+            if nbytes is not None:
+                self._bytes[stage] = self._bytes.get(stage, 0) + nbytes
+
+    @property
+    def seconds(self) -> dict[str, float]:
+        with self._lock:
+            return dict(self._seconds)
+
+    @property
+    def bytes(self) -> dict[str, int]:
+        with self._lock:
+            return dict(self._bytes)
+
+    def copy(self) -> StageTimings:
+        """Return an independent copy, e.g. for each item of a grouped call."""
+        clone = StageTimings()
+        clone._started = self._started
+        with self._lock:
+            clone._seconds = dict(self._seconds)
+            clone._bytes = dict(self._bytes)
+        return clone
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self._started
+
+    def as_metadata(self) -> dict[str, str]:
+        """Render as ImageResult metadata entries, including the total."""
+        metadata = {
+            f"timing_{stage}_ms": f"{seconds * 1000:.3f}"
+            for stage, seconds in sorted(self.seconds.items())
+        }
+        metadata["timing_total_ms"] = f"{self.elapsed() * 1000:.3f}"
+        for stage, nbytes in sorted(self.bytes.items()):
+            metadata[f"bytes_{stage}"] = str(nbytes)
+        return metadata
+
+
+_current: ContextVar[StageTimings | None] = ContextVar(
+    "langlearn_imagegen_stage_timings", default=None
+)
+
+
+@contextlib.contextmanager
+def collect_stages(timings: StageTimings | None = None) -> Generator[StageTimings]:
+    """Collect stage reports made in this context (and tasks/threads it spawns).
+
+    Pass an existing ``timings`` to resume collecting for a generation whose
+    stages run in several places, such as a separate evaluation pool.
+    """
+    timings = timings if timings is not None else StageTimings()
+    token = _current.set(timings)
+    try:
+        yield timings
+    finally:
+        _current.reset(token)
+
+
+def record_stage(stage: str, seconds: float, nbytes: int | None = None) -> None:
+    """Attribute time (and optionally bytes) to a stage of the current generation."""
+    timings = _current.get()
+    if timings is not None:
+        timings.add(stage, seconds, nbytes)
+
+
+@contextlib.contextmanager
+def timed_stage(stage: str) -> Generator[None]:
+    """Record the wall time of the enclosed block under ``stage``."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - started)
+
+
+class _Histogram:
+    def __init__(self, buckets: tuple[float, ...]) -> None:
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.sum += value
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+
+    def quantile(self, fraction: float) -> float | None:
+        # Upper bound of the bucket holding the quantile (None past the last
+        # bucket); coarse, but enough to spot which stage dominates.
+        if not self.count:
+            return None
+        rank = fraction * self.count
+        for bound, cumulative in zip(self.buckets, self.counts, strict=True):
+            if cumulative >= rank:
+                return bound
+        return None
+
+
+class MetricsRegistry:
+    """Thread-safe counters and histograms keyed by name and labels."""
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        self._buckets = buckets
+        self._lock = threading.Lock()
+        self._counters: dict[tuple[str, Labels], float] = {}
+        self._histograms: dict[tuple[str, Labels], _Histogram] = {}
+        self._listeners: list[Listener] = []
+
+    def inc(self, name: str, value: float = 1.0, **labels: str) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+            listeners = list(self._listeners)
+        for listener in listeners:
+            listener("counter", name, value, labels)
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram(self._buckets)
+            histogram.observe(value)
+            listeners = list(self._listeners)
+        for listener in listeners:
+            listener("histogram", name, value, labels)
+
+    def add_listener(self, listener: Listener) -> None:
+        """Forward every future observation, e.g. to an exporter."""
+        with self._lock:
+            self._listeners.append(listener)
+
+    def record_generation(
+        self, provider: str, timings: StageTimings, outcome: str
+    ) -> None:
+        """Fold one finished generation into the process-wide metrics."""
+        self.inc("generations_total", provider=provider, outcome=outcome)
+        self.observe("generation_seconds", timings.elapsed(), provider=provider)
+        for stage, seconds in timings.seconds.items():
+            self.observe("stage_seconds", seconds, provider=provider, stage=stage)
+        for stage, nbytes in timings.bytes.items():
+            self.inc("stage_bytes_total", nbytes, provider=provider, stage=stage)
+
+    def snapshot(self) -> dict[str, list[dict[str, object]]]:
+        """Return every metric as JSON-ready data."""
+        with self._lock:
+            counters: list[dict[str, object]] = [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(self._counters.items())
+            ]
+            histograms: list[dict[str, object]] = [
+                {
+                    "name": name,
+                    "labels": dict(labels),
+                    "count": histogram.count,
+                    "sum": round(histogram.sum, 6),
+                    "mean": round(histogram.sum / histogram.count, 6),
+                    "p50": histogram.quantile(0.5),
+                    "p95": histogram.quantile(0.95),
+                    "p99": histogram.quantile(0.99),
+                }
+                for (name, labels), histogram in sorted(self._histograms.items())
+            ]
+        return {"counters": counters, "histograms": histograms}
+
+    def render_prometheus(self) -> str:
+        """Render every metric in the Prometheus text exposition format."""
+        lines: list[str] = []
+        with self._lock:
+            seen: set[str] = set()
+            for (name, labels), value in sorted(self._counters.items()):
+                if name not in seen:
+                    lines.append(f"# TYPE {_PREFIX}{name} counter")
+                    seen.add(name)
+                lines.append(f"{_PREFIX}{name}{_format_labels(labels)} {value:g}")
+            for (name, labels), histogram in sorted(self._histograms.items()):
+                if name not in seen:
+                    lines.append(f"# TYPE {_PREFIX}{name} histogram")
+                    seen.add(name)
+                for bound, cumulative in zip(
+                    histogram.buckets, histogram.counts, strict=True
+                ):
+                    bucket = (*labels, ("le", f"{bound:g}"))
+                    lines.append(
+                        f"{_PREFIX}{name}_bucket{_format_labels(bucket)} {cumulative}"
+                    )
+                inf = (*labels, ("le", "+Inf"))
+                lines.append(
+                    f"{_PREFIX}{name}_bucket{_format_labels(inf)} {histogram.count}"
+                )
+                lines.append(
+                    f"{_PREFIX}{name}_sum{_format_labels(labels)} {histogram.sum:g}"
+                )
+                lines.append(
+                    f"{_PREFIX}{name}_count{_format_labels(labels)} {histogram.count}"
+                )
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    pairs = (f'{key}="{_escape(value)}"' for key, value in labels)
+    return "{" + ",".join(pairs) + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+METRICS = MetricsRegistry()
+
+
+def serve_prometheus(
+    port: int, host: str = "127.0.0.1", registry: MetricsRegistry = METRICS
+) -> ThreadingHTTPServer:
+    """Serve ``registry`` for Prometheus scraping from a daemon thread."""
+    # Imported here: http.server is slow to import and only needed once an
+    # exporter is actually started.
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class PrometheusHandler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            body = registry.render_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format: str, *args: object) -> None:
+            return
+
+    server = ThreadingHTTPServer((host, port), PrometheusHandler)
+    thread = threading.Thread(
+        target=server.serve_forever, name="imagegen-metrics", daemon=True
+    )
+    thread.start()
+    return server
+
+
+def enable_opentelemetry(
+    meter_provider: Any = None, registry: MetricsRegistry = METRICS
+) -> None:
+    """Mirror ``registry`` observations into OpenTelemetry instruments.
+
+    Requires the optional ``otel`` extra
+    (``pip install punt-langlearn-imagegen[otel]``); exporters are whatever
+    the application configured on the meter provider.
+    """
+    if find_spec("opentelemetry") is None:
+        raise RuntimeError(
+            "OpenTelemetry export requires punt-langlearn-imagegen[otel]."
+        )
+    otel_metrics: Any = import_module("opentelemetry.metrics")
+    meter = otel_metrics.get_meter("langlearn_imagegen", meter_provider=meter_provider)
+    instruments: dict[str, Any] = {}
+    lock = threading.Lock()
+
+    def forward(kind: str, name: str, value: float, labels: Mapping[str, str]) -> None:
+        with lock:
+            instrument = instruments.get(name)
+            if instrument is None:
+                full_name = f"{_PREFIX}{name}"
+                if kind == "counter":
+                    instrument = meter.create_counter(full_name)
+                else:
+                    instrument = meter.create_histogram(full_name, unit="s")
+                instruments[name] = instrument
+        if kind == "counter":
+            instrument.add(value, attributes=dict(labels))
+        else:
+            instrument.record(value, attributes=dict(labels))
+
+    registry.add_listener(forward)
+
+
+def start_exporters_from_env() -> None:
+    """Start the exporters requested through the environment, if any."""
+    port = os.environ.get(METRICS_PORT_ENV)
+    if port:
+        serve_prometheus(int(port))
+    if os.environ.get(OTEL_ENV, "").lower() in {"1", "true", "yes"}:
+        enable_opentelemetry()
@@ -0,0 +1,311 @@
+"""Perceptual hashes of images and an index for finding near-duplicates.
+
+Images are reduced to a 64-bit difference hash (dHash): the picture is
+shrunk to 9x8 grey pixels and each bit records whether a pixel is brighter
+than its right-hand neighbour. Resized, recompressed or slightly recoloured
+copies of a photo differ in only a few bits, so two images whose hashes
+are within a small Hamming distance are treated as the same picture.
+
+A PerceptualIndex holds the hashes of a deck's images in a bit-packed
+NumPy array, so a lookup XORs the query against every entry at once.
+Requires the optional ``dedup`` extra
+(``pip install punt-langlearn-imagegen[dedup]``).
+"""
+
+from __future__ import annotations
+
+import io
+import os
+import threading
+from collections.abc import Sequence
+from functools import lru_cache
+from importlib import import_module
+from importlib.util import find_spec
+from pathlib import Path
+from types import TracebackType
+from typing import IO, Any, Self
+
+from langlearn_imagegen.metrics import timed_stage
+from langlearn_imagegen.utils import write_atomic
+
+__all__ = [
+    "DEFAULT_MAX_DISTANCE",
+    "PHASH_INDEX_ENV",
+    "PerceptualIndex",
+    "hash_bytes",
+    "hash_image",
+    "hash_images",
+    "perceptual_index_from_env",
+]
+
+PHASH_INDEX_ENV = "LANGLEARN_IMAGEGEN_PHASH_INDEX"
+
+# Hashes at most this many bits apart (of 64) count as the same picture.
+DEFAULT_MAX_DISTANCE = 8
+
+_HASH_SIZE = 8
+_HASH_BITS = _HASH_SIZE * _HASH_SIZE
+_TOMBSTONE = "-"
+
+
+def _require(name: str) -> Any:
+    if find_spec("numpy") is None or find_spec("PIL") is None:
+        raise RuntimeError(
+            "Near-duplicate detection requires punt-langlearn-imagegen[dedup]."
+        )
+    return import_module(name)
+
+
+def _thumbnail(source: Path | IO[bytes]) -> Any:
+    pil_image = _require("PIL.Image")
+    with pil_image.open(source) as image:
+        # JPEGs decode straight to a reduced scale, skipping most of the work.
+        image.draft("L", (4 * _HASH_SIZE, 4 * _HASH_SIZE))
+        grey = image.convert("L").resize(
+            (_HASH_SIZE + 1, _HASH_SIZE), pil_image.Resampling.BILINEAR
+        )
+        return _require("numpy").asarray(grey, dtype="int16")
+
+
+def _pack(thumbnails: Any) -> Any:
+    """Hash a (count, 8, 9) stack of grey thumbnails to uint64 values."""
+    np = _require("numpy")
+    bits = thumbnails[:, :, 1:] > thumbnails[:, :, :-1]
+    packed = np.packbits(bits.reshape(len(thumbnails), -1), axis=1)
+    return packed.view(">u8").reshape(-1).astype(np.uint64)
+
+
+def hash_images(paths: Sequence[Path]) -> list[int]:
+    """Difference-hash several image files in one vectorised pass."""
+    if not paths:
+        return []
+    np = _require("numpy")
+    with timed_stage("phash"):
+        stack = np.stack([_thumbnail(path) for path in paths])
+        return [int(value) for value in _pack(stack)]
+
+
+def hash_image(path: Path) -> int:
+    """Difference-hash one image file."""
+    return hash_images([path])[0]
+
+
+def hash_bytes(data: bytes) -> int:
+    """Difference-hash an encoded image held in memory."""
+    np = _require("numpy")
+    with timed_stage("phash"):
+        return int(_pack(np.stack([_thumbnail(io.BytesIO(data))]))[0])
+
+
+class PerceptualIndex:
+    """Perceptual hashes of a deck's images, keyed by path.
+
+    ImageClient adds every delivered image, and PexelsProvider consults the
+    index to pass over search hits that repeat a picture already in the
+    deck. With a ``path``, entries are appended to a text file (one
+    ``<hash> <path>`` line each, the last line for a path wins) and loaded
+    again on start; ``compact`` drops superseded lines.
+    """
+
+    def __init__(
+        self,
+        path: Path | str | None = None,
+        *,
+        max_distance: int = DEFAULT_MAX_DISTANCE,
+    ) -> None:
+        np = _require("numpy")
+        self._np = np
+        self._path = Path(path) if path is not None else None
+        self._max_distance = max_distance
+        self._lock = threading.Lock()
+        self._handle: IO[str] | None = None
+        self._hashes = np.zeros(64, dtype=np.uint64)
+        self._paths: list[str] = []
+        self._slots: dict[str, int] = {}
+        for key, value in self._load().items():
+            self._put(key, value)
+
+    @property
+    def path(self) -> Path | None:
+        return self._path
+
+    @property
+    def max_distance(self) -> int:
+        return self._max_distance
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._slots)
+
+    def add(self, path: Path, image_hash: int | None = None) -> int:
+        """Record the image at ``path``, hashing the file unless given."""
+        if image_hash is None:
+            image_hash = hash_image(path)
+        key = str(path.resolve())
+        with self._lock:
+            self._put(key, image_hash)
+            self._append(f"{image_hash:016x}\t{key}\n")
+        return image_hash
+
+    def discard(self, path: Path) -> None:
+        key = str(path.resolve())
+        with self._lock:
+            if key in self._slots:
+                self._remove(key)
+                self._append(f"{_TOMBSTONE}\t{key}\n")
+
+    def nearest(
+        self, image_hash: int, *, exclude: Path | None = None
+    ) -> tuple[Path, int] | None:
+        """Return the closest indexed image and its distance in bits."""
+        with self._lock:
+            return self._nearest(image_hash, exclude)
+
+    def find_duplicate(
+        self, image_hash: int, *, exclude: Path | None = None
+    ) -> Path | None:
+        """Return an indexed image within ``max_distance`` bits, if any."""
+        with self._lock:
+            match = self._nearest(image_hash, exclude)
+        return match[0] if match is not None else None
+
+    def claim(self, path: Path, image_hash: int) -> Path | None:
+        """Record ``image_hash`` for ``path`` unless it duplicates another image.
+
+        Checking and recording happen under one lock, so concurrent requests
+        cannot both claim the same picture. Returns the duplicate, if any.
+        """
+        key = str(path.resolve())
+        with self._lock:
+            match = self._nearest(image_hash, path)
+            if match is not None:
+                return match[0]
+            self._put(key, image_hash)
+            self._append(f"{image_hash:016x}\t{key}\n")
+        return None
+
+    def prune(self) -> int:
+        """Forget images that no longer exist; return how many."""
+        with self._lock:
+            missing = [key for key in self._slots if not Path(key).exists()]
+            for key in missing:
+                self._remove(key)
+                self._append(f"{_TOMBSTONE}\t{key}\n")
+        return len(missing)
+
+    def compact(self) -> None:
+        """Rewrite the index file with only the live entries."""
+        if self._path is None:
+            return
+        with self._lock:
+            self._close()
+            lines = [
+                f"{int(self._hashes[slot]):016x}\t{key}\n"
+                for key, slot in self._slots.items()
+            ]
+            self._path.parent.mkdir(parents=True, exist_ok=True)
+            write_atomic(self._path, "".join(lines).encode("utf-8"))
+
+    def close(self) -> None:
+        with self._lock:
+            self._close()
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self.close()
+
+    def _nearest(
+        self, image_hash: int, exclude: Path | None
+    ) -> tuple[Path, int] | None:
+        np = self._np
+        count = len(self._paths)
+        if count == 0:
+            return None
+        distances = np.bitwise_count(
+            np.bitwise_xor(self._hashes[:count], np.uint64(image_hash))
+        ).astype(np.int16)
+        if exclude is not None:
+            slot = self._slots.get(str(exclude.resolve()))
+            if slot is not None:
+                distances[slot] = _HASH_BITS + 1
+        best = int(distances.argmin())
+        distance = int(distances[best])
+        if distance > self._max_distance:
+            return None
+        return Path(self._paths[best]), distance
+
+    def _put(self, key: str, image_hash: int) -> None:
+        slot = self._slots.get(key)
+        if slot is None:
+            slot = len(self._paths)
+            if slot == len(self._hashes):
+                grown = self._np.zeros(2 * len(self._hashes), dtype=self._np.uint64)
+                grown[:slot] = self._hashes
+                self._hashes = grown
+            self._paths.append(key)
+            self._slots[key] = slot
+        self._hashes[slot] = image_hash
+
+    def _remove(self, key: str) -> None:
+        # Move the last entry into the freed slot so the array has no holes.
+        slot = self._slots.pop(key)
+        last = self._paths.pop()
+        if last != key:
+            self._hashes[slot] = self._hashes[len(self._paths)]
+            self._paths[slot] = last
+            self._slots[last] = slot
+
+    def _append(self, line: str) -> None:
+        if self._path is None:
+            return
+        if self._handle is None:
+            self._path.parent.mkdir(parents=True, exist_ok=True)
+            self._handle = self._path.open("a", encoding="utf-8")
+        self._handle.write(line)
+        self._handle.flush()
+
+    def _close(self) -> None:
+        if self._handle is not None:
+            self._handle.close()
+            self._handle = None
+
+    def _load(self) -> dict[str, int]:
+        entries: dict[str, int] = {}
+        if self._path is None:
+            return entries
+        try:
+            text = self._path.read_text("utf-8")
+        except FileNotFoundError:
+            return entries
+        for line in text.splitlines():
+            value, _, key = line.partition("\t")
+            if not key:
+                continue
+            if value == _TOMBSTONE:
+                entries.pop(key, None)
+                continue
+            try:
+                entries[key] = int(value, 16)
+            except ValueError:
+                continue
+        return entries
+
+
+def perceptual_index_from_env() -> PerceptualIndex | None:
+    """Return the process-wide perceptual index configured through the environment."""
+    path = os.environ.get(PHASH_INDEX_ENV)
+    if not path:
+        return None
+    return _shared_index(path)
+
+
+@lru_cache(maxsize=4)
+def _shared_index(path: str) -> PerceptualIndex:
+    return PerceptualIndex(path)
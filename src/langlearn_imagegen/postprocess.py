@@ -0,0 +1,271 @@
+"""Resize, re-encode and thumbnail images after they are written.
+
+A request opts in with a ``postprocess`` metadata entry such as
+``max=1600,format=webp,quality=80,thumb.small=128,thumb.medium=512``.
+Because the spec is part of the request metadata it is also part of the
+request fingerprint, so cached results never mix processing settings.
+
+Encoding runs in a pool of worker processes (PostProcessor) so CPU-heavy
+work scales across cores and does not hold up downloads. Requires the
+optional ``images`` extra (``pip install punt-langlearn-imagegen[images]``).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, replace
+from functools import lru_cache
+from importlib import import_module
+from importlib.util import find_spec
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+from langlearn_imagegen.metrics import timed_stage
+from langlearn_imagegen.utils import atomic_writer
+
+if TYPE_CHECKING:
+    from langlearn_types import ImageResult
+
+__all__ = [
+    "DEFAULT_QUALITY",
+    "MAX_QUALITY",
+    "POSTPROCESS_KEY",
+    "POSTPROCESS_WORKERS_ENV",
+    "PostProcessSpec",
+    "PostProcessor",
+    "get_postprocessor",
+    "process_image",
+]
+
+POSTPROCESS_KEY = "postprocess"
+POSTPROCESS_WORKERS_ENV = "LANGLEARN_IMAGEGEN_POSTPROCESS_WORKERS"
+
+DEFAULT_QUALITY = 80
+MAX_QUALITY = 100
+
+# Spec format names to Pillow format names, and Pillow formats to extensions.
+_FORMATS = {
+    "jpeg": "JPEG",
+    "jpg": "JPEG",
+    "png": "PNG",
+    "webp": "WEBP",
+    "avif": "AVIF",
+}
+_EXTENSIONS = {"JPEG": "jpg", "PNG": "png", "WEBP": "webp", "AVIF": "avif"}
+
+
+@dataclass(frozen=True)
+class PostProcessSpec:
+    """What to do with an image once it is on disk.
+
+    Images larger than ``max_dimension`` on either side are downscaled,
+    keeping the aspect ratio; ``format`` (a Pillow format name, None to
+    keep the source format) and ``quality`` control re-encoding; EXIF is
+    dropped unless ``strip_exif`` is False. Each ``thumbnails`` entry is a
+    (name, max_dimension) pair written next to the image as
+    ``<stem>_<name>.<ext>``.
+    """
+
+    max_dimension: int | None = None
+    format: str | None = None
+    quality: int = DEFAULT_QUALITY
+    strip_exif: bool = True
+    thumbnails: tuple[tuple[str, int], ...] = ()
+
+    @classmethod
+    def parse(cls, spec: str) -> PostProcessSpec:
+        """Parse ``max=…,format=…,quality=…,exif=keep,thumb.<name>=…``."""
+        parsed = cls()
+        thumbnails: list[tuple[str, int]] = []
+        for item in filter(None, (part.strip() for part in spec.split(","))):
+            key, sep, value = item.partition("=")
+            if not sep:
+                raise ValueError(f"postprocess entries must be KEY=VALUE: {item!r}")
+            key = key.strip().lower()
+            value = value.strip()
+            if key == "max":
+                parsed = replace(parsed, max_dimension=_positive(key, value))
+            elif key == "format":
+                if value.lower() not in _FORMATS:
+                    raise ValueError(f"Unsupported postprocess format: {value!r}")
+                parsed = replace(parsed, format=_FORMATS[value.lower()])
+            elif key == "quality":
+                quality = _positive(key, value)
+                if quality > MAX_QUALITY:
+                    raise ValueError(
+                        f"postprocess quality must be at most {MAX_QUALITY}"
+                    )
+                parsed = replace(parsed, quality=quality)
+            elif key == "exif":
+                if value not in {"keep", "strip"}:
+                    raise ValueError("postprocess exif must be 'keep' or 'strip'")
+                parsed = replace(parsed, strip_exif=value == "strip")
+            elif key.startswith("thumb."):
+                thumbnails.append((key.removeprefix("thumb."), _positive(key, value)))
+            else:
+                raise ValueError(f"Unknown postprocess option: {key!r}")
+        return replace(parsed, thumbnails=tuple(thumbnails))
+
+    def thumbnails_only(self) -> PostProcessSpec:
+        """This spec minus everything that would re-encode the image itself."""
+        return replace(self, max_dimension=None, format=None, strip_exif=False)
+
+    def __str__(self) -> str:
+        parts: list[str] = []
+        if self.max_dimension is not None:
+            parts.append(f"max={self.max_dimension}")
+        if self.format is not None:
+            parts.append(f"format={_EXTENSIONS[self.format]}")
+        parts.append(f"quality={self.quality}")
+        parts.append(f"exif={'strip' if self.strip_exif else 'keep'}")
+        parts.extend(f"thumb.{name}={size}" for name, size in self.thumbnails)
+        return ",".join(parts)
+
+
+def _positive(key: str, value: str) -> int:
+    try:
+        number = int(value)
+    except ValueError:
+        raise ValueError(f"postprocess {key} must be an integer") from None
+    if number < 1:
+        raise ValueError(f"postprocess {key} must be at least 1")
+    return number
+
+
+def _pil(name: str) -> Any:
+    if find_spec("PIL") is None:
+        raise RuntimeError(
+            "Image post-processing requires punt-langlearn-imagegen[images]."
+        )
+    return import_module(name)
+
+
+def process_image(path: Path, spec: PostProcessSpec) -> tuple[Path, dict[str, str]]:
+    """Apply ``spec`` to the image at ``path``; return its final path and metadata.
+
+    The image is only re-encoded when something changes (size, format or
+    EXIF), so processing an already processed image just refreshes its
+    thumbnails. When the format changes the original file is removed.
+    """
+    pil_image = _pil("PIL.Image")
+    pil_ops = _pil("PIL.ImageOps")
+    with pil_image.open(path) as source:
+        source_format: str = source.format or "PNG"
+        had_exif = bool(source.info.get("exif"))
+        # Apply the EXIF orientation before the tag is dropped.
+        image = pil_ops.exif_transpose(source)
+        image.load()
+    target_format = spec.format or source_format
+    if target_format not in _EXTENSIONS:
+        target_format = "PNG"
+
+    resized = False
+    if spec.max_dimension is not None and max(image.size) > spec.max_dimension:
+        bound = (spec.max_dimension, spec.max_dimension)
+        image.thumbnail(bound, pil_image.Resampling.LANCZOS)
+        resized = True
+
+    output = path.with_suffix(f".{_EXTENSIONS[target_format]}")
+    if resized or target_format != source_format or (spec.strip_exif and had_exif):
+        _save(image, output, target_format, spec)
+        if output != path:
+            path.unlink(missing_ok=True)
+
+    width, height = image.size
+    metadata = {
+        "image_format": _EXTENSIONS[target_format],
+        "image_width": str(width),
+        "image_height": str(height),
+        "image_bytes": str(output.stat().st_size),
+    }
+    for name, size in spec.thumbnails:
+        thumbnail = image.copy()
+        thumbnail.thumbnail((size, size), pil_image.Resampling.LANCZOS)
+        thumbnail_path = output.with_stem(f"{output.stem}_{name}")
+        _save(thumbnail, thumbnail_path, target_format, spec)
+        metadata[f"variant_{name}"] = str(thumbnail_path)
+        metadata[f"variant_{name}_size"] = "{}x{}".format(*thumbnail.size)
+    return output, metadata
+
+
+def _save(image: Any, path: Path, target_format: str, spec: PostProcessSpec) -> None:
+    if target_format == "JPEG" and image.mode not in {"RGB", "L"}:
+        image = image.convert("RGB")
+    elif image.mode == "P":
+        image = image.convert("RGBA")
+    options: dict[str, Any] = {}
+    if target_format in {"JPEG", "WEBP", "AVIF"}:
+        options["quality"] = spec.quality
+    if target_format in {"JPEG", "PNG"}:
+        options["optimize"] = True
+    icc_profile = image.info.get("icc_profile")
+    if icc_profile:
+        options["icc_profile"] = icc_profile
+    exif = image.info.get("exif")
+    if exif and not spec.strip_exif:
+        options["exif"] = exif
+    with atomic_writer(path) as handle:
+        image.save(handle, format=target_format, **options)
+
+
+class PostProcessor:
+    """Runs process_image on a pool of worker processes.
+
+    The pool starts on first use. Calls block only the calling thread (or,
+    for aprocess, the calling task), so downloads keep flowing while images
+    are encoded.
+    """
+
+    def __init__(self, max_workers: int | None = None) -> None:
+        self._max_workers = max_workers
+        self._pool: ProcessPoolExecutor | None = None
+        self._lock = threading.Lock()
+
+    def process(self, result: ImageResult, spec: PostProcessSpec) -> ImageResult:
+        with timed_stage("postprocess"):
+            path, metadata = (
+                self._executor().submit(process_image, result.path, spec).result()
+            )
+        return _processed(result, path, metadata)
+
+    async def aprocess(self, result: ImageResult, spec: PostProcessSpec) -> ImageResult:
+        with timed_stage("postprocess"):
+            future = self._executor().submit(process_image, result.path, spec)
+            path, metadata = await asyncio.wrap_future(future)
+        return _processed(result, path, metadata)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+
+    def _executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                # Spawned workers do not inherit the parent's threads or
+                # connection pools.
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self._max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._pool
+
+
+def _processed(
+    result: ImageResult, path: Path, metadata: dict[str, str]
+) -> ImageResult:
+    merged = dict(result.metadata)
+    merged.update(metadata)
+    return replace(result, path=path, metadata=merged)
+
+
+@lru_cache(maxsize=1)
+def get_postprocessor() -> PostProcessor:
+    """Return the process-wide PostProcessor, sized by the environment."""
+    workers = os.environ.get(POSTPROCESS_WORKERS_ENV)
+    return PostProcessor(int(workers) if workers else None)
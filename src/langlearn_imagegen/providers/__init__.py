@@ -2,34 +2,176 @@
 
 from __future__ import annotations
 
+import hashlib
 import os
-from collections.abc import Callable
+import threading
+from collections.abc import AsyncGenerator, Callable, Generator, Hashable, Sequence
+from typing import TYPE_CHECKING, Any, Protocol, runtime_checkable
 
-from langlearn_types import ImageProvider, ImageProviderId
+from langlearn_types import ImageProvider, ImageProviderId, ImageRequest, ImageResult
 
-__all__ = ["PROVIDER_REGISTRY", "auto_detect_provider", "get_provider"]
+from langlearn_imagegen.ratelimit import RateLimiter
+from langlearn_imagegen.resilience import CircuitBreaker, RetryPolicy
+
+if TYPE_CHECKING:
+    from langlearn_imagegen.storage import StorageSink
+
+__all__ = [
+    "PROVIDER_REGISTRY",
+    "RATE_LIMITS",
+    "RETRY_POLICIES",
+    "AsyncCandidateProvider",
+    "AsyncClosable",
+    "AsyncImageProvider",
+    "CandidateProvider",
+    "SinkBacked",
+    "auto_detect_provider",
+    "circuit_status",
+    "configure_rate_limit",
+    "get_circuit_breaker",
+    "get_provider",
+    "get_rate_limiter",
+    "get_retry_policy",
+    "invalidate_provider_cache",
+    "rate_limit_status",
+]
 
 ProviderFactory = Callable[..., ImageProvider]
 
+
+@runtime_checkable
+class AsyncImageProvider(Protocol):
+    """Optional native-asyncio counterpart to ImageProvider."""
+
+    async def agenerate_image(self, request: ImageRequest) -> ImageResult: ...
+
+    async def agenerate_images(
+        self, requests: Sequence[ImageRequest]
+    ) -> list[ImageResult]: ...
+
+
+@runtime_checkable
+class AsyncClosable(Protocol):
+    """Provider holding async connections that ``aclose`` releases."""
+
+    async def aclose(self) -> None: ...
+
+
+@runtime_checkable
+class CandidateProvider(Protocol):
+    """Provider that can produce several candidate images for one request.
+
+    Candidates are yielded as soon as each is written, next to the
+    request's output path; closing the generator abandons the rest.
+    """
+
+    def iter_candidates(
+        self, request: ImageRequest, count: int
+    ) -> Generator[ImageResult]: ...
+
+
+@runtime_checkable
+class AsyncCandidateProvider(Protocol):
+    """Native-asyncio counterpart to CandidateProvider."""
+
+    def aiter_candidates(
+        self, request: ImageRequest, count: int
+    ) -> AsyncGenerator[ImageResult]: ...
+
+
+@runtime_checkable
+class SinkBacked(Protocol):
+    """Provider that writes images through a StorageSink."""
+
+    @property
+    def sink(self) -> StorageSink: ...
+
+
 # Factories are lazy to avoid importing SDKs unless needed.
 PROVIDER_REGISTRY: dict[str, ProviderFactory] = {}
 
 
-def _register_openai(**kwargs: str | None) -> ImageProvider:
+def _register_openai(**kwargs: Any) -> ImageProvider:
     from langlearn_imagegen.providers.openai import OpenAIProvider
+    from langlearn_imagegen.storage import storage_sink_from_env
 
-    model = kwargs.get("model")
-    return OpenAIProvider(model=model)
+    return OpenAIProvider(
+        api_key=kwargs.get("api_key"),
+        model=kwargs.get("model"),
+        base_url=kwargs.get("base_url"),
+        http_settings=kwargs.get("http_settings"),
+        rate_limiter=get_rate_limiter(
+            ImageProviderId.openai.value, kwargs.get("api_key")
+        ),
+        sink=storage_sink_from_env(),
+    )
 
 
-def _register_pexels(**kwargs: str | None) -> ImageProvider:
+def _register_pexels(**kwargs: Any) -> ImageProvider:
+    from langlearn_imagegen.blobs import blob_store_from_env
+    from langlearn_imagegen.phash import perceptual_index_from_env
     from langlearn_imagegen.providers.pexels import PexelsProvider
+    from langlearn_imagegen.storage import storage_sink_from_env
+
+    return PexelsProvider(
+        api_key=kwargs.get("api_key"),
+        base_url=kwargs.get("base_url"),
+        http_settings=kwargs.get("http_settings"),
+        rate_limiter=get_rate_limiter(
+            ImageProviderId.pexels.value, kwargs.get("api_key")
+        ),
+        blob_store=blob_store_from_env(),
+        perceptual_index=perceptual_index_from_env(),
+        sink=storage_sink_from_env(),
+    )
+
 
-    return PexelsProvider()
+def _register_routed(**kwargs: Any) -> ImageProvider:
+    from langlearn_imagegen.providers.routed import ROUTE_HEDGE_ENV, RoutedProvider
+
+    hedge = os.environ.get(ROUTE_HEDGE_ENV, "").lower() in {"1", "true", "yes"}
+    return RoutedProvider(hedge=hedge, http_settings=kwargs.get("http_settings"))
 
 
 PROVIDER_REGISTRY[ImageProviderId.openai.value] = _register_openai
 PROVIDER_REGISTRY[ImageProviderId.pexels.value] = _register_pexels
+# Not an ImageProviderId: requests stay unpinned and results carry the
+# member provider that produced them.
+PROVIDER_REGISTRY["routed"] = _register_routed
+
+# Environment variables consulted when no api_key is passed explicitly.
+PROVIDER_API_KEY_ENV: dict[str, str] = {
+    ImageProviderId.openai.value: "OPENAI_API_KEY",
+    ImageProviderId.pexels.value: "PEXELS_API_KEY",
+}
+
+CacheKey = tuple[str, str | None, tuple[tuple[str, Hashable], ...]]
+
+_provider_cache: dict[CacheKey, ImageProvider] = {}
+_provider_cache_lock = threading.Lock()
+
+# Default client-side pacing per provider, as "<count>/<unit>" specs. Each
+# can be overridden with LANGLEARN_IMAGEGEN_RATE_LIMIT_<PROVIDER>; the
+# limiters also adapt to the rate-limit headers providers send back.
+RATE_LIMITS: dict[str, str | None] = {
+    ImageProviderId.openai.value: "60/minute",
+    ImageProviderId.pexels.value: "200/hour",
+}
+
+# Keyed by provider and API key fingerprint: quotas are per account.
+RateLimitKey = tuple[str, str | None]
+
+_rate_limiters: dict[RateLimitKey, RateLimiter] = {}
+_rate_limiters_lock = threading.Lock()
+
+# Retry behaviour per provider; unlisted providers get RetryPolicy().
+RETRY_POLICIES: dict[str, RetryPolicy] = {
+    ImageProviderId.openai.value: RetryPolicy(max_attempts=3, base_delay=1.0),
+    ImageProviderId.pexels.value: RetryPolicy(max_attempts=4, base_delay=0.5),
+}
+
+_circuit_breakers: dict[str, CircuitBreaker] = {}
+_circuit_breakers_lock = threading.Lock()
 
 
 def auto_detect_provider() -> str:
@@ -44,12 +186,148 @@ def auto_detect_provider() -> str:
     return ImageProviderId.openai.value
 
 
-def get_provider(name: str | None = None, **kwargs: str | None) -> ImageProvider:
-    """Look up a provider by name, or auto-detect."""
+def _api_key_fingerprint(provider: str, api_key: str | None) -> str | None:
+    env_var = PROVIDER_API_KEY_ENV.get(provider)
+    key = api_key or (os.environ.get(env_var) if env_var else None)
+    if not key:
+        return None
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+
+
+def _cache_key(provider: str, kwargs: dict[str, Any]) -> CacheKey:
+    fingerprint = _api_key_fingerprint(provider, kwargs.get("api_key"))
+    options = tuple(
+        sorted(
+            (key, value)
+            for key, value in kwargs.items()
+            if key != "api_key" and value is not None
+        )
+    )
+    return (provider, fingerprint, options)
+
+
+def get_provider(
+    name: str | None = None, *, cache: bool = False, **kwargs: Any
+) -> ImageProvider:
+    """Look up a provider by name, or auto-detect.
+
+    By default a private instance is built that the caller is responsible
+    for closing. With ``cache=True`` instances are shared per provider name,
+    factory options (model, HTTP settings) and API key fingerprint so
+    repeated calls reuse SDK clients and warm connection pools; shared
+    instances are closed by invalidate_provider_cache.
+    """
     resolved = name.lower() if name is not None else auto_detect_provider()
     factory = PROVIDER_REGISTRY.get(resolved)
     if factory is None:
         available = ", ".join(sorted(PROVIDER_REGISTRY))
         msg = f"Unknown provider '{resolved}'. Available: {available}"
         raise ValueError(msg)
-    return factory(**kwargs)
+    if not cache:
+        return factory(**kwargs)
+
+    key = _cache_key(resolved, kwargs)
+    with _provider_cache_lock:
+        provider = _provider_cache.get(key)
+        if provider is None:
+            provider = factory(**kwargs)
+            _provider_cache[key] = provider
+        return provider
+
+
+def _rate_limit_spec(name: str) -> str | None:
+    override = os.environ.get(f"LANGLEARN_IMAGEGEN_RATE_LIMIT_{name.upper()}")
+    if override is not None:
+        return None if override.lower() in {"", "none", "off"} else override
+    return RATE_LIMITS.get(name)
+
+
+def get_rate_limiter(name: str, api_key: str | None = None) -> RateLimiter | None:
+    """Return the process-wide limiter for a provider account, or None.
+
+    Limiters are shared per provider and API key (the environment key when
+    ``api_key`` is omitted), so two accounts never pace each other.
+    """
+    provider = name.lower()
+    key = (provider, _api_key_fingerprint(provider, api_key))
+    with _rate_limiters_lock:
+        limiter = _rate_limiters.get(key)
+        if limiter is None:
+            spec = _rate_limit_spec(provider)
+            if spec is None:
+                return None
+            limiter = RateLimiter.from_spec(spec)
+            _rate_limiters[key] = limiter
+        return limiter
+
+
+def configure_rate_limit(name: str, spec: str | None) -> None:
+    """Replace a provider's pacing, e.g. ``"500/hour"``; None disables it.
+
+    Providers pick the new limiter up when they are next constructed, so
+    cached instances for ``name`` are invalidated.
+    """
+    key = name.lower()
+    with _rate_limiters_lock:
+        RATE_LIMITS[key] = spec
+        for account in [account for account in _rate_limiters if account[0] == key]:
+            del _rate_limiters[account]
+    invalidate_provider_cache(key)
+
+
+def rate_limit_status() -> dict[str, dict[str, float | int | None]]:
+    """Snapshot the pacing and remaining quota of every limited provider.
+
+    The environment's account is reported under the provider name; other
+    accounts in use appear as ``<provider>:<key fingerprint>``.
+    """
+    status: dict[str, dict[str, float | int | None]] = {}
+    for name in sorted(PROVIDER_REGISTRY):
+        limiter = get_rate_limiter(name)
+        if limiter is not None:
+            status[name] = limiter.snapshot()
+    with _rate_limiters_lock:
+        accounts = dict(_rate_limiters)
+    for (name, fingerprint), limiter in accounts.items():
+        if fingerprint != _api_key_fingerprint(name, None):
+            status[f"{name}:{fingerprint}"] = limiter.snapshot()
+    return dict(sorted(status.items()))
+
+
+def get_retry_policy(name: str) -> RetryPolicy:
+    """Return the retry policy configured for a provider."""
+    return RETRY_POLICIES.get(name.lower(), RetryPolicy())
+
+
+def get_circuit_breaker(name: str) -> CircuitBreaker:
+    """Return the process-wide circuit breaker for a provider."""
+    key = name.lower()
+    with _circuit_breakers_lock:
+        breaker = _circuit_breakers.get(key)
+        if breaker is None:
+            breaker = CircuitBreaker(key)
+            _circuit_breakers[key] = breaker
+        return breaker
+
+
+def circuit_status() -> dict[str, dict[str, str | int]]:
+    """Snapshot the circuit state of every provider that has been called."""
+    with _circuit_breakers_lock:
+        breakers = dict(_circuit_breakers)
+    return {name: breakers[name].snapshot() for name in sorted(breakers)}
+
+
+def invalidate_provider_cache(name: str | None = None) -> int:
+    """Drop cached providers (all, or those for ``name``) and close them.
+
+    Returns the number of evicted instances.
+    """
+    target = name.lower() if name is not None else None
+    with _provider_cache_lock:
+        keys = [key for key in _provider_cache if target in (None, key[0])]
+        evicted = [_provider_cache.pop(key) for key in keys]
+    for provider in evicted:
+        close = getattr(provider, "close", None)
+        if callable(close):
+            close()
+    return len(evicted)
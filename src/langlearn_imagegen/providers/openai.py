@@ -2,27 +2,127 @@
 
 from __future__ import annotations
 
-import base64
-from collections.abc import Sequence
-from typing import Any
+import asyncio
+import time
+from collections.abc import AsyncGenerator, Generator, Sequence
+from dataclasses import replace
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
 
-import httpx
 from langlearn_types import ImageProviderId, ImageRequest, ImageResult
-from openai import OpenAI
+from openai import APIStatusError, AsyncOpenAI, OpenAI
 
-from langlearn_imagegen.utils import extension_from_url, resolve_output_path
+from langlearn_imagegen.metrics import timed_stage
+from langlearn_imagegen.providers.openai_batch import (
+    BATCH_ENDPOINT,
+    DEFAULT_POLL_INTERVAL,
+    DeferredBatch,
+    batch_input,
+    duplicate_requests,
+    group_requests,
+    max_images_per_call,
+    read_batch_output,
+)
+from langlearn_imagegen.storage import (
+    LOCAL_SINK,
+    StorageSink,
+    storage_metadata,
+    write_chunks,
+)
+from langlearn_imagegen.transport import (
+    HttpSettings,
+    adownload_to_file,
+    create_async_client,
+    create_client,
+    download_to_file,
+    release_async_client,
+)
+from langlearn_imagegen.utils import (
+    candidate_path,
+    extension_from_url,
+    iter_b64decode,
+    resolve_output_path,
+)
+
+if TYPE_CHECKING:
+    import httpx
+
+    from langlearn_imagegen.ratelimit import RateLimiter
+
+
+def _first_image(result: Any) -> Any:
+    data: Any | None = result.data[0] if result.data else None
+    if data is None:
+        raise RuntimeError("OpenAI image generation returned no data.")
+    return data
+
+
+def _image_url(data: Any) -> str:
+    image_url = getattr(data, "url", None)
+    if not image_url:
+        raise RuntimeError("OpenAI image response missing image URL.")
+    return str(image_url)
+
+
+def _b64_payload(data: Any) -> str:
+    b64_payload = getattr(data, "b64_json", None)
+    if not b64_payload:
+        raise RuntimeError("OpenAI image response missing base64 payload.")
+    return str(b64_payload)
+
+
+def _fan_out[T: (ImageResult, ImageResult | Exception)](
+    results: dict[int, T], duplicates: dict[int, int], count: int
+) -> list[T]:
+    """Order ``results`` by index, giving duplicates their original's result."""
+    for index, original in duplicates.items():
+        shared = results[original]
+        if isinstance(shared, ImageResult):
+            metadata = dict(shared.metadata)
+            metadata["coalesced"] = "true"
+            shared = replace(shared, metadata=metadata)
+        results[index] = shared
+    return [results[index] for index in range(count)]
 
 
 class OpenAIProvider:
-    """Implements ImageProvider using the OpenAI Image API."""
+    """Implements ImageProvider using the OpenAI Image API.
+
+    generate_images groups requests with identical call parameters into one
+    call with ``n`` images. For large jobs where cost and throughput matter
+    more than latency, submit_deferred sends the requests through the Batch
+    API instead and collect_deferred writes the images once it completes.
+    """
 
     def __init__(
         self,
         *,
         api_key: str | None = None,
         model: str | None = None,
+        base_url: str | None = None,
+        http_settings: HttpSettings | None = None,
+        rate_limiter: RateLimiter | None = None,
+        max_retries: int = 0,
+        sink: StorageSink | None = None,
     ) -> None:
-        self._client: Any = OpenAI(api_key=api_key)
+        self._api_key = api_key
+        # None lets the SDK fall back to OPENAI_BASE_URL, then the public API.
+        self._base_url = base_url
+        self._rate_limiter = rate_limiter
+        self._sink = LOCAL_SINK if sink is None else sink
+        self._http_settings = http_settings
+        self._http = create_client(http_settings)
+        # Retries default to ImageClient's RetryPolicy so attempts don't compound.
+        self._max_retries = max_retries
+        self._client: Any = OpenAI(
+            api_key=api_key,
+            base_url=base_url,
+            http_client=self._http,
+            max_retries=max_retries,
+        )
+        self._async_http: httpx.AsyncClient | None = None
+        self._async_loop: asyncio.AbstractEventLoop | None = None
+        self._async_client: Any | None = None
         self._model = model or "gpt-image-1.5"
 
     @property
@@ -30,56 +130,456 @@ class OpenAIProvider:
         return self._model
 
     def generate_image(self, request: ImageRequest) -> ImageResult:
+        params = self._request_params(request)
+        response_format = str(params["response_format"])
+
+        data = _first_image(self._images_generate(params))
+        output_path = self._materialise(request, data, response_format)
+        return self._build_result(request, data, output_path, response_format)
+
+    def generate_images(self, requests: Sequence[ImageRequest]) -> list[ImageResult]:
+        """Generate every request, one ``n``-image call per group of equal calls."""
+        groups, duplicates = self._plan(requests)
+        results: dict[int, ImageResult] = {}
+        for group in groups:
+            members = [requests[index] for index in group]
+            results.update(zip(group, self._generate_group(members), strict=True))
+        return _fan_out(results, duplicates, len(requests))
+
+    def _generate_group(self, requests: list[ImageRequest]) -> list[ImageResult]:
+        if len(requests) == 1:
+            return [self.generate_image(requests[0])]
+        params = self._request_params(requests[0])
+        params["n"] = len(requests)
+        response_format = str(params["response_format"])
+        data = list(self._images_generate(params).data or [])
+        results = [
+            self._grouped_result(
+                request,
+                item,
+                self._materialise(request, item, response_format),
+                response_format,
+                len(requests),
+            )
+            for request, item in zip(requests, data, strict=False)
+        ]
+        # The API may return fewer images than asked for; top up one by one.
+        results.extend(
+            self.generate_image(request) for request in requests[len(data) :]
+        )
+        return results
+
+    def iter_candidates(
+        self, request: ImageRequest, count: int
+    ) -> Generator[ImageResult]:
+        """Request ``count`` images (``n`` per call) and yield each once written.
+
+        ``n`` is capped at the model's per-call limit (1 for dall-e-3, 10
+        otherwise) and further calls are made for the rest. Candidates are
+        written lazily, so closing the generator early skips writing (and
+        requesting) the rest.
+        """
+        params = self._request_params(request)
+        response_format = str(params["response_format"])
+        limit = max_images_per_call(self._model)
+
+        index = 0
+        while index < count:
+            params["n"] = min(count - index, limit)
+            result = self._images_generate(params)
+            if index == 0:
+                _first_image(result)
+            elif not result.data:
+                return
+            for data in result.data:
+                output_path = self._materialise(request, data, response_format, index)
+                yield self._build_result(
+                    request, data, output_path, response_format, index
+                )
+                index += 1
+
+    async def agenerate_image(self, request: ImageRequest) -> ImageResult:
+        params = self._request_params(request)
+        response_format = str(params["response_format"])
+
+        data = _first_image(await self._aimages_generate(params))
+        output_path = await self._amaterialise(request, data, response_format)
+        return self._build_result(request, data, output_path, response_format)
+
+    async def aiter_candidates(
+        self, request: ImageRequest, count: int
+    ) -> AsyncGenerator[ImageResult]:
+        """Async counterpart of iter_candidates; close it with ``aclose``."""
+        params = self._request_params(request)
+        response_format = str(params["response_format"])
+        limit = max_images_per_call(self._model)
+
+        index = 0
+        while index < count:
+            params["n"] = min(count - index, limit)
+            result = await self._aimages_generate(params)
+            if index == 0:
+                _first_image(result)
+            elif not result.data:
+                return
+            for data in result.data:
+                output_path = await self._amaterialise(
+                    request, data, response_format, index
+                )
+                yield self._build_result(
+                    request, data, output_path, response_format, index
+                )
+                index += 1
+
+    async def agenerate_images(
+        self, requests: Sequence[ImageRequest]
+    ) -> list[ImageResult]:
+        groups, duplicates = self._plan(requests)
+        batches = await asyncio.gather(
+            *(self._agenerate_group([requests[i] for i in group]) for group in groups)
+        )
+        results: dict[int, ImageResult] = {}
+        for group, batch in zip(groups, batches, strict=True):
+            results.update(zip(group, batch, strict=True))
+        return _fan_out(results, duplicates, len(requests))
+
+    async def _agenerate_group(self, requests: list[ImageRequest]) -> list[ImageResult]:
+        if len(requests) == 1:
+            return [await self.agenerate_image(requests[0])]
+        params = self._request_params(requests[0])
+        params["n"] = len(requests)
+        response_format = str(params["response_format"])
+        data = list((await self._aimages_generate(params)).data or [])
+        results = [
+            self._grouped_result(
+                request,
+                item,
+                await self._amaterialise(request, item, response_format),
+                response_format,
+                len(requests),
+            )
+            for request, item in zip(requests, data, strict=False)
+        ]
+        results.extend(
+            [await self.agenerate_image(request) for request in requests[len(data) :]]
+        )
+        return results
+
+    def submit_deferred(self, requests: Sequence[ImageRequest]) -> DeferredBatch:
+        """Submit ``requests`` as an OpenAI Batch API job and return it.
+
+        Requests are grouped as in generate_images, one JSONL line per
+        group. Images are always requested as base64, since URLs would
+        expire before a batch completes. Save the returned job and pass it
+        to collect_deferred later.
+        """
+        params = [self._deferred_params(request) for request in requests]
+        groups = group_requests(
+            params,
+            max_images_per_call(self._model),
+            skip=duplicate_requests(requests),
+        )
+        with timed_stage("openai_batch_submit"):
+            upload: Any = self._client.files.create(
+                file=("images.jsonl", batch_input(params, groups)), purpose="batch"
+            )
+            batch: Any = self._client.batches.create(
+                input_file_id=upload.id,
+                endpoint=BATCH_ENDPOINT,
+                completion_window="24h",
+            )
+        job = DeferredBatch(
+            batch_id=str(batch.id),
+            model=self._model,
+            requests=tuple(requests),
+            groups=tuple(groups),
+        )
+        return job.polled(batch)
+
+    def poll_deferred(self, job: DeferredBatch) -> DeferredBatch:
+        """Return ``job`` with its status refreshed from the Batch API."""
+        return job.polled(self._client.batches.retrieve(job.batch_id))
+
+    def collect_deferred(
+        self,
+        job: DeferredBatch,
+        *,
+        poll_interval: float = DEFAULT_POLL_INTERVAL,
+        timeout: float | None = None,
+    ) -> list[ImageResult | Exception]:
+        """Wait for ``job`` to finish and write its images.
+
+        Returns one entry per request, in order: the written result, or the
+        error the batch reported for it. Raises TimeoutError if the job is
+        still running after ``timeout`` seconds.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        job = self.poll_deferred(job)
+        while not job.done:
+            if deadline is not None and time.monotonic() + poll_interval > deadline:
+                raise TimeoutError(f"OpenAI batch {job.batch_id} is {job.status}")
+            time.sleep(poll_interval)
+            job = self.poll_deferred(job)
+        return self.write_deferred(job)
+
+    def write_deferred(self, job: DeferredBatch) -> list[ImageResult | Exception]:
+        """Write the images of a finished ``job``; see collect_deferred."""
+        outcomes: dict[str, list[Any] | str] = {}
+        with timed_stage("openai_batch_collect"):
+            for file_id in (job.output_file_id, job.error_file_id):
+                if file_id:
+                    content: Any = self._client.files.content(file_id)
+                    outcomes.update(read_batch_output(content.text))
+        results: dict[int, ImageResult | Exception] = {}
+        for number, group in enumerate(job.groups):
+            outcome = outcomes.get(str(number))
+            for position, index in enumerate(group):
+                results[index] = self._deferred_result(
+                    job, job.requests[index], outcome, position, len(group)
+                )
+        return _fan_out(results, duplicate_requests(job.requests), len(job.requests))
+
+    def _deferred_result(
+        self,
+        job: DeferredBatch,
+        request: ImageRequest,
+        outcome: list[Any] | str | None,
+        position: int,
+        group_size: int,
+    ) -> ImageResult | Exception:
+        if outcome is None:
+            return RuntimeError(
+                f"OpenAI batch {job.batch_id} ({job.status}) has no result "
+                "for this request."
+            )
+        if isinstance(outcome, str):
+            return RuntimeError(outcome)
+        if position >= len(outcome):
+            return RuntimeError("OpenAI batch returned fewer images than requested.")
+        data = outcome[position]
+        try:
+            output_path = self._materialise(request, data, "b64_json")
+        except Exception as exc:
+            return exc
+        return self._grouped_result(
+            request,
+            data,
+            output_path,
+            "b64_json",
+            group_size,
+            model=job.model,
+            batch_id=job.batch_id,
+        )
+
+    def _plan(
+        self, requests: Sequence[ImageRequest]
+    ) -> tuple[list[tuple[int, ...]], dict[int, int]]:
+        duplicates = duplicate_requests(requests)
+        params = [self._request_params(request) for request in requests]
+        limit = max_images_per_call(self._model)
+        return group_requests(params, limit, skip=duplicates), duplicates
+
+    def _deferred_params(self, request: ImageRequest) -> dict[str, object]:
+        params = self._request_params(request)
+        params["response_format"] = "b64_json"
+        return params
+
+    def _grouped_result(
+        self,
+        request: ImageRequest,
+        data: Any,
+        output_path: Path,
+        response_format: str,
+        group_size: int,
+        *,
+        model: str | None = None,
+        batch_id: str | None = None,
+    ) -> ImageResult:
+        result = self._build_result(
+            request, data, output_path, response_format, model=model
+        )
+        metadata = dict(result.metadata)
+        metadata["openai_n"] = str(group_size)
+        if batch_id is not None:
+            metadata["openai_batch_id"] = batch_id
+        return replace(result, metadata=metadata)
+
+    @property
+    def sink(self) -> StorageSink:
+        """Where this provider writes image bytes."""
+        return self._sink
+
+    def close(self) -> None:
+        """Release pooled connections held by both clients.
+
+        The async pool is closed on the loop that opened it, so evicting a
+        cached provider from synchronous code does not leak it.
+        """
+        self._http.close()
+        http, loop = self._detach_async_http()
+        if http is not None:
+            release_async_client(http, loop)
+
+    async def aclose(self) -> None:
+        """Release pooled connections held by both clients."""
+        self._http.close()
+        http, loop = self._detach_async_http()
+        if http is None:
+            return
+        if loop is asyncio.get_running_loop():
+            await http.aclose()
+        else:
+            release_async_client(http, loop)
+
+    def _detach_async_http(
+        self,
+    ) -> tuple[httpx.AsyncClient | None, asyncio.AbstractEventLoop | None]:
+        http, loop = self._async_http, self._async_loop
+        self._async_http = None
+        self._async_loop = None
+        self._async_client = None
+        return http, loop
+
+    def _images_generate(self, params: dict[str, object]) -> Any:
+        if self._rate_limiter is not None:
+            self._rate_limiter.acquire()
+        try:
+            with timed_stage("openai_generate"):
+                raw: Any = self._client.images.with_raw_response.generate(**params)
+        except APIStatusError as exc:
+            self._observe(exc.response)
+            raise
+        self._observe(raw)
+        return raw.parse()
+
+    async def _aimages_generate(self, params: dict[str, object]) -> Any:
+        if self._rate_limiter is not None:
+            await self._rate_limiter.aacquire()
+        try:
+            with timed_stage("openai_generate"):
+                raw: Any = await self._aclient().images.with_raw_response.generate(
+                    **params
+                )
+        except APIStatusError as exc:
+            self._observe(exc.response)
+            raise
+        self._observe(raw)
+        return raw.parse()
+
+    def _observe(self, response: Any) -> None:
+        if self._rate_limiter is not None:
+            self._rate_limiter.observe(response.status_code, response.headers)
+
+    def _ahttp(self) -> httpx.AsyncClient:
+        # Async pools are tied to the loop that opened them; cached providers
+        # can outlive a loop (e.g. successive asyncio.run calls).
+        loop = asyncio.get_running_loop()
+        if self._async_http is None or self._async_loop is not loop:
+            # The replaced pool still holds sockets opened on the old loop.
+            previous, previous_loop = self._detach_async_http()
+            if previous is not None:
+                release_async_client(previous, previous_loop)
+            self._async_http = create_async_client(self._http_settings)
+            self._async_loop = loop
+        return self._async_http
+
+    def _aclient(self) -> Any:
+        http = self._ahttp()
+        if self._async_client is None:
+            self._async_client = AsyncOpenAI(
+                api_key=self._api_key,
+                base_url=self._base_url,
+                http_client=http,
+                max_retries=self._max_retries,
+            )
+        return self._async_client
+
+    def _request_params(self, request: ImageRequest) -> dict[str, object]:
         params: dict[str, object] = {"model": self._model, "prompt": request.prompt}
         if request.size:
             params["size"] = request.size
         if request.quality:
             params["quality"] = request.quality
+        params["response_format"] = request.metadata.get("response_format", "b64_json")
+        return params
 
-        response_format = request.metadata.get("response_format", "b64_json")
-        params["response_format"] = response_format
-
-        result: Any = self._client.images.generate(**params)
-        data: Any | None = result.data[0] if result.data else None
-        if data is None:
-            raise RuntimeError("OpenAI image generation returned no data.")
-
-        image_bytes: bytes
-        extension: str
-        if response_format == "url":
-            image_url = getattr(data, "url", None)
-            if not image_url:
-                raise RuntimeError("OpenAI image response missing image URL.")
-            extension = extension_from_url(image_url, default="png")
-            image_response = httpx.get(image_url, timeout=30.0)
-            image_response.raise_for_status()
-            image_bytes = image_response.content
-        else:
-            b64_payload = getattr(data, "b64_json", None)
-            if not b64_payload:
-                raise RuntimeError("OpenAI image response missing base64 payload.")
-            image_bytes = base64.b64decode(b64_payload)
-            extension = request.metadata.get("output_format", "png")
+    def _materialise(
+        self,
+        request: ImageRequest,
+        data: Any,
+        response_format: str,
+        candidate: int | None = None,
+    ) -> Path:
+        if response_format != "url":
+            return self._write_b64(request, _b64_payload(data), candidate)
+        image_url = _image_url(data)
+        output_path = self._output_path(
+            request, extension_from_url(image_url, default="png"), candidate
+        )
+        download_to_file(self._http, image_url, output_path, self._sink)
+        return output_path
 
+    async def _amaterialise(
+        self,
+        request: ImageRequest,
+        data: Any,
+        response_format: str,
+        candidate: int | None = None,
+    ) -> Path:
+        if response_format != "url":
+            return await asyncio.to_thread(
+                self._write_b64, request, _b64_payload(data), candidate
+            )
+        image_url = _image_url(data)
+        output_path = self._output_path(
+            request, extension_from_url(image_url, default="png"), candidate
+        )
+        await adownload_to_file(self._ahttp(), image_url, output_path, self._sink)
+        return output_path
+
+    def _output_path(
+        self, request: ImageRequest, extension: str, candidate: int | None = None
+    ) -> Path:
         output_path = resolve_output_path(
             request.prompt,
             ImageProviderId.openai.value,
             request.metadata,
             extension,
+            create_parent=self._sink.local,
         )
-        output_path.write_bytes(image_bytes)
+        if candidate is not None:
+            output_path = candidate_path(output_path, candidate)
+        return output_path
+
+    def _write_b64(
+        self, request: ImageRequest, payload: str, candidate: int | None = None
+    ) -> Path:
+        extension = request.metadata.get("output_format", "png")
+        output_path = self._output_path(request, extension, candidate)
+        write_chunks(self._sink, output_path, iter_b64decode(payload), "decode")
+        return output_path
 
+    def _build_result(
+        self,
+        request: ImageRequest,
+        data: Any,
+        output_path: Path,
+        response_format: str,
+        candidate: int | None = None,
+        *,
+        model: str | None = None,
+    ) -> ImageResult:
         metadata = dict(request.metadata)
         metadata.setdefault("response_format", response_format)
+        if candidate is not None:
+            metadata["openai_candidate"] = str(candidate)
+        metadata.update(storage_metadata(self._sink, output_path))
 
         return ImageResult(
             path=output_path,
             prompt=request.prompt,
             provider=ImageProviderId.openai,
             revised_prompt=getattr(data, "revised_prompt", None),
-            model=self._model,
+            model=model or self._model,
             metadata=metadata,
         )
-
-    def generate_images(self, requests: Sequence[ImageRequest]) -> list[ImageResult]:
-        return [self.generate_image(request) for request in requests]
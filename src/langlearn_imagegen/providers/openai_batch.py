@@ -0,0 +1,194 @@
+"""Request grouping and Batch API jobs for OpenAIProvider.
+
+Requests that would send identical ``images.generate`` parameters (prompt,
+size, quality, model, response format) are grouped into one call with
+``n`` set to the group size, and each returned image is written to its own
+request's output path. Fully identical requests (same output location
+too) are not grouped: they share the first one's image, as ImageClient
+coalesces them.
+
+A DeferredBatch is the local half of an OpenAI Batch API job: the
+requests, how they were grouped into JSONL lines, and the job's last known
+status. It is saved as JSON so a job submitted in the evening can be
+collected by another process the next morning.
+"""
+
+from __future__ import annotations
+
+import json
+import time
+from collections.abc import Container, Sequence
+from dataclasses import asdict, dataclass, field, replace
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any
+
+from langlearn_types import ImageProviderId, ImageRequest
+
+from langlearn_imagegen.utils import write_atomic
+
+__all__ = [
+    "BATCH_ENDPOINT",
+    "DEFAULT_POLL_INTERVAL",
+    "MAX_IMAGES_PER_CALL",
+    "DeferredBatch",
+    "batch_input",
+    "duplicate_requests",
+    "group_requests",
+    "max_images_per_call",
+    "read_batch_output",
+]
+
+BATCH_ENDPOINT = "/v1/images/generations"
+
+# Upper bound on ``n`` for the gpt-image and dall-e-2 models; dall-e-3
+# only ever returns one image per call.
+MAX_IMAGES_PER_CALL = 10
+
+DEFAULT_POLL_INTERVAL = 30.0
+
+_TERMINAL_STATUSES = frozenset({"completed", "failed", "expired", "cancelled"})
+
+
+def max_images_per_call(model: str) -> int:
+    return 1 if model == "dall-e-3" else MAX_IMAGES_PER_CALL
+
+
+def duplicate_requests(requests: Sequence[ImageRequest]) -> dict[int, int]:
+    """Map each request that repeats an earlier one to the earlier index."""
+    first: dict[str, int] = {}
+    duplicates: dict[int, int] = {}
+    for index, request in enumerate(requests):
+        identity = json.dumps(_request_dict(request), sort_keys=True)
+        if identity in first:
+            duplicates[index] = first[identity]
+        else:
+            first[identity] = index
+    return duplicates
+
+
+def group_requests(
+    params: Sequence[dict[str, object]], limit: int, skip: Container[int] = ()
+) -> list[tuple[int, ...]]:
+    """Group request indexes whose call parameters are identical.
+
+    Groups keep input order and hold at most ``limit`` indexes each;
+    indexes in ``skip`` are left out.
+    """
+    groups: dict[str, list[int]] = {}
+    for index, item in enumerate(params):
+        if index not in skip:
+            groups.setdefault(json.dumps(item, sort_keys=True), []).append(index)
+    return [
+        tuple(indexes[start : start + limit])
+        for indexes in groups.values()
+        for start in range(0, len(indexes), limit)
+    ]
+
+
+def batch_input(
+    params: Sequence[dict[str, object]], groups: Sequence[tuple[int, ...]]
+) -> bytes:
+    """Render the Batch API input file: one JSONL line per group."""
+    lines = [
+        json.dumps(
+            {
+                "custom_id": str(number),
+                "method": "POST",
+                "url": BATCH_ENDPOINT,
+                "body": {**params[group[0]], "n": len(group)},
+            }
+        )
+        for number, group in enumerate(groups)
+    ]
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def read_batch_output(text: str) -> dict[str, list[Any] | str]:
+    """Map each custom_id to its image data, or to an error message."""
+    outcomes: dict[str, list[Any] | str] = {}
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        record: dict[str, Any] = json.loads(line)
+        response: dict[str, Any] = record.get("response") or {}
+        body: dict[str, Any] = response.get("body") or {}
+        status = response.get("status_code")
+        if status == 200 and body.get("data"):
+            outcomes[str(record["custom_id"])] = [
+                SimpleNamespace(**item) for item in body["data"]
+            ]
+            continue
+        error: dict[str, Any] = record.get("error") or body.get("error") or {}
+        outcomes[str(record["custom_id"])] = str(
+            error.get("message") or f"OpenAI batch request failed ({status})"
+        )
+    return outcomes
+
+
+@dataclass(frozen=True)
+class DeferredBatch:
+    """An OpenAI Batch API job and the requests it will fulfil.
+
+    ``groups[i]`` lists the indexes into ``requests`` served by the input
+    line with custom_id ``i``. ``status``, the request counts and the file
+    ids reflect the last poll.
+    """
+
+    batch_id: str
+    model: str
+    requests: tuple[ImageRequest, ...]
+    groups: tuple[tuple[int, ...], ...]
+    status: str = "validating"
+    completed: int = 0
+    failed: int = 0
+    output_file_id: str | None = None
+    error_file_id: str | None = None
+    created: float = field(default_factory=time.time)
+
+    @property
+    def done(self) -> bool:
+        return self.status in _TERMINAL_STATUSES
+
+    def polled(self, batch: Any) -> DeferredBatch:
+        """Return a copy updated from a retrieved Batch object."""
+        counts = getattr(batch, "request_counts", None)
+        return replace(
+            self,
+            status=str(batch.status),
+            completed=int(getattr(counts, "completed", 0) or 0),
+            failed=int(getattr(counts, "failed", 0) or 0),
+            output_file_id=getattr(batch, "output_file_id", None),
+            error_file_id=getattr(batch, "error_file_id", None),
+        )
+
+    def as_dict(self) -> dict[str, Any]:
+        payload = asdict(self)
+        payload["requests"] = [_request_dict(request) for request in self.requests]
+        payload["groups"] = [list(group) for group in self.groups]
+        return payload
+
+    def save(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        write_atomic(path, json.dumps(self.as_dict(), indent=2).encode("utf-8"))
+
+    @classmethod
+    def load(cls, path: Path) -> DeferredBatch:
+        payload = json.loads(path.read_text(encoding="utf-8"))
+        requests = tuple(_request_from_dict(item) for item in payload.pop("requests"))
+        groups = tuple(tuple(group) for group in payload.pop("groups"))
+        return cls(requests=requests, groups=groups, **payload)
+
+
+def _request_dict(request: ImageRequest) -> dict[str, Any]:
+    payload = asdict(request)
+    payload["provider"] = request.provider.value if request.provider else None
+    return payload
+
+
+def _request_from_dict(payload: dict[str, Any]) -> ImageRequest:
+    fields = dict(payload)
+    provider = fields.pop("provider", None)
+    return ImageRequest(
+        **fields, provider=ImageProviderId(provider) if provider else None
+    )
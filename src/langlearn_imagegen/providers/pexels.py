@@ -2,16 +2,56 @@
 
 from __future__ import annotations
 
+import asyncio
+import contextlib
+import contextvars
 import os
-from collections.abc import Sequence
-from typing import Any
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import AsyncGenerator, Generator, Sequence
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
 
-import httpx
 from langlearn_types import ImageProviderId, ImageRequest, ImageResult
 
-from langlearn_imagegen.utils import extension_from_url, resolve_output_path
+from langlearn_imagegen.metrics import timed_stage
+from langlearn_imagegen.storage import LOCAL_SINK, StorageSink, storage_metadata
+from langlearn_imagegen.transport import (
+    HttpSettings,
+    adownload_to_file,
+    create_async_client,
+    create_client,
+    download_to_file,
+    release_async_client,
+)
+from langlearn_imagegen.utils import (
+    candidate_path,
+    extension_from_url,
+    resolve_output_path,
+)
 
-PEXELS_SEARCH_URL = "https://api.pexels.com/v1/search"
+if TYPE_CHECKING:
+    import httpx
+
+    from langlearn_imagegen.blobs import BlobStore
+    from langlearn_imagegen.phash import PerceptualIndex
+    from langlearn_imagegen.ratelimit import RateLimiter
+
+PEXELS_API_URL = "https://api.pexels.com/v1"
+PEXELS_API_URL_ENV = "PEXELS_API_URL"
+PEXELS_MAX_PER_PAGE = 80
+DEFAULT_SEARCH_PER_PAGE = 1
+# Upper bound on parallel candidate downloads per request.
+MAX_DOWNLOAD_WORKERS = 8
+# Hits fetched past ``pexels_index`` so near-duplicates can be skipped.
+PERCEPTUAL_LOOKAHEAD = 8
+# Size compared against the perceptual index: uncropped and a few KB.
+PEXELS_PREVIEW_SOURCE = "small"
+
+# (query, locale, orientation, size, color)
+SearchKey = tuple[str, str | None, str | None, str | None, str | None]
 
 
 def _orientation_from_size(size: str | None) -> str | None:
@@ -29,66 +69,641 @@ def _orientation_from_size(size: str | None) -> str | None:
     return "square"
 
 
+def _search_key(request: ImageRequest) -> SearchKey:
+    params = _search_params(request, 1)
+    return (
+        request.prompt,
+        _optional_str(params.get("locale")),
+        _optional_str(params.get("orientation")),
+        _optional_str(params.get("size")),
+        _optional_str(params.get("color")),
+    )
+
+
+def _optional_str(value: str | int | None) -> str | None:
+    return None if value is None else str(value)
+
+
+def _search_params(request: ImageRequest, per_page: int) -> dict[str, str | int]:
+    params: dict[str, str | int] = {"query": request.prompt, "per_page": per_page}
+
+    if request.language:
+        params["locale"] = request.language
+
+    orientation = request.metadata.get("orientation") or _orientation_from_size(
+        request.size
+    )
+    if orientation:
+        params["orientation"] = orientation
+
+    size = request.metadata.get("pexels_size")
+    if size:
+        params["size"] = size
+
+    color = request.metadata.get("color")
+    if color:
+        params["color"] = color
+    return params
+
+
+def _photo_index(request: ImageRequest) -> int:
+    raw = request.metadata.get("pexels_index", "0")
+    if not raw.isdigit() or int(raw) >= PEXELS_MAX_PER_PAGE:
+        raise ValueError(
+            f"pexels_index must be an integer from 0 to {PEXELS_MAX_PER_PAGE - 1}"
+        )
+    return int(raw)
+
+
+def _pick_photo(photos: list[dict[str, Any]], index: int) -> dict[str, Any]:
+    if not photos:
+        raise RuntimeError("Pexels search returned no photos.")
+    if index >= len(photos):
+        raise RuntimeError(f"Pexels search returned fewer than {index + 1} photos.")
+    return photos[index]
+
+
+def _photo_source(photo: dict[str, Any], request: ImageRequest) -> tuple[str, str]:
+    sources: dict[str, str] = photo.get("src", {})
+    source_key = request.metadata.get("pexels_src", "original")
+    image_url = sources.get(source_key) or sources.get("original")
+    if not image_url:
+        raise RuntimeError("Pexels photo response missing image URL.")
+    return source_key, image_url
+
+
+def _blob_alias(photo: dict[str, Any], source_key: str) -> str:
+    return f"pexels:{photo.get('id', '')}:{source_key}"
+
+
+def _blob_metadata(blob: Path, method: str, *, reused: bool) -> dict[str, str]:
+    return {
+        "blob_sha256": blob.stem,
+        "blob_link": method,
+        "blob_reused": "true" if reused else "false",
+    }
+
+
+def _dedup_metadata(duplicates: list[Path]) -> dict[str, str]:
+    metadata = {"phash_skipped": str(len(duplicates))}
+    if duplicates:
+        metadata["phash_duplicate_of"] = str(duplicates[0])
+    return metadata
+
+
+def _discard_candidate(
+    future: Future[ImageResult] | asyncio.Future[ImageResult],
+) -> None:
+    if future.cancelled() or future.exception() is not None:
+        return
+    with contextlib.suppress(OSError):
+        future.result().path.unlink()
+
+
+class _SearchCache:
+    """In-memory LRU of search results with a time-to-live.
+
+    Entries remember how many results were requested, so a later call that
+    needs more photos than were fetched goes back to the API unless the
+    earlier page already held every match.
+    """
+
+    def __init__(self, maxsize: int, ttl: float) -> None:
+        self._maxsize = maxsize
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[
+            SearchKey, tuple[float, int, list[dict[str, Any]]]
+        ] = OrderedDict()
+
+    def get(self, key: SearchKey, needed: int) -> list[dict[str, Any]] | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, per_page, photos = entry
+            if time.monotonic() > expires:
+                del self._entries[key]
+                return None
+            if per_page < needed and len(photos) >= per_page:
+                return None
+            self._entries.move_to_end(key)
+            return photos
+
+    def put(self, key: SearchKey, per_page: int, photos: list[dict[str, Any]]) -> None:
+        if self._maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self._ttl, per_page, photos)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
 class PexelsProvider:
-    """Implements ImageProvider using the Pexels search API."""
+    """Implements ImageProvider using the Pexels search API.
+
+    Search results are fetched ``search_per_page`` at a time and cached per
+    (query, locale, orientation, size, color), so alternative picks via the
+    ``pexels_index`` metadata key and generate_candidates reuse one search
+    call instead of repeating it.
+
+    With a ``blob_store``, each downloaded photo is stored once under its
+    Pexels id and size; later requests for the same photo link their output
+    path to the stored blob instead of downloading it again.
+
+    With a ``perceptual_index``, generate_image compares a small preview of
+    each search hit, starting at ``pexels_index``, with the images already
+    in the index and takes the first that is not a near-duplicate, searching
+    ``PERCEPTUAL_LOOKAHEAD`` hits past it. If every remaining hit is one,
+    the requested hit is used and tagged with ``phash_duplicate_of``.
+    """
 
-    def __init__(self, api_key: str | None = None) -> None:
+    def __init__(
+        self,
+        api_key: str | None = None,
+        *,
+        base_url: str | None = None,
+        http_settings: HttpSettings | None = None,
+        search_per_page: int = DEFAULT_SEARCH_PER_PAGE,
+        search_cache_size: int = 256,
+        search_cache_ttl: float = 3600.0,
+        rate_limiter: RateLimiter | None = None,
+        blob_store: BlobStore | None = None,
+        perceptual_index: PerceptualIndex | None = None,
+        sink: StorageSink | None = None,
+    ) -> None:
         resolved_key = api_key or os.environ.get("PEXELS_API_KEY")
         if not resolved_key:
             raise ValueError("PEXELS_API_KEY is required for PexelsProvider.")
+        if not 1 <= search_per_page <= PEXELS_MAX_PER_PAGE:
+            raise ValueError(
+                f"search_per_page must be between 1 and {PEXELS_MAX_PER_PAGE}"
+            )
         self._api_key: str = resolved_key
+        api_url = base_url or os.environ.get(PEXELS_API_URL_ENV) or PEXELS_API_URL
+        self._search_url = f"{api_url.rstrip('/')}/search"
+        self._rate_limiter = rate_limiter
+        self._sink = LOCAL_SINK if sink is None else sink
+        # Blobs are linked into output paths, which needs local files.
+        self._blob_store = blob_store if self._sink.local else None
+        self._perceptual_index = perceptual_index
+        self._search_per_page = search_per_page
+        self._search_cache = _SearchCache(search_cache_size, search_cache_ttl)
+        self._http_settings = http_settings
+        self._http = create_client(http_settings)
+        self._async_http: httpx.AsyncClient | None = None
+        self._async_loop: asyncio.AbstractEventLoop | None = None
+
+    def search_photos(
+        self, request: ImageRequest, count: int = 1
+    ) -> list[dict[str, Any]]:
+        """Return at least ``count`` search hits when Pexels has them."""
+        key = _search_key(request)
+        photos = self._search_cache.get(key, count)
+        if photos is not None:
+            return photos
+
+        per_page = self._page_size(count)
+        if self._rate_limiter is not None:
+            self._rate_limiter.acquire()
+        with timed_stage("pexels_search"):
+            response = self._http.get(
+                self._search_url,
+                headers={"Authorization": self._api_key},
+                params=_search_params(request, per_page),
+            )
+        return self._cache_search(key, per_page, response)
 
     def generate_image(self, request: ImageRequest) -> ImageResult:
-        headers = {"Authorization": self._api_key}
-        params: dict[str, str | int] = {"query": request.prompt, "per_page": 1}
+        index = _photo_index(request)
+        photos = self.search_photos(request, self._search_count(index))
+        photo = _pick_photo(photos, index)
+        if self._perceptual_index is None:
+            return self._materialise(request, photo)
+        duplicates: list[Path] = []
+        hits = photos[index:]
+        # Previews download concurrently; hits are still claimed in order.
+        pool = ThreadPoolExecutor(
+            max_workers=min(len(hits), MAX_DOWNLOAD_WORKERS),
+            thread_name_prefix="pexels-preview",
+        )
+        previews = [
+            pool.submit(contextvars.copy_context().run, self._preview, hit)
+            for hit in hits
+        ]
+        try:
+            for hit, preview in zip(hits, previews, strict=True):
+                duplicate = self._claim(request, hit, preview.result())
+                if duplicate is None:
+                    photo = hit
+                    break
+                duplicates.append(duplicate)
+        finally:
+            # Previews of hits after the chosen one are not needed.
+            pool.shutdown(wait=False, cancel_futures=True)
+        try:
+            return self._materialise(request, photo, None, _dedup_metadata(duplicates))
+        except BaseException:
+            # Free the reservation so a retry does not collide with itself.
+            self._release(request, photo)
+            raise
 
-        if request.language:
-            params["locale"] = request.language
+    def generate_images(self, requests: Sequence[ImageRequest]) -> list[ImageResult]:
+        return [self.generate_image(request) for request in requests]
 
-        orientation = request.metadata.get("orientation") or _orientation_from_size(
-            request.size
+    def generate_candidates(
+        self, request: ImageRequest, count: int
+    ) -> list[ImageResult]:
+        """Fetch up to ``count`` hits from one search and download them in parallel.
+
+        Each candidate is written next to the request's output path with a
+        ``_<n>`` suffix and tagged with ``pexels_candidate`` metadata.
+        """
+        photos = self.search_photos(request, count)[:count]
+        if not photos:
+            raise RuntimeError("Pexels search returned no photos.")
+        with ThreadPoolExecutor(
+            max_workers=min(len(photos), MAX_DOWNLOAD_WORKERS),
+            thread_name_prefix="pexels-download",
+        ) as pool:
+            # Each download runs in a copy of this context so its stage
+            # timings land on the caller's generation.
+            futures = [
+                pool.submit(
+                    contextvars.copy_context().run,
+                    self._materialise,
+                    request,
+                    photo,
+                    index,
+                )
+                for index, photo in enumerate(photos)
+            ]
+            return [future.result() for future in futures]
+
+    def iter_candidates(
+        self, request: ImageRequest, count: int
+    ) -> Generator[ImageResult]:
+        """Yield up to ``count`` candidates in the order their downloads finish.
+
+        Closing the generator early cancels downloads that have not started
+        and deletes candidates that finish after it was closed. Failed
+        downloads are skipped unless every candidate fails.
+        """
+        photos = self.search_photos(request, count)[:count]
+        if not photos:
+            raise RuntimeError("Pexels search returned no photos.")
+        pool = ThreadPoolExecutor(
+            max_workers=min(len(photos), MAX_DOWNLOAD_WORKERS),
+            thread_name_prefix="pexels-download",
         )
-        if orientation:
-            params["orientation"] = orientation
+        futures = [
+            pool.submit(
+                contextvars.copy_context().run,
+                self._materialise,
+                request,
+                photo,
+                index,
+            )
+            for index, photo in enumerate(photos)
+        ]
+        claimed: set[Future[ImageResult]] = set()
+        errors: list[BaseException] = []
+        try:
+            for future in as_completed(futures):
+                error = future.exception()
+                if error is not None:
+                    errors.append(error)
+                    continue
+                claimed.add(future)
+                yield future.result()
+            if not claimed and errors:
+                raise errors[0]
+        finally:
+            for future in futures:
+                if future not in claimed and not future.cancel():
+                    future.add_done_callback(_discard_candidate)
+            pool.shutdown(wait=False)
+
+    async def asearch_photos(
+        self, request: ImageRequest, count: int = 1
+    ) -> list[dict[str, Any]]:
+        """Async counterpart of search_photos."""
+        key = _search_key(request)
+        photos = self._search_cache.get(key, count)
+        if photos is not None:
+            return photos
+
+        per_page = self._page_size(count)
+        if self._rate_limiter is not None:
+            await self._rate_limiter.aacquire()
+        with timed_stage("pexels_search"):
+            response = await self._ahttp().get(
+                self._search_url,
+                headers={"Authorization": self._api_key},
+                params=_search_params(request, per_page),
+            )
+        return self._cache_search(key, per_page, response)
 
-        size = request.metadata.get("pexels_size")
-        if size:
-            params["size"] = size
+    async def agenerate_image(self, request: ImageRequest) -> ImageResult:
+        index = _photo_index(request)
+        photos = await self.asearch_photos(request, self._search_count(index))
+        photo = _pick_photo(photos, index)
+        if self._perceptual_index is None:
+            return await self._amaterialise(request, photo)
+        duplicates: list[Path] = []
+        hits = photos[index:]
+        previews = [asyncio.create_task(self._apreview(hit)) for hit in hits]
+        try:
+            for hit, preview in zip(hits, previews, strict=True):
+                duplicate = await asyncio.to_thread(
+                    self._claim, request, hit, await preview
+                )
+                if duplicate is None:
+                    photo = hit
+                    break
+                duplicates.append(duplicate)
+        finally:
+            for task in previews:
+                task.cancel()
+            await asyncio.gather(*previews, return_exceptions=True)
+        dedup_metadata = _dedup_metadata(duplicates)
+        try:
+            return await self._amaterialise(request, photo, None, dedup_metadata)
+        except BaseException:
+            self._release(request, photo)
+            raise
 
-        color = request.metadata.get("color")
-        if color:
-            params["color"] = color
+    async def agenerate_images(
+        self, requests: Sequence[ImageRequest]
+    ) -> list[ImageResult]:
+        return list(await asyncio.gather(*(self.agenerate_image(r) for r in requests)))
 
-        response = httpx.get(
-            PEXELS_SEARCH_URL, headers=headers, params=params, timeout=30.0
+    async def agenerate_candidates(
+        self, request: ImageRequest, count: int
+    ) -> list[ImageResult]:
+        """Async counterpart of generate_candidates."""
+        photos = (await self.asearch_photos(request, count))[:count]
+        if not photos:
+            raise RuntimeError("Pexels search returned no photos.")
+        return list(
+            await asyncio.gather(
+                *(
+                    self._amaterialise(request, photo, index)
+                    for index, photo in enumerate(photos)
+                )
+            )
         )
+
+    async def aiter_candidates(
+        self, request: ImageRequest, count: int
+    ) -> AsyncGenerator[ImageResult]:
+        """Async counterpart of iter_candidates; close it with ``aclose``."""
+        photos = (await self.asearch_photos(request, count))[:count]
+        if not photos:
+            raise RuntimeError("Pexels search returned no photos.")
+        tasks = [
+            asyncio.create_task(self._amaterialise(request, photo, index))
+            for index, photo in enumerate(photos)
+        ]
+        claimed: set[asyncio.Future[ImageResult]] = set()
+        errors: list[BaseException] = []
+        try:
+            async for task in asyncio.as_completed(tasks):
+                error = task.exception()
+                if error is not None:
+                    errors.append(error)
+                    continue
+                claimed.add(task)
+                yield task.result()
+            if not claimed and errors:
+                raise errors[0]
+        finally:
+            for task in tasks:
+                if task in claimed:
+                    continue
+                if task.done():
+                    _discard_candidate(task)
+                else:
+                    # Cancelling a streamed download removes its temp file.
+                    task.cancel()
+
+    def clear_search_cache(self) -> None:
+        self._search_cache.clear()
+
+    @property
+    def sink(self) -> StorageSink:
+        """Where this provider writes image bytes."""
+        return self._sink
+
+    def close(self) -> None:
+        """Release pooled connections held by both clients.
+
+        The async pool is closed on the loop that opened it, so evicting a
+        cached provider from synchronous code does not leak it.
+        """
+        self._http.close()
+        http, loop = self._detach_async_http()
+        if http is not None:
+            release_async_client(http, loop)
+
+    async def aclose(self) -> None:
+        """Release pooled connections held by both clients."""
+        self._http.close()
+        http, loop = self._detach_async_http()
+        if http is None:
+            return
+        if loop is asyncio.get_running_loop():
+            await http.aclose()
+        else:
+            release_async_client(http, loop)
+
+    def _detach_async_http(
+        self,
+    ) -> tuple[httpx.AsyncClient | None, asyncio.AbstractEventLoop | None]:
+        http, loop = self._async_http, self._async_loop
+        self._async_http = None
+        self._async_loop = None
+        return http, loop
+
+    def _ahttp(self) -> httpx.AsyncClient:
+        # Async pools are tied to the loop that opened them; cached providers
+        # can outlive a loop (e.g. successive asyncio.run calls).
+        loop = asyncio.get_running_loop()
+        if self._async_http is None or self._async_loop is not loop:
+            # The replaced pool still holds sockets opened on the old loop.
+            previous, previous_loop = self._detach_async_http()
+            if previous is not None:
+                release_async_client(previous, previous_loop)
+            self._async_http = create_async_client(self._http_settings)
+            self._async_loop = loop
+        return self._async_http
+
+    def _cache_search(
+        self, key: SearchKey, per_page: int, response: httpx.Response
+    ) -> list[dict[str, Any]]:
+        if self._rate_limiter is not None:
+            self._rate_limiter.observe(response.status_code, response.headers)
         response.raise_for_status()
         payload: dict[str, Any] = response.json()
         photos: list[dict[str, Any]] = payload.get("photos", [])
-        if not photos:
-            raise RuntimeError("Pexels search returned no photos.")
+        self._search_cache.put(key, per_page, photos)
+        return photos
 
-        photo = photos[0]
-        sources: dict[str, str] = photo.get("src", {})
-        source_key = request.metadata.get("pexels_src", "original")
-        image_url = sources.get(source_key) or sources.get("original")
-        if not image_url:
-            raise RuntimeError("Pexels photo response missing image URL.")
+    def _search_count(self, index: int) -> int:
+        if self._perceptual_index is None:
+            return index + 1
+        return min(index + 1 + PERCEPTUAL_LOOKAHEAD, PEXELS_MAX_PER_PAGE)
 
-        image_response = httpx.get(image_url, timeout=30.0)
-        image_response.raise_for_status()
-        image_bytes = image_response.content
+    def _page_size(self, count: int) -> int:
+        return min(max(count, self._search_per_page), PEXELS_MAX_PER_PAGE)
 
+    def _preview(self, photo: dict[str, Any]) -> bytes | None:
+        url = photo.get("src", {}).get(PEXELS_PREVIEW_SOURCE)
+        if not url:
+            return None
+        with timed_stage("pexels_preview"):
+            response = self._http.get(url)
+        response.raise_for_status()
+        return response.content
+
+    async def _apreview(self, photo: dict[str, Any]) -> bytes | None:
+        url = photo.get("src", {}).get(PEXELS_PREVIEW_SOURCE)
+        if not url:
+            return None
+        with timed_stage("pexels_preview"):
+            response = await self._ahttp().get(url)
+        response.raise_for_status()
+        return response.content
+
+    def _claim(
+        self, request: ImageRequest, photo: dict[str, Any], preview: bytes | None
+    ) -> Path | None:
+        """Reserve ``photo`` for ``request`` unless the index already has it."""
+        from langlearn_imagegen.phash import hash_bytes
+
+        assert self._perceptual_index is not None
+        if preview is None:
+            return None
+        try:
+            image_hash = hash_bytes(preview)
+        except OSError:
+            return None
+        output_path = self._output_path(request, _photo_source(photo, request)[1])
+        return self._perceptual_index.claim(output_path, image_hash)
+
+    def _release(self, request: ImageRequest, photo: dict[str, Any]) -> None:
+        assert self._perceptual_index is not None
+        image_url = _photo_source(photo, request)[1]
+        self._perceptual_index.discard(self._output_path(request, image_url))
+
+    def _materialise(
+        self,
+        request: ImageRequest,
+        photo: dict[str, Any],
+        candidate: int | None = None,
+        extra_metadata: dict[str, str] | None = None,
+    ) -> ImageResult:
+        source_key, image_url = _photo_source(photo, request)
+        output_path = self._output_path(request, image_url, candidate)
+        blob_metadata = self._download(
+            image_url, output_path, _blob_alias(photo, source_key)
+        )
+        return self._build_result(
+            request,
+            photo,
+            source_key,
+            output_path,
+            candidate,
+            {**blob_metadata, **(extra_metadata or {})},
+        )
+
+    def _download(
+        self, image_url: str, output_path: Path, alias: str
+    ) -> dict[str, str]:
+        store = self._blob_store
+        if store is None:
+            download_to_file(self._http, image_url, output_path, self._sink)
+            return {}
+        existing = store.lookup(alias)
+        if existing is not None:
+            method = store.link(existing, output_path)
+            return _blob_metadata(existing, method, reused=True)
+        download_to_file(self._http, image_url, output_path)
+        blob, method = store.adopt(output_path, alias)
+        return _blob_metadata(blob, method, reused=False)
+
+    async def _amaterialise(
+        self,
+        request: ImageRequest,
+        photo: dict[str, Any],
+        candidate: int | None = None,
+        extra_metadata: dict[str, str] | None = None,
+    ) -> ImageResult:
+        source_key, image_url = _photo_source(photo, request)
+        output_path = self._output_path(request, image_url, candidate)
+        blob_metadata = await self._adownload(
+            image_url, output_path, _blob_alias(photo, source_key)
+        )
+        return self._build_result(
+            request,
+            photo,
+            source_key,
+            output_path,
+            candidate,
+            {**blob_metadata, **(extra_metadata or {})},
+        )
+
+    async def _adownload(
+        self, image_url: str, output_path: Path, alias: str
+    ) -> dict[str, str]:
+        store = self._blob_store
+        if store is None:
+            await adownload_to_file(self._ahttp(), image_url, output_path, self._sink)
+            return {}
+        existing = store.lookup(alias)
+        if existing is not None:
+            method = await asyncio.to_thread(store.link, existing, output_path)
+            return _blob_metadata(existing, method, reused=True)
+        await adownload_to_file(self._ahttp(), image_url, output_path)
+        blob, method = await asyncio.to_thread(store.adopt, output_path, alias)
+        return _blob_metadata(blob, method, reused=False)
+
+    def _output_path(
+        self,
+        request: ImageRequest,
+        image_url: str,
+        candidate: int | None = None,
+    ) -> Path:
         extension = extension_from_url(image_url, default="jpg")
         output_path = resolve_output_path(
             request.prompt,
             ImageProviderId.pexels.value,
             request.metadata,
             extension,
+            create_parent=self._sink.local,
         )
-        output_path.write_bytes(image_bytes)
+        if candidate is not None:
+            output_path = candidate_path(output_path, candidate)
+        return output_path
 
+    def _build_result(
+        self,
+        request: ImageRequest,
+        photo: dict[str, Any],
+        source_key: str,
+        output_path: Path,
+        candidate: int | None = None,
+        extra_metadata: dict[str, str] | None = None,
+    ) -> ImageResult:
         metadata = dict(request.metadata)
+        metadata.update(extra_metadata or {})
+        if candidate is not None:
+            metadata["pexels_candidate"] = str(candidate)
         metadata.setdefault("pexels_id", str(photo.get("id", "")))
         metadata.setdefault("pexels_url", str(photo.get("url", "")))
         metadata.setdefault("pexels_photographer", str(photo.get("photographer", "")))
@@ -96,6 +711,7 @@ class PexelsProvider:
             "pexels_photographer_url", str(photo.get("photographer_url", ""))
         )
         metadata.setdefault("pexels_source", source_key)
+        metadata.update(storage_metadata(self._sink, output_path))
 
         return ImageResult(
             path=output_path,
@@ -105,6 +721,3 @@ class PexelsProvider:
             model=None,
             metadata=metadata,
         )
-
-    def generate_images(self, requests: Sequence[ImageRequest]) -> list[ImageResult]:
-        return [self.generate_image(request) for request in requests]
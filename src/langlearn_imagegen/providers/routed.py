@@ -0,0 +1,423 @@
+"""Latency-aware routing across providers, with optional hedged requests."""
+
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import math
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from collections.abc import Sequence
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import replace
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from langlearn_imagegen.defaults import DEFAULT_MAX_WORKERS
+from langlearn_imagegen.providers import (
+    PROVIDER_API_KEY_ENV,
+    PROVIDER_REGISTRY,
+    AsyncImageProvider,
+    get_circuit_breaker,
+    get_provider,
+)
+from langlearn_imagegen.storage import storage_sink_from_env
+from langlearn_imagegen.utils import resolve_output_path
+
+if TYPE_CHECKING:
+    from langlearn_types import ImageProvider, ImageRequest, ImageResult
+
+    from langlearn_imagegen.transport import HttpSettings
+
+__all__ = [
+    "DEFAULT_HEDGE_DELAY",
+    "ROUTED_PROVIDER",
+    "ROUTE_HEDGE_ENV",
+    "ROUTE_PROVIDERS_ENV",
+    "LatencyWindow",
+    "RoutedProvider",
+    "get_latency_window",
+    "routing_status",
+]
+
+ROUTED_PROVIDER = "routed"
+ROUTE_PROVIDERS_ENV = "LANGLEARN_IMAGEGEN_ROUTE_PROVIDERS"
+ROUTE_HEDGE_ENV = "LANGLEARN_IMAGEGEN_ROUTE_HEDGE"
+
+# Hedge delay used until a provider has MIN_SAMPLES recent successes.
+DEFAULT_HEDGE_DELAY = 10.0
+HEDGE_QUANTILE = 0.9
+MIN_SAMPLES = 5
+
+
+class LatencyWindow:
+    """Recent call latencies and outcomes for one provider.
+
+    Keeps the last ``size`` calls and forgets calls older than ``max_age``
+    seconds, so a provider that was slow or failing is measured afresh
+    once it has been left alone for a while.
+    """
+
+    def __init__(self, size: int = 50, max_age: float = 300.0) -> None:
+        self._samples: deque[tuple[float, float, bool]] = deque(maxlen=size)
+        self._max_age = max_age
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float, ok: bool) -> None:
+        with self._lock:
+            self._samples.append((time.monotonic(), seconds, ok))
+
+    def quantile(self, fraction: float) -> float | None:
+        """Latency of successful calls at ``fraction``; None if too few."""
+        latencies = self._latencies()
+        if len(latencies) < MIN_SAMPLES:
+            return None
+        return latencies[min(len(latencies) - 1, int(fraction * len(latencies)))]
+
+    def expected_latency(self) -> float:
+        """Median latency inflated by the error rate, used to rank providers.
+
+        A provider without recent calls scores 0.0 so it is tried (and
+        measured) next; one whose recent calls all failed scores infinity.
+        """
+        samples = self._fresh()
+        if not samples:
+            return 0.0
+        latencies = sorted(seconds for _, seconds, ok in samples if ok)
+        if not latencies:
+            return math.inf
+        success_rate = len(latencies) / len(samples)
+        return latencies[len(latencies) // 2] / success_rate
+
+    def snapshot(self) -> dict[str, float | int | None]:
+        samples = self._fresh()
+        failures = sum(1 for _, _, ok in samples if not ok)
+        return {
+            "samples": len(samples),
+            "error_rate": round(failures / len(samples), 3) if samples else None,
+            "p50_ms": _ms(self.quantile(0.5)),
+            "p90_ms": _ms(self.quantile(HEDGE_QUANTILE)),
+        }
+
+    def _latencies(self) -> list[float]:
+        return sorted(seconds for _, seconds, ok in self._fresh() if ok)
+
+    def _fresh(self) -> list[tuple[float, float, bool]]:
+        horizon = time.monotonic() - self._max_age
+        with self._lock:
+            while self._samples and self._samples[0][0] < horizon:
+                self._samples.popleft()
+            return list(self._samples)
+
+
+def _ms(seconds: float | None) -> float | None:
+    return None if seconds is None else round(seconds * 1000, 3)
+
+
+_windows: dict[str, LatencyWindow] = {}
+_windows_lock = threading.Lock()
+
+
+def get_latency_window(name: str) -> LatencyWindow:
+    """Return the process-wide latency window for a provider."""
+    key = name.lower()
+    with _windows_lock:
+        window = _windows.get(key)
+        if window is None:
+            window = LatencyWindow()
+            _windows[key] = window
+        return window
+
+
+def routing_status() -> dict[str, dict[str, float | int | None]]:
+    """Snapshot the latency window of every provider that has been routed to."""
+    with _windows_lock:
+        windows = dict(_windows)
+    return {name: windows[name].snapshot() for name in sorted(windows)}
+
+
+def _default_members() -> list[str]:
+    configured = os.environ.get(ROUTE_PROVIDERS_ENV)
+    if configured:
+        return [name.strip().lower() for name in configured.split(",") if name.strip()]
+    keyed = [name for name, env in PROVIDER_API_KEY_ENV.items() if os.environ.get(env)]
+    return keyed or [name for name in PROVIDER_API_KEY_ENV if name in PROVIDER_REGISTRY]
+
+
+class RoutedProvider:
+    """Sends each request to the provider with the best recent latency.
+
+    Members are ranked by median latency over a moving window, inflated by
+    their error rate. A member with no recent calls ranks first so it gets
+    measured, and one whose circuit is open ranks last. Members are the
+    shared instances from get_provider, so they keep their own rate
+    limiters and connection pools.
+
+    With ``hedge``, a request that the chosen member has not answered by
+    its observed p90 (or ``hedge_delay`` until enough calls are recorded),
+    or that it fails, is also sent to the next-ranked member. The first
+    success wins; the other attempt is cancelled, or its image is deleted
+    once it finishes where a blocking call cannot be interrupted. Hedged
+    attempts write to hidden staging names next to the output path and the
+    winner is renamed into place.
+    """
+
+    def __init__(
+        self,
+        providers: Sequence[str] | None = None,
+        *,
+        hedge: bool = False,
+        hedge_delay: float = DEFAULT_HEDGE_DELAY,
+        max_workers: int = 2 * DEFAULT_MAX_WORKERS,
+        http_settings: HttpSettings | None = None,
+    ) -> None:
+        self._names = [name.lower() for name in providers or _default_members()]
+        if ROUTED_PROVIDER in self._names:
+            raise ValueError("routed provider cannot route to itself")
+        if not self._names:
+            raise ValueError("routed provider needs at least one provider")
+        self._hedge = hedge
+        self._hedge_delay = hedge_delay
+        self._max_workers = max_workers
+        self._http_settings = http_settings
+        self._pool: ThreadPoolExecutor | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def providers(self) -> list[str]:
+        return list(self._names)
+
+    def ranked(self) -> list[str]:
+        """Members from best to worst by expected latency."""
+
+        def score(name: str) -> tuple[bool, float]:
+            circuit_open = get_circuit_breaker(name).state == "open"
+            return circuit_open, get_latency_window(name).expected_latency()
+
+        return sorted(self._names, key=score)
+
+    def generate_image(self, request: ImageRequest) -> ImageResult:
+        ranked = self.ranked()
+        if not self._hedging(ranked):
+            return self._attempt(ranked[0], request)
+        primary, backup = ranked[:2]
+        pool = self._executor()
+        attempts = {self._submit(pool, primary, request): primary}
+        done, _ = wait(attempts, timeout=self._delay_for(primary))
+        if not done or next(iter(done)).exception() is not None:
+            attempts[self._submit(pool, backup, request)] = backup
+        winner = _first_success(list(attempts))
+        for future in attempts:
+            if future is not winner:
+                future.cancel()
+                future.add_done_callback(_discard_future)
+        return _promote(request, winner.result(), hedged=len(attempts) > 1)
+
+    def generate_images(self, requests: Sequence[ImageRequest]) -> list[ImageResult]:
+        return [self.generate_image(request) for request in requests]
+
+    async def agenerate_image(self, request: ImageRequest) -> ImageResult:
+        ranked = self.ranked()
+        if not self._hedging(ranked):
+            return await self._aattempt(ranked[0], request)
+        primary, backup = ranked[:2]
+        staged = [_staged(request, primary)]
+        attempts = [asyncio.create_task(self._aattempt(primary, staged[0]))]
+        try:
+            done, _ = await asyncio.wait(attempts, timeout=self._delay_for(primary))
+            if not done or attempts[0].exception() is not None:
+                staged.append(_staged(request, backup))
+                attempts.append(asyncio.create_task(self._aattempt(backup, staged[1])))
+            winner = await _afirst_success(attempts)
+            return _promote(request, winner.result(), hedged=len(attempts) > 1)
+        finally:
+            # Also runs when the caller is cancelled, so no attempt outlives it.
+            await _aabandon(attempts, staged)
+
+    async def agenerate_images(
+        self, requests: Sequence[ImageRequest]
+    ) -> list[ImageResult]:
+        return list(await asyncio.gather(*(self.agenerate_image(r) for r in requests)))
+
+    def close(self) -> None:
+        """Stop the hedging pool; members are shared and stay open."""
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+    async def aclose(self) -> None:
+        self.close()
+
+    def _hedging(self, ranked: list[str]) -> bool:
+        # Winners are renamed into place, which needs local files.
+        return self._hedge and len(ranked) > 1 and storage_sink_from_env().local
+
+    def _member(self, name: str) -> ImageProvider:
+        return get_provider(name, cache=True, http_settings=self._http_settings)
+
+    def _delay_for(self, name: str) -> float:
+        observed = get_latency_window(name).quantile(HEDGE_QUANTILE)
+        return self._hedge_delay if observed is None else observed
+
+    def _executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(
+                    max_workers=self._max_workers, thread_name_prefix="imagegen-hedge"
+                )
+            return self._pool
+
+    def _submit(
+        self, pool: ThreadPoolExecutor, name: str, request: ImageRequest
+    ) -> Future[ImageResult]:
+        # Both attempts report their stages to the caller's generation.
+        context = contextvars.copy_context()
+        return pool.submit(context.run, self._attempt, name, _staged(request, name))
+
+    def _attempt(self, name: str, request: ImageRequest) -> ImageResult:
+        started = time.perf_counter()
+        try:
+            result = self._member(name).generate_image(request)
+        except Exception:
+            get_latency_window(name).record(time.perf_counter() - started, ok=False)
+            raise
+        get_latency_window(name).record(time.perf_counter() - started, ok=True)
+        return _routed(result, name)
+
+    async def _aattempt(self, name: str, request: ImageRequest) -> ImageResult:
+        member = self._member(name)
+        started = time.perf_counter()
+        try:
+            if isinstance(member, AsyncImageProvider):
+                result = await member.agenerate_image(request)
+            else:
+                result = await _in_thread(member, request)
+        except Exception:
+            # A cancelled hedge loser is not recorded: it neither failed nor
+            # finished, so its latency says nothing about the member.
+            get_latency_window(name).record(time.perf_counter() - started, ok=False)
+            raise
+        get_latency_window(name).record(time.perf_counter() - started, ok=True)
+        return _routed(result, name)
+
+
+async def _in_thread(member: ImageProvider, request: ImageRequest) -> ImageResult:
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    future = loop.run_in_executor(
+        None, lambda: context.run(member.generate_image, request)
+    )
+    try:
+        # Shielded so that a cancelled hedge can still clean up after the
+        # thread, which keeps running.
+        return await asyncio.shield(future)
+    except asyncio.CancelledError:
+        future.add_done_callback(_discard_task)
+        raise
+
+
+def _first_success(attempts: list[Future[ImageResult]]) -> Future[ImageResult]:
+    pending = set(attempts)
+    failed: Future[ImageResult] | None = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                return future
+            failed = future
+    assert failed is not None
+    return failed
+
+
+async def _afirst_success(
+    attempts: list[asyncio.Task[ImageResult]],
+) -> asyncio.Task[ImageResult]:
+    pending: set[asyncio.Task[ImageResult]] = set(attempts)
+    failed: asyncio.Task[ImageResult] | None = None
+    while pending:
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            if task.exception() is None:
+                return task
+            failed = task
+    assert failed is not None
+    return failed
+
+
+async def _aabandon(
+    attempts: list[asyncio.Task[ImageResult]], staged: list[ImageRequest]
+) -> None:
+    """Stop every attempt and delete the files they staged.
+
+    The winner has already been moved into place, so only losers' (and
+    partial) files are left under the staged names.
+    """
+    for task in attempts:
+        task.cancel()
+    await asyncio.gather(*attempts, return_exceptions=True)
+    for request in staged:
+        for path in _staged_files(request):
+            path.unlink(missing_ok=True)
+
+
+def _discard_future(future: Future[ImageResult]) -> None:
+    if not future.cancelled() and future.exception() is None:
+        future.result().path.unlink(missing_ok=True)
+
+
+def _discard_task(task: asyncio.Future[ImageResult]) -> None:
+    if not task.cancelled() and task.exception() is None:
+        task.result().path.unlink(missing_ok=True)
+
+
+# Metadata keys that decide where an image is written.
+_LOCATION_KEYS = ("output_path", "filename")
+
+
+def _staged(request: ImageRequest, name: str) -> ImageRequest:
+    """Point ``request`` at a hidden name unique to this attempt."""
+    tag = f".hedge-{name}-{uuid.uuid4().hex[:8]}"
+    metadata = dict(request.metadata)
+    output_path = metadata.get("output_path")
+    if output_path:
+        path = Path(output_path)
+        metadata["output_path"] = str(path.with_name(f"{tag}{path.suffix}"))
+    else:
+        metadata["filename"] = tag + Path(metadata.get("filename", "")).suffix
+    return replace(request, metadata=metadata)
+
+
+def _staged_files(request: ImageRequest) -> list[Path]:
+    path = resolve_output_path(
+        request.prompt, "", request.metadata, "png", create_parent=False
+    )
+    # Members choose the extension, so match the staged name with any suffix.
+    return list(path.parent.glob(f"{path.stem}*"))
+
+
+def _promote(
+    request: ImageRequest, result: ImageResult, *, hedged: bool
+) -> ImageResult:
+    """Move a staged winner to the path the request asked for."""
+    extension = result.path.suffix.lstrip(".") or "png"
+    final_path = resolve_output_path(
+        request.prompt, result.provider.value, request.metadata, extension
+    )
+    os.replace(result.path, final_path)
+    metadata = dict(result.metadata)
+    for key in _LOCATION_KEYS:
+        metadata.pop(key, None)
+        if key in request.metadata:
+            metadata[key] = request.metadata[key]
+    metadata["route_hedged"] = "true" if hedged else "false"
+    return replace(result, path=final_path, metadata=metadata)
+
+
+def _routed(result: ImageResult, name: str) -> ImageResult:
+    metadata = dict(result.metadata)
+    metadata["routed_to"] = name
+    return replace(result, metadata=metadata)
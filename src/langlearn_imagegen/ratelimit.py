@@ -0,0 +1,230 @@
+"""Client-side token-bucket pacing that adapts to provider rate-limit headers."""
+
+from __future__ import annotations
+
+import re
+import threading
+import time
+from collections.abc import Mapping
+
+from langlearn_imagegen.metrics import record_stage
+
+__all__ = ["RateLimiter", "parse_rate"]
+
+_UNITS = {
+    "s": 1.0,
+    "sec": 1.0,
+    "second": 1.0,
+    "m": 60.0,
+    "min": 60.0,
+    "minute": 60.0,
+    "h": 3600.0,
+    "hour": 3600.0,
+    "d": 86400.0,
+    "day": 86400.0,
+}
+
+# OpenAI reports resets as Go-style durations such as "1s", "6m0s" or "20ms".
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_DURATION_SECONDS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+# Pause applied after a 429 that carries no Retry-After header.
+_DEFAULT_THROTTLE_PAUSE = 1.0
+
+
+def parse_rate(spec: str) -> tuple[float, float]:
+    """Parse ``"200/hour"`` style specs into (requests per second, burst).
+
+    The burst defaults to the request count, so a fresh bucket may spend a
+    whole window's allowance at once before pacing kicks in.
+    """
+    count_str, sep, unit = spec.strip().lower().partition("/")
+    unit = unit.rstrip("s") if unit not in _UNITS else unit
+    if not sep or unit not in _UNITS:
+        raise ValueError(f"Invalid rate '{spec}'. Expected e.g. '200/hour'.")
+    try:
+        count = float(count_str)
+    except ValueError:
+        raise ValueError(f"Invalid rate '{spec}'. Expected e.g. '200/hour'.") from None
+    if count <= 0:
+        raise ValueError("rate must be positive")
+    return count / _UNITS[unit], count
+
+
+def _parse_duration(value: str) -> float | None:
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * _DURATION_SECONDS[unit] for amount, unit in parts)
+
+
+def _parse_retry_after(value: str) -> float | None:
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    # HTTP-date values are rare; keep email.utils off the import path.
+    from email.utils import parsedate_to_datetime
+
+    try:
+        moment = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, moment.timestamp() - time.time())
+
+
+def _parse_int(value: str | None) -> int | None:
+    if value is None:
+        return None
+    try:
+        return int(float(value))
+    except ValueError:
+        return None
+
+
+class RateLimiter:
+    """Token bucket shared by every call made to one provider.
+
+    Callers reserve a token before each API request and sleep until it is
+    due, so concurrent workers queue fairly instead of spinning. After each
+    response, ``observe`` folds in ``Retry-After`` and quota headers
+    (Pexels ``X-Ratelimit-*``, OpenAI ``x-ratelimit-*-requests``): the
+    bucket pauses until the advertised reset and slows to spread the
+    remaining quota over the rest of the window.
+    """
+
+    def __init__(self, rate: float, burst: float | None = None) -> None:
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self._rate = rate
+        self._capacity = max(1.0, burst if burst is not None else rate)
+        self._tokens = self._capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._limit: int | None = None
+        self._remaining: int | None = None
+        self._reset_at: float | None = None
+        self._throttled = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_spec(cls, spec: str) -> RateLimiter:
+        rate, burst = parse_rate(spec)
+        return cls(rate, burst)
+
+    def acquire(self) -> None:
+        """Block until a request may be sent."""
+        delay = self._reserve()
+        if delay > 0:
+            record_stage("rate_limit_wait", delay)
+            time.sleep(delay)
+
+    async def aacquire(self) -> None:
+        """Wait, without blocking the event loop, until a request may be sent."""
+        # asyncio is necessarily loaded already when this runs; importing it
+        # here keeps it out of the CLI's synchronous start-up path.
+        import asyncio
+
+        delay = self._reserve()
+        if delay > 0:
+            record_stage("rate_limit_wait", delay)
+            await asyncio.sleep(delay)
+
+    def observe(self, status_code: int, headers: Mapping[str, str]) -> None:
+        """Adjust pacing from a provider response."""
+        lowered = {key.lower(): value for key, value in headers.items()}
+        now = time.monotonic()
+        with self._lock:
+            limit = _parse_int(
+                lowered.get("x-ratelimit-limit")
+                or lowered.get("x-ratelimit-limit-requests")
+            )
+            remaining = _parse_int(
+                lowered.get("x-ratelimit-remaining")
+                or lowered.get("x-ratelimit-remaining-requests")
+            )
+            reset_in = self._reset_in(lowered)
+            if limit is not None:
+                self._limit = limit
+            if remaining is not None:
+                self._remaining = remaining
+            if reset_in is not None:
+                self._reset_at = now + reset_in
+                if remaining == 0:
+                    self._paused_until = max(self._paused_until, now + reset_in)
+
+            retry_after = lowered.get("retry-after")
+            pause = _parse_retry_after(retry_after) if retry_after else None
+            if status_code == 429:
+                self._throttled += 1
+                self._tokens = min(self._tokens, 0.0)
+                if pause is None:
+                    pause = _DEFAULT_THROTTLE_PAUSE
+            if pause is not None:
+                self._paused_until = max(self._paused_until, now + pause)
+
+    def snapshot(self) -> dict[str, float | int | None]:
+        """Return the current quota view for health reporting."""
+        now = time.monotonic()
+        with self._lock:
+            self._refill(now)
+            reset_in = (
+                max(0.0, self._reset_at - now) if self._reset_at is not None else None
+            )
+            return {
+                "rate_per_second": round(self._effective_rate(now), 6),
+                "burst": self._capacity,
+                "tokens": round(max(self._tokens, 0.0), 3),
+                "limit": self._limit,
+                "remaining": self._remaining,
+                "reset_in_seconds": round(reset_in, 3)
+                if reset_in is not None
+                else None,
+                "paused_for_seconds": round(max(0.0, self._paused_until - now), 3),
+                "throttled_responses": self._throttled,
+            }
+
+    def _reserve(self) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens -= 1.0
+            if self._remaining is not None and self._remaining > 0:
+                self._remaining -= 1
+            delay = 0.0
+            if self._tokens < 0:
+                delay = -self._tokens / self._effective_rate(now)
+            return max(delay, self._paused_until - now)
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._updated
+        self._updated = now
+        if elapsed > 0:
+            self._tokens = min(
+                self._capacity, self._tokens + elapsed * self._effective_rate(now)
+            )
+
+    def _effective_rate(self, now: float) -> float:
+        # An exhausted quota is handled by pausing until reset, not by pacing.
+        if not self._remaining or self._reset_at is None:
+            return self._rate
+        window = self._reset_at - now
+        if window <= 0:
+            return self._rate
+        # Spread what is left of the server quota over the rest of its window.
+        return min(self._rate, self._remaining / window)
+
+    @staticmethod
+    def _reset_in(headers: Mapping[str, str]) -> float | None:
+        pexels_reset = headers.get("x-ratelimit-reset")
+        if pexels_reset is not None:
+            epoch = _parse_int(pexels_reset)
+            return max(0.0, epoch - time.time()) if epoch is not None else None
+        openai_reset = headers.get("x-ratelimit-reset-requests")
+        if openai_reset is not None:
+            return _parse_duration(openai_reset)
+        return None
@@ -0,0 +1,236 @@
+"""Retry with backoff and per-provider circuit breaking."""
+
+from __future__ import annotations
+
+import random
+import sys
+import threading
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+
+__all__ = [
+    "CircuitBreaker",
+    "CircuitOpenError",
+    "RetryPolicy",
+    "acall_with_retry",
+    "call_with_retry",
+]
+
+DEFAULT_RETRY_STATUSES = frozenset({408, 409, 425, 429, 500, 502, 503, 504})
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling a provider whose circuit is open."""
+
+    def __init__(self, name: str, retry_in: float) -> None:
+        self.name = name
+        self.retry_in = retry_in
+        super().__init__(
+            f"Provider '{name}' is unavailable (circuit open, retry in {retry_in:.1f}s)"
+        )
+
+
+def _status_code(exc: BaseException) -> int | None:
+    status = getattr(exc, "status_code", None)
+    if isinstance(status, int):
+        return status
+    response = getattr(exc, "response", None)
+    status = getattr(response, "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def _retry_after(exc: BaseException) -> float | None:
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    if headers is None:
+        return None
+    value = headers.get("retry-after")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None
+
+
+def _transport_errors() -> tuple[type[BaseException], ...]:
+    # Only look at SDKs that are already imported: an exception can't come
+    # from a module that was never loaded, and this keeps imports lazy.
+    errors: list[type[BaseException]] = [ConnectionError, TimeoutError]
+    httpx = sys.modules.get("httpx")
+    if httpx is not None:
+        errors.append(httpx.TransportError)
+    openai = sys.modules.get("openai")
+    if openai is not None:
+        errors.append(openai.APIConnectionError)
+    return tuple(errors)
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """How often, and for which failures, a provider call is retried.
+
+    Delays grow exponentially from ``base_delay`` up to ``max_delay`` with
+    full jitter, and never undercut a server-sent ``Retry-After``.
+    """
+
+    max_attempts: int = 3
+    base_delay: float = 0.5
+    max_delay: float = 30.0
+    multiplier: float = 2.0
+    retry_statuses: frozenset[int] = DEFAULT_RETRY_STATUSES
+    retry_exceptions: tuple[type[BaseException], ...] = field(default=())
+
+    def is_retryable(self, exc: BaseException) -> bool:
+        status = _status_code(exc)
+        if status is not None:
+            return status in self.retry_statuses
+        return isinstance(exc, _transport_errors() + self.retry_exceptions)
+
+    def delay(self, attempt: int, exc: BaseException | None = None) -> float:
+        """Seconds to wait before retry number ``attempt`` (1-based)."""
+        ceiling = min(
+            self.max_delay, self.base_delay * self.multiplier ** (attempt - 1)
+        )
+        delay = random.uniform(0.0, ceiling)
+        retry_after = _retry_after(exc) if exc is not None else None
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_delay))
+        return delay
+
+
+class CircuitBreaker:
+    """Fails fast after repeated transient failures against one provider.
+
+    After ``failure_threshold`` consecutive retryable failures the circuit
+    opens and calls raise CircuitOpenError for ``reset_timeout`` seconds.
+    Then a single trial call is let through (half-open): success closes
+    the circuit, failure opens it again.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+    ) -> None:
+        self._name = name
+        self._failure_threshold = failure_threshold
+        self._reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at: float | None = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state(time.monotonic())
+
+    def before_call(self) -> None:
+        """Raise CircuitOpenError unless a call may proceed."""
+        with self._lock:
+            now = time.monotonic()
+            state = self._state(now)
+            if state == "closed":
+                return
+            if state == "half-open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return
+            opened_at = self._opened_at or now
+            retry_in = max(0.0, opened_at + self._reset_timeout - now)
+            raise CircuitOpenError(self._name, retry_in)
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._trial_in_flight or self._failures >= self._failure_threshold:
+                self._opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+    def snapshot(self) -> dict[str, str | int]:
+        with self._lock:
+            return {
+                "state": self._state(time.monotonic()),
+                "consecutive_failures": self._failures,
+            }
+
+    def _state(self, now: float) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if now - self._opened_at >= self._reset_timeout:
+            return "half-open"
+        return "open"
+
+
+def call_with_retry[T](
+    fn: Callable[[], T],
+    policy: RetryPolicy,
+    breaker: CircuitBreaker | None = None,
+) -> T:
+    """Call ``fn`` under ``policy``, consulting ``breaker`` before each try."""
+    attempt = 1
+    while True:
+        if breaker is not None:
+            breaker.before_call()
+        try:
+            value = fn()
+        except Exception as exc:
+            retryable = policy.is_retryable(exc)
+            if breaker is not None:
+                # Non-transient errors (bad prompt, auth) still prove the
+                # provider is reachable, so they do not count against it.
+                if retryable:
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()
+            if not retryable or attempt >= policy.max_attempts:
+                raise
+            time.sleep(policy.delay(attempt, exc))
+            attempt += 1
+            continue
+        if breaker is not None:
+            breaker.record_success()
+        return value
+
+
+async def acall_with_retry[T](
+    fn: Callable[[], Awaitable[T]],
+    policy: RetryPolicy,
+    breaker: CircuitBreaker | None = None,
+) -> T:
+    """Async counterpart of call_with_retry."""
+    # Imported here so the synchronous CLI paths never load asyncio.
+    import asyncio
+
+    attempt = 1
+    while True:
+        if breaker is not None:
+            breaker.before_call()
+        try:
+            value = await fn()
+        except Exception as exc:
+            retryable = policy.is_retryable(exc)
+            if breaker is not None:
+                # Non-transient errors (bad prompt, auth) still prove the
+                # provider is reachable, so they do not count against it.
+                if retryable:
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()
+            if not retryable or attempt >= policy.max_attempts:
+                raise
+            await asyncio.sleep(policy.delay(attempt, exc))
+            attempt += 1
+            continue
+        if breaker is not None:
+            breaker.record_success()
+        return value
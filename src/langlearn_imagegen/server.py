@@ -1,10 +1,36 @@
 from __future__ import annotations
 
-from langlearn_types import ImageProviderId, ImageRequest
-from mcp.server.fastmcp import FastMCP
+import asyncio
+import time
+import uuid
+from dataclasses import replace
+from typing import Required, TypedDict
 
-from langlearn_imagegen import __version__, generate
-from langlearn_imagegen.providers import PROVIDER_REGISTRY
+from langlearn_types import ImageProviderId, ImageRequest, ImageResult
+from mcp.server.fastmcp import Context, FastMCP
+from mcp.server.session import ServerSession
+
+from langlearn_imagegen import __version__, agenerate
+from langlearn_imagegen.assets import (
+    ASSET_INDEX_ENV,
+    DEFAULT_LIST_LIMIT,
+    AssetIndex,
+    asset_index_from_env,
+)
+from langlearn_imagegen.core import (
+    DEFAULT_MAX_WORKERS,
+    BatchItemResult,
+    ItemCallback,
+    arun_batch,
+)
+from langlearn_imagegen.metrics import METRICS, start_exporters_from_env
+from langlearn_imagegen.postprocess import POSTPROCESS_KEY, PostProcessSpec
+from langlearn_imagegen.providers import (
+    PROVIDER_REGISTRY,
+    circuit_status,
+    rate_limit_status,
+)
+from langlearn_imagegen.providers.routed import routing_status
 
 mcp = FastMCP("langlearn-imagegen")
 mcp._mcp_server.version = __version__  # pyright: ignore[reportPrivateUsage]
@@ -17,9 +43,27 @@ def ping() -> str:
 
 
 @mcp.tool()
-def health() -> dict[str, str]:
-    """Report basic service health."""
-    return {"status": "ok", "version": __version__}
+def health() -> dict[str, object]:
+    """Report service health, quota, circuit state and routing latencies."""
+    return {
+        "status": "ok",
+        "version": __version__,
+        "rate_limits": rate_limit_status(),
+        "circuits": circuit_status(),
+        "routing": routing_status(),
+    }
+
+
+@mcp.tool()
+def metrics(output_format: str = "json") -> dict[str, object] | str:
+    """Report generation counters and per-stage latency histograms.
+
+    ``output_format="prometheus"`` returns the Prometheus text exposition
+    format.
+    """
+    if output_format == "prometheus":
+        return METRICS.render_prometheus()
+    return dict(METRICS.snapshot())
 
 
 @mcp.tool()
@@ -28,8 +72,35 @@ def list_providers() -> list[str]:
     return sorted(PROVIDER_REGISTRY)
 
 
-@mcp.tool()
-def generate_image(
+# Resolved at runtime: FastMCP finds the context parameter by its type.
+ToolContext = Context[ServerSession, object, object]
+
+
+class BatchImageRequest(TypedDict, total=False):
+    """One entry of a generate_images / submit_batch call."""
+
+    prompt: Required[str]
+    provider: str | None
+    size: str | None
+    style: str | None
+    language: str | None
+    cultural_context: str | None
+    quality: str | None
+    seed: int | None
+    output_path: str | None
+    output_dir: str | None
+    filename: str | None
+    response_format: str | None
+    output_format: str | None
+    pexels_src: str | None
+    pexels_size: str | None
+    orientation: str | None
+    color: str | None
+    postprocess: str | None
+    metadata: dict[str, str] | None
+
+
+def _build_request(
     prompt: str,
     provider: str | None = None,
     size: str | None = None,
@@ -47,9 +118,9 @@ def generate_image(
     pexels_size: str | None = None,
     orientation: str | None = None,
     color: str | None = None,
+    postprocess: str | None = None,
     metadata: dict[str, str] | None = None,
-) -> dict[str, object]:
-    """Generate an image via the configured provider."""
+) -> ImageRequest:
     resolved_provider = ImageProviderId(provider) if provider else None
 
     merged_metadata = dict(metadata or {})
@@ -71,8 +142,10 @@ def generate_image(
         merged_metadata["orientation"] = orientation
     if color:
         merged_metadata["color"] = color
+    if postprocess:
+        merged_metadata[POSTPROCESS_KEY] = str(PostProcessSpec.parse(postprocess))
 
-    request = ImageRequest(
+    return ImageRequest(
         prompt=prompt,
         provider=resolved_provider,
         size=size,
@@ -83,7 +156,9 @@ def generate_image(
         seed=seed,
         metadata=merged_metadata,
     )
-    result = generate(request)
+
+
+def _result_payload(result: ImageResult) -> dict[str, object]:
     return {
         "path": str(result.path),
         "prompt": result.prompt,
@@ -94,6 +169,278 @@ def generate_image(
     }
 
 
+def _item_payload(item: BatchItemResult) -> dict[str, object]:
+    payload: dict[str, object] = {
+        "index": item.index,
+        "ok": item.ok,
+        "prompt": item.request.prompt,
+    }
+    if item.result is not None:
+        payload["result"] = _result_payload(item.result)
+    if item.error is not None:
+        payload["error"] = str(item.error)
+    if item.evaluation is not None:
+        payload["evaluation"] = {
+            "passed": item.evaluation.passed,
+            "score": item.evaluation.score,
+            "reason": item.evaluation.reason,
+            "metadata": item.evaluation.metadata,
+        }
+    return payload
+
+
+def _batch_payload(items: list[BatchItemResult]) -> dict[str, object]:
+    ordered = sorted(items, key=lambda item: item.index)
+    return {
+        "total": len(ordered),
+        "failed": sum(1 for item in ordered if not item.ok),
+        "items": [_item_payload(item) for item in ordered],
+    }
+
+
+@mcp.tool()
+async def generate_image(
+    prompt: str,
+    provider: str | None = None,
+    size: str | None = None,
+    style: str | None = None,
+    language: str | None = None,
+    cultural_context: str | None = None,
+    quality: str | None = None,
+    seed: int | None = None,
+    output_path: str | None = None,
+    output_dir: str | None = None,
+    filename: str | None = None,
+    response_format: str | None = None,
+    output_format: str | None = None,
+    pexels_src: str | None = None,
+    pexels_size: str | None = None,
+    orientation: str | None = None,
+    color: str | None = None,
+    postprocess: str | None = None,
+    metadata: dict[str, str] | None = None,
+) -> dict[str, object]:
+    """Generate an image via the configured provider."""
+    request = _build_request(
+        prompt,
+        provider=provider,
+        size=size,
+        style=style,
+        language=language,
+        cultural_context=cultural_context,
+        quality=quality,
+        seed=seed,
+        output_path=output_path,
+        output_dir=output_dir,
+        filename=filename,
+        response_format=response_format,
+        output_format=output_format,
+        pexels_src=pexels_src,
+        pexels_size=pexels_size,
+        orientation=orientation,
+        color=color,
+        postprocess=postprocess,
+        metadata=metadata,
+    )
+    result = await agenerate(request)
+    return _result_payload(result)
+
+
+def _build_batch(
+    entries: list[BatchImageRequest],
+) -> tuple[dict[int, ImageRequest], list[BatchItemResult]]:
+    """Build each entry's request; a malformed entry becomes a failed item."""
+    built: dict[int, ImageRequest] = {}
+    invalid: list[BatchItemResult] = []
+    for index, entry in enumerate(entries):
+        try:
+            built[index] = _build_request(**entry)
+        except ValueError as exc:
+            request = ImageRequest(prompt=entry["prompt"])
+            invalid.append(BatchItemResult(index=index, request=request, error=exc))
+    return built, invalid
+
+
+async def _run_built(
+    built: dict[int, ImageRequest], max_workers: int, on_complete: ItemCallback
+) -> None:
+    indexes = list(built)
+
+    async def record(item: BatchItemResult) -> None:
+        await on_complete(replace(item, index=indexes[item.index]))
+
+    await arun_batch(list(built.values()), max_workers=max_workers, on_complete=record)
+
+
+@mcp.tool()
+async def generate_images(
+    requests: list[BatchImageRequest],
+    ctx: ToolContext,
+    max_workers: int = DEFAULT_MAX_WORKERS,
+) -> dict[str, object]:
+    """Generate many images concurrently in one call.
+
+    Sends a progress notification as each item finishes and returns
+    per-item results or errors in input order; a failed or malformed item
+    does not fail the call. Use submit_batch for batches that outlast a
+    tool call.
+    """
+    built, items = _build_batch(requests)
+    done = len(items)
+
+    async def progress(item: BatchItemResult) -> None:
+        nonlocal done
+        items.append(item)
+        done += 1
+        if item.ok:
+            status = "ok"
+        elif item.error is None:
+            status = "rejected"
+        else:
+            status = f"error: {item.error}"
+        await ctx.report_progress(done, len(requests), f"item {item.index}: {status}")
+
+    await _run_built(built, max_workers, progress)
+    return _batch_payload(items)
+
+
+class _BatchJob:
+    def __init__(self, job_id: str, total: int, items: list[BatchItemResult]) -> None:
+        self.job_id = job_id
+        self.total = total
+        self.items = items
+        self.created = time.time()
+        self.finished: float | None = None
+        self.error: str | None = None
+        self.cancelled = False
+        self.task: asyncio.Task[None] | None = None
+
+    def status(self, include_items: bool) -> dict[str, object]:
+        if self.cancelled:
+            state = "cancelled"
+        elif self.error is not None:
+            state = "failed"
+        elif self.finished is not None:
+            state = "completed"
+        else:
+            state = "running"
+        payload: dict[str, object] = {
+            "job_id": self.job_id,
+            "status": state,
+            "total": self.total,
+            "completed": len(self.items),
+            "failed": sum(1 for item in self.items if not item.ok),
+            "created": self.created,
+            "finished": self.finished,
+        }
+        if self.error is not None:
+            payload["error"] = self.error
+        if include_items:
+            payload["items"] = _batch_payload(self.items)["items"]
+        return payload
+
+
+# Finished jobs are kept for polling, oldest dropped first past this count.
+MAX_FINISHED_JOBS = 100
+
+_jobs: dict[str, _BatchJob] = {}
+
+
+def _prune_jobs() -> None:
+    finished = [job for job in _jobs.values() if job.finished is not None]
+    finished.sort(key=lambda job: job.finished or 0.0)
+    for job in finished[: max(0, len(finished) - MAX_FINISHED_JOBS)]:
+        del _jobs[job.job_id]
+
+
+async def _run_job(
+    job: _BatchJob, built: dict[int, ImageRequest], workers: int
+) -> None:
+    async def record(item: BatchItemResult) -> None:
+        job.items.append(item)
+
+    try:
+        await _run_built(built, workers, record)
+    except Exception as exc:
+        job.error = str(exc)
+    finally:
+        job.finished = time.time()
+        _prune_jobs()
+
+
+@mcp.tool()
+async def submit_batch(
+    requests: list[BatchImageRequest],
+    max_workers: int = DEFAULT_MAX_WORKERS,
+) -> dict[str, object]:
+    """Start generating a batch in the background and return its job id.
+
+    Poll batch_status with the id for progress and per-item results, or
+    stop it with cancel_batch. Malformed entries are reported as failed
+    items rather than rejecting the submission.
+    """
+    built, invalid = _build_batch(requests)
+    job = _BatchJob(uuid.uuid4().hex, len(requests), invalid)
+    _jobs[job.job_id] = job
+    job.task = asyncio.create_task(_run_job(job, built, max_workers))
+    return {"job_id": job.job_id, "total": job.total, "status": "running"}
+
+
+@mcp.tool()
+def batch_status(job_id: str, include_items: bool = True) -> dict[str, object]:
+    """Report progress and, optionally, per-item results of a submitted batch."""
+    job = _jobs.get(job_id)
+    if job is None:
+        raise ValueError(f"Unknown batch job '{job_id}'.")
+    return job.status(include_items)
+
+
+@mcp.tool()
+def cancel_batch(job_id: str) -> dict[str, object]:
+    """Stop a submitted batch; items that already finished are kept."""
+    job = _jobs.get(job_id)
+    if job is None:
+        raise ValueError(f"Unknown batch job '{job_id}'.")
+    if job.finished is None and job.task is not None:
+        job.cancelled = True
+        job.task.cancel()
+    return job.status(include_items=False)
+
+
+def _asset_index() -> AssetIndex:
+    index = asset_index_from_env()
+    if index is None:
+        raise ValueError(f"No asset index configured; set {ASSET_INDEX_ENV}.")
+    return index
+
+
+@mcp.tool()
+def lookup(
+    prompt: str, language: str | None = None, provider: str | None = None
+) -> list[dict[str, object]]:
+    """Find images already generated for a prompt, newest first.
+
+    Use before generating to reuse an existing image for the same word.
+    """
+    assets = _asset_index().lookup(prompt, language=language, provider=provider)
+    return [asset.as_dict() for asset in assets]
+
+
+@mcp.tool()
+def list_assets(
+    language: str | None = None,
+    provider: str | None = None,
+    limit: int = DEFAULT_LIST_LIMIT,
+    offset: int = 0,
+) -> list[dict[str, object]]:
+    """Page through indexed images, newest first."""
+    assets = _asset_index().list_assets(
+        language=language, provider=provider, limit=limit, offset=offset
+    )
+    return [asset.as_dict() for asset in assets]
+
+
 def run_server() -> None:
     "Run the MCP server."
+    start_exporters_from_env()
     mcp.run()
@@ -0,0 +1,89 @@
+"""Collapse concurrent duplicate calls into a single execution."""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+from collections.abc import Awaitable, Callable, Hashable
+from concurrent.futures import Future
+
+__all__ = ["AsyncSingleFlight", "SingleFlight"]
+
+
+class SingleFlight[T]:
+    """Thread-based single-flight group.
+
+    The first caller for a key runs the function; callers arriving while it
+    is in flight block on the same future and receive its value (or its
+    exception). The key is forgotten as soon as the call finishes, so this
+    coalesces only concurrent work and never caches.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._calls: dict[Hashable, Future[T]] = {}
+
+    def do(self, key: Hashable, fn: Callable[[], T]) -> tuple[T, bool]:
+        """Run ``fn`` once per in-flight key; return (value, shared)."""
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if future is None:
+                future = Future[T]()
+                self._calls[key] = future
+        if not leader:
+            return future.result(), True
+
+        try:
+            value = fn()
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        else:
+            future.set_result(value)
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+        return value, False
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+
+class AsyncSingleFlight[T]:
+    """asyncio counterpart of SingleFlight, scoped per running event loop.
+
+    The call runs in its own task rather than in the leader's, so cancelling
+    any one caller (including the first) never cancels the shared call; a
+    caller only sees CancelledError if it was cancelled itself.
+    """
+
+    def __init__(self) -> None:
+        self._calls: dict[tuple[int, Hashable], asyncio.Task[T]] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> tuple[T, bool]:
+        """Await ``fn`` once per in-flight key; return (value, shared)."""
+        loop = asyncio.get_running_loop()
+        scoped = (id(loop), key)
+        task = self._calls.get(scoped)
+        shared = task is not None
+        if task is None:
+            task = loop.create_task(_call(fn))
+            self._calls[scoped] = task
+            task.add_done_callback(lambda done: self._forget(scoped, done))
+        return await asyncio.shield(task), shared
+
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    def _forget(self, scoped: tuple[int, Hashable], task: asyncio.Task[T]) -> None:
+        if self._calls.get(scoped) is task:
+            del self._calls[scoped]
+        # Mark retrieved so a failure nobody awaited does not log a warning.
+        if not task.cancelled():
+            task.exception()
+
+
+async def _call[T](fn: Callable[[], Awaitable[T]]) -> T:
+    return await fn()
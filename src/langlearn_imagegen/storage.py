@@ -0,0 +1,584 @@
+"""Storage sinks: where providers write the bytes of generated images.
+
+Providers still resolve an output path for every image; a sink decides
+what that path means. LocalSink writes the file (the default), MemorySink
+keeps the bytes in memory and hands them out as zero-copy memoryviews,
+and S3Sink streams them to an S3-compatible bucket under the path as key.
+Either way the bytes flow from the network or base64 decoder straight into
+the sink, chunk by chunk, without a detour through the local disk.
+
+Select a sink with ``LANGLEARN_IMAGEGEN_STORAGE``: ``local``, ``memory`` or
+``s3://<bucket>/<prefix>``. Results written to a non-local sink carry
+``storage`` and ``storage_uri`` metadata; features that read images back
+from disk (post-processing, the result cache, the asset and perceptual
+indexes, the Pexels blob store) only apply to local storage.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import hashlib
+import hmac
+import io
+import mimetypes
+import os
+import tempfile
+import threading
+from collections.abc import Callable, Generator, Iterable, Mapping
+from datetime import UTC, datetime
+from functools import lru_cache, partial
+from pathlib import Path
+from typing import TYPE_CHECKING, Protocol, runtime_checkable
+from urllib.parse import quote, urlsplit
+from xml.etree import ElementTree
+
+from langlearn_imagegen.metrics import timed_stage
+from langlearn_imagegen.utils import copy_chunks
+
+if TYPE_CHECKING:
+    import httpx
+
+    from langlearn_imagegen.transport import HttpSettings
+
+__all__ = [
+    "DEFAULT_PART_SIZE",
+    "LOCAL_SINK",
+    "MIN_PART_SIZE",
+    "S3_ENDPOINT_ENV",
+    "STORAGE_ENV",
+    "LocalSink",
+    "MemorySink",
+    "S3Sink",
+    "SinkWriter",
+    "StorageSink",
+    "sign_v4",
+    "sink_writer",
+    "storage_metadata",
+    "storage_sink_from_env",
+    "write_chunks",
+]
+
+STORAGE_ENV = "LANGLEARN_IMAGEGEN_STORAGE"
+S3_ENDPOINT_ENV = "LANGLEARN_IMAGEGEN_S3_ENDPOINT"
+
+DEFAULT_PART_SIZE = 8 * 1024 * 1024
+# S3 rejects multipart parts (other than the last) below 5 MiB.
+MIN_PART_SIZE = 5 * 1024 * 1024
+
+_EMPTY_SHA256 = hashlib.sha256(b"").hexdigest()
+
+
+class SinkWriter(Protocol):
+    """An image being written; nothing is visible until ``commit``."""
+
+    def write(self, data: bytes, /) -> int: ...
+
+    def commit(self) -> None: ...
+
+    def abort(self) -> None: ...
+
+
+@runtime_checkable
+class StorageSink(Protocol):
+    """Destination for image bytes, addressed by the resolved output path."""
+
+    @property
+    def name(self) -> str: ...
+
+    @property
+    def local(self) -> bool: ...
+
+    def open(self, path: Path) -> SinkWriter: ...
+
+    def uri(self, path: Path) -> str: ...
+
+    def rename(self, source: Path, target: Path) -> None:
+        """Move a committed image, replacing whatever is at ``target``."""
+        ...
+
+    def delete(self, path: Path) -> None:
+        """Remove an image; a missing one is not an error."""
+        ...
+
+    def exists(self, path: Path) -> bool:
+        """Whether a committed image is stored at ``path``."""
+        ...
+
+
+@contextlib.contextmanager
+def sink_writer(sink: StorageSink, path: Path) -> Generator[SinkWriter]:
+    """Yield a writer for ``path`` that commits on success and aborts on error."""
+    writer = sink.open(path)
+    try:
+        yield writer
+        writer.commit()
+    except BaseException:
+        writer.abort()
+        raise
+
+
+def storage_metadata(sink: StorageSink, path: Path) -> dict[str, str]:
+    """Metadata recording where an image went; empty for local files."""
+    if sink.local:
+        return {}
+    return {"storage": sink.name, "storage_uri": sink.uri(path)}
+
+
+def write_chunks(
+    sink: StorageSink,
+    path: Path,
+    chunks: Iterable[bytes],
+    source_stage: str = "produce",
+) -> int:
+    """Stream chunks to ``path`` in ``sink`` and return the bytes written."""
+    with sink_writer(sink, path) as writer:
+        return copy_chunks(chunks, writer, source_stage)
+
+
+class _FileWriter:
+    def __init__(self, path: Path) -> None:
+        self._path = path
+        fd, self._tmp_name = tempfile.mkstemp(
+            dir=path.parent, prefix=f".{path.name}.", suffix=".tmp"
+        )
+        self._handle = os.fdopen(fd, "wb")
+
+    def write(self, data: bytes, /) -> int:
+        return self._handle.write(data)
+
+    def commit(self) -> None:
+        self._handle.close()
+        os.replace(self._tmp_name, self._path)
+
+    def abort(self) -> None:
+        self._handle.close()
+        with contextlib.suppress(OSError):
+            os.unlink(self._tmp_name)
+
+
+class LocalSink:
+    """Writes each image to its path via a sibling temp file and a rename."""
+
+    name = "local"
+    local = True
+
+    def open(self, path: Path) -> SinkWriter:
+        return _FileWriter(path)
+
+    def uri(self, path: Path) -> str:
+        return path.resolve().as_uri()
+
+    def rename(self, source: Path, target: Path) -> None:
+        os.replace(source, target)
+
+    def delete(self, path: Path) -> None:
+        path.unlink(missing_ok=True)
+
+    def exists(self, path: Path) -> bool:
+        return path.exists()
+
+
+LOCAL_SINK = LocalSink()
+
+
+class _MemoryWriter:
+    def __init__(self, store: Callable[[io.BytesIO], None]) -> None:
+        self._store = store
+        self._buffer = io.BytesIO()
+
+    def write(self, data: bytes, /) -> int:
+        return self._buffer.write(data)
+
+    def commit(self) -> None:
+        self._store(self._buffer)
+
+    def abort(self) -> None:
+        self._buffer = io.BytesIO()
+
+
+class MemorySink:
+    """Keeps images in memory, keyed by their output path.
+
+    ``read`` returns a read-only memoryview over the stored buffer, so
+    handing an image to an uploader or an archive writer copies nothing.
+    Images stay until ``pop``, ``discard`` or ``clear``.
+    """
+
+    name = "memory"
+    local = False
+
+    def __init__(self) -> None:
+        self._objects: dict[str, io.BytesIO] = {}
+        self._lock = threading.Lock()
+
+    def open(self, path: Path) -> SinkWriter:
+        return _MemoryWriter(partial(self._store, path.as_posix()))
+
+    def uri(self, path: Path) -> str:
+        return f"memory://{path.as_posix()}"
+
+    def rename(self, source: Path, target: Path) -> None:
+        with self._lock:
+            self._objects[target.as_posix()] = self._objects.pop(source.as_posix())
+
+    def delete(self, path: Path) -> None:
+        self.discard(path)
+
+    def exists(self, path: Path) -> bool:
+        return path in self
+
+    def read(self, path: Path) -> memoryview:
+        with self._lock:
+            buffer = self._objects[path.as_posix()]
+        return buffer.getbuffer().toreadonly()
+
+    def pop(self, path: Path) -> memoryview:
+        with self._lock:
+            buffer = self._objects.pop(path.as_posix())
+        return buffer.getbuffer().toreadonly()
+
+    def discard(self, path: Path) -> None:
+        with self._lock:
+            self._objects.pop(path.as_posix(), None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._objects.clear()
+
+    def __contains__(self, path: object) -> bool:
+        if not isinstance(path, Path):
+            return False
+        with self._lock:
+            return path.as_posix() in self._objects
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._objects)
+
+    def _store(self, key: str, buffer: io.BytesIO) -> None:
+        with self._lock:
+            self._objects[key] = buffer
+
+
+def _quote(value: str, safe: str = "-_.~") -> str:
+    return quote(value, safe=safe)
+
+
+def _hmac(key: bytes, message: str) -> bytes:
+    return hmac.new(key, message.encode("utf-8"), hashlib.sha256).digest()
+
+
+def sign_v4(
+    method: str,
+    url: httpx.URL,
+    headers: Mapping[str, str],
+    payload_hash: str,
+    *,
+    access_key: str,
+    secret_key: str,
+    region: str,
+    service: str = "s3",
+    now: datetime | None = None,
+) -> dict[str, str]:
+    """Return ``headers`` plus the AWS Signature Version 4 headers.
+
+    Every header passed in is signed along with ``host``,
+    ``x-amz-content-sha256`` and ``x-amz-date``.
+    """
+    amz_date = (now or datetime.now(UTC)).strftime("%Y%m%dT%H%M%SZ")
+    signed = {key.lower(): value.strip() for key, value in headers.items()}
+    signed["host"] = url.netloc.decode("ascii")
+    signed["x-amz-content-sha256"] = payload_hash
+    signed["x-amz-date"] = amz_date
+    names = sorted(signed)
+    query = "&".join(
+        f"{_quote(key)}={_quote(value)}"
+        for key, value in sorted(url.params.multi_items())
+    )
+    canonical = "\n".join(
+        [
+            method,
+            url.raw_path.partition(b"?")[0].decode("ascii") or "/",
+            query,
+            "".join(f"{name}:{signed[name]}\n" for name in names),
+            ";".join(names),
+            payload_hash,
+        ]
+    )
+    scope = f"{amz_date[:8]}/{region}/{service}/aws4_request"
+    string_to_sign = "\n".join(
+        [
+            "AWS4-HMAC-SHA256",
+            amz_date,
+            scope,
+            hashlib.sha256(canonical.encode("utf-8")).hexdigest(),
+        ]
+    )
+    key = f"AWS4{secret_key}".encode()
+    for part in (amz_date[:8], region, service, "aws4_request"):
+        key = _hmac(key, part)
+    signature = hmac.new(
+        key, string_to_sign.encode("utf-8"), hashlib.sha256
+    ).hexdigest()
+    signed["authorization"] = (
+        f"AWS4-HMAC-SHA256 Credential={access_key}/{scope}, "
+        f"SignedHeaders={';'.join(names)}, Signature={signature}"
+    )
+    # httpx derives Host from the URL itself.
+    del signed["host"]
+    return signed
+
+
+def _xml_text(body: bytes, tag: str) -> str | None:
+    for element in ElementTree.fromstring(body).iter():
+        if element.tag.rsplit("}", 1)[-1] == tag:
+            return element.text
+    return None
+
+
+class _S3Writer:
+    def __init__(self, sink: S3Sink, key: str) -> None:
+        self._sink = sink
+        self._key = key
+        self._buffer = bytearray()
+        self._upload_id: str | None = None
+        self._etags: list[str] = []
+
+    def write(self, data: bytes, /) -> int:
+        self._buffer += data
+        part_size = self._sink.part_size
+        while len(self._buffer) >= part_size:
+            # Parts go up while the rest of the image is still arriving.
+            with memoryview(self._buffer) as view:
+                part = bytes(view[:part_size])
+            self._upload_part(part)
+            del self._buffer[:part_size]
+        return len(data)
+
+    def commit(self) -> None:
+        sink = self._sink
+        if self._upload_id is None:
+            sink.put_object(self._key, bytes(self._buffer))
+            return
+        if self._buffer:
+            self._upload_part(bytes(self._buffer))
+            self._buffer.clear()
+        sink.complete_multipart_upload(self._key, self._upload_id, self._etags)
+
+    def abort(self) -> None:
+        self._buffer.clear()
+        if self._upload_id is not None:
+            upload_id, self._upload_id = self._upload_id, None
+            self._sink.abort_multipart_upload(self._key, upload_id)
+
+    def _upload_part(self, data: bytes) -> None:
+        sink = self._sink
+        if self._upload_id is None:
+            self._upload_id = sink.create_multipart_upload(self._key)
+        number = len(self._etags) + 1
+        etag = sink.upload_part(self._key, self._upload_id, number, data)
+        self._etags.append(etag)
+
+
+class S3Sink:
+    """Uploads images to an S3-compatible bucket (AWS S3, MinIO, R2, ...).
+
+    Output paths become object keys under ``prefix``. An image that fits
+    in one ``part_size`` goes up in a single PUT; a larger one is sent as a
+    multipart upload whose parts are uploaded while the image is still
+    being downloaded or decoded, and a failed write aborts the upload.
+    Requests are signed with Signature Version 4 and use path-style URLs,
+    which every S3-compatible server accepts.
+
+    Credentials default to ``AWS_ACCESS_KEY_ID``/``AWS_SECRET_ACCESS_KEY``
+    (and ``AWS_SESSION_TOKEN``), the region to ``AWS_REGION`` and the
+    endpoint to ``LANGLEARN_IMAGEGEN_S3_ENDPOINT`` or AWS's regional one.
+    """
+
+    name = "s3"
+    local = False
+
+    def __init__(
+        self,
+        bucket: str,
+        prefix: str = "",
+        *,
+        endpoint: str | None = None,
+        region: str | None = None,
+        access_key: str | None = None,
+        secret_key: str | None = None,
+        session_token: str | None = None,
+        part_size: int = DEFAULT_PART_SIZE,
+        http_settings: HttpSettings | None = None,
+    ) -> None:
+        from langlearn_imagegen.transport import create_client
+
+        if part_size < MIN_PART_SIZE:
+            raise ValueError(f"part_size must be at least {MIN_PART_SIZE} bytes")
+        resolved_access = access_key or os.environ.get("AWS_ACCESS_KEY_ID")
+        resolved_secret = secret_key or os.environ.get("AWS_SECRET_ACCESS_KEY")
+        if not resolved_access or not resolved_secret:
+            raise ValueError(
+                "AWS_ACCESS_KEY_ID and AWS_SECRET_ACCESS_KEY are required for S3Sink."
+            )
+        self._bucket = bucket
+        self._prefix = prefix.strip("/")
+        self._region = (
+            region
+            or os.environ.get("AWS_REGION")
+            or os.environ.get("AWS_DEFAULT_REGION")
+            or "us-east-1"
+        )
+        self._endpoint = (
+            endpoint
+            or os.environ.get(S3_ENDPOINT_ENV)
+            or f"https://s3.{self._region}.amazonaws.com"
+        ).rstrip("/")
+        self._access_key: str = resolved_access
+        self._secret_key: str = resolved_secret
+        self._session_token = session_token or os.environ.get("AWS_SESSION_TOKEN")
+        self.part_size = part_size
+        self._http = create_client(http_settings)
+
+    @property
+    def bucket(self) -> str:
+        return self._bucket
+
+    def key(self, path: Path) -> str:
+        """Return the object key an output path is stored under."""
+        relative = path.as_posix().lstrip("/").removeprefix("./")
+        return f"{self._prefix}/{relative}" if self._prefix else relative
+
+    def open(self, path: Path) -> SinkWriter:
+        return _S3Writer(self, self.key(path))
+
+    def uri(self, path: Path) -> str:
+        return f"s3://{self._bucket}/{self.key(path)}"
+
+    def rename(self, source: Path, target: Path) -> None:
+        """Copy server-side to ``target``'s key, then delete the source."""
+        source_key, target_key = self.key(source), self.key(target)
+        copy_source = f"/{self._bucket}/{_quote(source_key, safe='/-_.~')}"
+        response = self._send(
+            "PUT", target_key, extra_headers={"x-amz-copy-source": copy_source}
+        )
+        # Like a multipart completion, a copy can fail after a 200 status.
+        if _xml_text(response.content, "Code") is not None:
+            message = _xml_text(response.content, "Message") or "unknown error"
+            raise RuntimeError(f"S3 copy of {source_key} failed: {message}")
+        self._send("DELETE", source_key)
+
+    def delete(self, path: Path) -> None:
+        # S3 answers 204 for keys that do not exist.
+        self._send("DELETE", self.key(path))
+
+    def exists(self, path: Path) -> bool:
+        import httpx
+
+        try:
+            self._send("HEAD", self.key(path))
+        except httpx.HTTPStatusError as exc:
+            if exc.response.status_code == 404:
+                return False
+            raise
+        return True
+
+    def close(self) -> None:
+        self._http.close()
+
+    def put_object(self, key: str, data: bytes) -> None:
+        content_type = mimetypes.guess_type(key)[0] or "application/octet-stream"
+        with timed_stage("upload"):
+            self._send("PUT", key, content=data, content_type=content_type)
+
+    def create_multipart_upload(self, key: str) -> str:
+        content_type = mimetypes.guess_type(key)[0] or "application/octet-stream"
+        response = self._send(
+            "POST", key, params={"uploads": ""}, content_type=content_type
+        )
+        upload_id = _xml_text(response.content, "UploadId")
+        if not upload_id:
+            raise RuntimeError(f"S3 did not return an upload id for {key}")
+        return upload_id
+
+    def upload_part(self, key: str, upload_id: str, number: int, data: bytes) -> str:
+        with timed_stage("upload"):
+            response = self._send(
+                "PUT",
+                key,
+                params={"partNumber": str(number), "uploadId": upload_id},
+                content=data,
+            )
+        return str(response.headers.get("ETag", ""))
+
+    def complete_multipart_upload(
+        self, key: str, upload_id: str, etags: list[str]
+    ) -> None:
+        parts = "".join(
+            f"<Part><PartNumber>{number}</PartNumber><ETag>{etag}</ETag></Part>"
+            for number, etag in enumerate(etags, start=1)
+        )
+        body = f"<CompleteMultipartUpload>{parts}</CompleteMultipartUpload>"
+        response = self._send(
+            "POST", key, params={"uploadId": upload_id}, content=body.encode("utf-8")
+        )
+        # A completion can fail after the 200 status line has been sent.
+        if _xml_text(response.content, "Code") is not None:
+            message = _xml_text(response.content, "Message") or "unknown error"
+            raise RuntimeError(f"S3 multipart upload of {key} failed: {message}")
+
+    def abort_multipart_upload(self, key: str, upload_id: str) -> None:
+        with contextlib.suppress(Exception):
+            self._send("DELETE", key, params={"uploadId": upload_id})
+
+    def _send(
+        self,
+        method: str,
+        key: str,
+        *,
+        params: Mapping[str, str] | None = None,
+        content: bytes = b"",
+        content_type: str | None = None,
+        extra_headers: Mapping[str, str] | None = None,
+    ) -> httpx.Response:
+        import httpx
+
+        path = f"/{self._bucket}/{_quote(key, safe='/-_.~')}"
+        url = httpx.URL(self._endpoint + path, params=params)
+        headers = dict(extra_headers or {})
+        if content_type is not None:
+            headers["content-type"] = content_type
+        if self._session_token:
+            headers["x-amz-security-token"] = self._session_token
+        payload_hash = hashlib.sha256(content).hexdigest() if content else _EMPTY_SHA256
+        signed = sign_v4(
+            method,
+            url,
+            headers,
+            payload_hash,
+            access_key=self._access_key,
+            secret_key=self._secret_key,
+            region=self._region,
+        )
+        response = self._http.request(method, url, headers=signed, content=content)
+        response.raise_for_status()
+        return response
+
+
+def storage_sink_from_env() -> StorageSink:
+    """Return the process-wide sink configured through the environment."""
+    return _shared_sink(os.environ.get(STORAGE_ENV, "local").strip() or "local")
+
+
+@lru_cache(maxsize=4)
+def _shared_sink(spec: str) -> StorageSink:
+    if spec == "local":
+        return LOCAL_SINK
+    if spec == "memory":
+        return MemorySink()
+    parts = urlsplit(spec)
+    if parts.scheme == "s3" and parts.netloc:
+        return S3Sink(parts.netloc, parts.path)
+    raise ValueError(
+        f"{STORAGE_ENV} must be 'local', 'memory' or 's3://<bucket>/<prefix>'"
+    )
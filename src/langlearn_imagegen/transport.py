@@ -0,0 +1,175 @@
+"""Pooled HTTP client construction shared by providers."""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import time
+from dataclasses import dataclass
+from importlib.util import find_spec
+from typing import TYPE_CHECKING
+
+import httpx
+
+from langlearn_imagegen.metrics import record_stage
+from langlearn_imagegen.storage import LOCAL_SINK, StorageSink, sink_writer
+from langlearn_imagegen.utils import WRITE_CHUNK_SIZE, copy_chunks
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+__all__ = [
+    "HttpSettings",
+    "adownload_to_file",
+    "create_async_client",
+    "create_client",
+    "download_to_file",
+    "http2_available",
+    "release_async_client",
+]
+
+_closing: set[asyncio.Task[None]] = set()
+
+
+def http2_available() -> bool:
+    """Return True when the optional h2 dependency is installed."""
+    return find_spec("h2") is not None
+
+
+@dataclass(frozen=True)
+class HttpSettings:
+    """Connection pool and timeout configuration for provider clients.
+
+    ``http2=None`` negotiates HTTP/2 whenever the h2 package is installed
+    (``pip install punt-langlearn-imagegen[http2]``) and falls back to
+    HTTP/1.1 keep-alive otherwise.
+    """
+
+    timeout: float = 30.0
+    connect_timeout: float = 10.0
+    max_connections: int = 20
+    max_keepalive_connections: int = 10
+    keepalive_expiry: float = 30.0
+    http2: bool | None = None
+
+    def limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive_connections,
+            keepalive_expiry=self.keepalive_expiry,
+        )
+
+    def timeouts(self) -> httpx.Timeout:
+        return httpx.Timeout(self.timeout, connect=self.connect_timeout)
+
+    def use_http2(self) -> bool:
+        if self.http2 is None:
+            return http2_available()
+        return self.http2
+
+
+def create_client(settings: HttpSettings | None = None) -> httpx.Client:
+    """Build a long-lived, pooled synchronous client."""
+    resolved = settings or HttpSettings()
+    return httpx.Client(
+        http2=resolved.use_http2(),
+        limits=resolved.limits(),
+        timeout=resolved.timeouts(),
+    )
+
+
+def create_async_client(settings: HttpSettings | None = None) -> httpx.AsyncClient:
+    """Build a long-lived, pooled asynchronous client."""
+    resolved = settings or HttpSettings()
+    return httpx.AsyncClient(
+        http2=resolved.use_http2(),
+        limits=resolved.limits(),
+        timeout=resolved.timeouts(),
+    )
+
+
+def release_async_client(
+    client: httpx.AsyncClient, loop: asyncio.AbstractEventLoop | None
+) -> None:
+    """Close ``client`` without blocking, preferably on the loop that opened it.
+
+    A pool opened on another, still running loop is closed there; otherwise
+    the close runs on the caller's loop (or a short-lived one) and errors
+    from connections whose loop has gone away are ignored.
+    """
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if loop is not None and loop is not running and loop.is_running():
+        asyncio.run_coroutine_threadsafe(_aclose_quietly(client), loop)
+    elif running is None:
+        asyncio.run(_aclose_quietly(client))
+    else:
+        task = running.create_task(_aclose_quietly(client))
+        _closing.add(task)
+        task.add_done_callback(_closing.discard)
+
+
+async def _aclose_quietly(client: httpx.AsyncClient) -> None:
+    with contextlib.suppress(Exception):
+        await client.aclose()
+
+
+def download_to_file(
+    client: httpx.Client, url: str, path: Path, sink: StorageSink | None = None
+) -> int:
+    """Stream ``url`` into ``path`` chunk by chunk; return the bytes written.
+
+    The body is never held in memory as a whole, and ``path`` only appears
+    once the download has completed. Network time is recorded under the
+    ``download`` stage and disk time under ``write``. With a ``sink`` the
+    bytes go to that storage instead of the local file.
+    """
+    started = time.perf_counter()
+    with client.stream("GET", url) as response:
+        response.raise_for_status()
+        record_stage("download", time.perf_counter() - started)
+        with sink_writer(LOCAL_SINK if sink is None else sink, path) as writer:
+            return copy_chunks(
+                response.iter_bytes(WRITE_CHUNK_SIZE), writer, "download"
+            )
+
+
+async def adownload_to_file(
+    client: httpx.AsyncClient, url: str, path: Path, sink: StorageSink | None = None
+) -> int:
+    """Async counterpart of download_to_file."""
+    resolved = LOCAL_SINK if sink is None else sink
+    started = time.perf_counter()
+    written = 0
+    writing = 0.0
+    async with client.stream("GET", url) as response:
+        response.raise_for_status()
+        writer = resolved.open(path)
+        try:
+            async for chunk in response.aiter_bytes(WRITE_CHUNK_SIZE):
+                mark = time.perf_counter()
+                # Chunk-sized writes land in the page cache and return
+                # quickly, so they run inline rather than paying a thread
+                # hop per chunk; remote sinks may block on an upload.
+                if resolved.local:
+                    writer.write(chunk)
+                else:
+                    await asyncio.to_thread(writer.write, chunk)
+                written += len(chunk)
+                writing += time.perf_counter() - mark
+            if resolved.local:
+                writer.commit()
+            else:
+                await asyncio.to_thread(writer.commit)
+        except BaseException:
+            # Aborting a remote upload is a network call too.
+            if resolved.local:
+                writer.abort()
+            else:
+                await asyncio.to_thread(writer.abort)
+            raise
+    record_stage("download", time.perf_counter() - started - writing, written)
+    record_stage("write", writing, written)
+    return written
@@ -1,8 +1,35 @@
 from __future__ import annotations
 
+import base64
+import binascii
+import contextlib
 import hashlib
-from collections.abc import Mapping
+import json
+import os
+import shutil
+import tempfile
+import time
+from collections.abc import Generator, Iterable, Iterator, Mapping
 from pathlib import Path
+from typing import TYPE_CHECKING, BinaryIO, Protocol
+
+from langlearn_imagegen.metrics import record_stage, timed_stage
+
+if TYPE_CHECKING:
+    from langlearn_types import ImageRequest
+
+# Metadata keys that only choose where a result is written, not what it is.
+OUTPUT_LOCATION_KEYS = frozenset({"output_path", "output_dir", "filename"})
+
+# Bytes per chunk when streaming image data to disk; base64 input is read in
+# slices of 4/3 this size so each slice decodes on its own.
+WRITE_CHUNK_SIZE = 64 * 1024
+
+
+class SupportsWrite(Protocol):
+    """Anything image bytes can be streamed into: a file or a storage sink."""
+
+    def write(self, data: bytes, /) -> int: ...
 
 
 def resolve_output_path(
@@ -10,8 +37,27 @@ def resolve_output_path(
     provider: str,
     metadata: Mapping[str, str],
     extension: str,
+    *,
+    create_parent: bool = True,
+) -> Path:
+    """Resolve an output path for a generated image.
+
+    The parent directory is created unless ``create_parent`` is false, as
+    for images that are stored somewhere other than the local disk.
+    """
+    with timed_stage("resolve_path"):
+        path = _resolve_output_path(prompt, provider, metadata, extension)
+        if create_parent:
+            path.parent.mkdir(parents=True, exist_ok=True)
+        return path
+
+
+def _resolve_output_path(
+    prompt: str,
+    provider: str,
+    metadata: Mapping[str, str],
+    extension: str,
 ) -> Path:
-    """Resolve an output path for a generated image."""
     output_path = metadata.get("output_path")
     if output_path:
         path = Path(output_path)
@@ -25,14 +71,178 @@ def resolve_output_path(
 
     if not path.suffix:
         path = path.with_suffix(f".{extension}")
-
-    path.parent.mkdir(parents=True, exist_ok=True)
     return path
 
 
+def candidate_path(path: Path, index: int) -> Path:
+    """Return where candidate ``index`` for ``path`` is written."""
+    return path.with_stem(f"{path.stem}_{index}")
+
+
 def extension_from_url(url: str, default: str = "jpg") -> str:
     """Infer a filename extension from a URL."""
     suffix = Path(url.split("?", 1)[0]).suffix
     if suffix.startswith("."):
         return suffix[1:]
     return default
+
+
+def request_fingerprint(
+    request: ImageRequest,
+    provider: str,
+    model: str | None = None,
+    *,
+    include_location: bool = False,
+) -> str:
+    """Return a canonical SHA-256 of every request field that shapes the image.
+
+    Output location metadata is ignored unless ``include_location`` is set,
+    so the same image requested under two paths shares one fingerprint.
+    """
+    metadata = {
+        key: value
+        for key, value in request.metadata.items()
+        if include_location or key not in OUTPUT_LOCATION_KEYS
+    }
+    canonical = {
+        "provider": provider,
+        "model": model,
+        "prompt": request.prompt,
+        "size": request.size,
+        "style": request.style,
+        "language": request.language,
+        "cultural_context": request.cultural_context,
+        "quality": request.quality,
+        "seed": request.seed,
+        "metadata": metadata,
+    }
+    encoded = json.dumps(canonical, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def _sibling_tempfile(path: Path) -> tuple[int, str]:
+    return tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+
+
+@contextlib.contextmanager
+def atomic_writer(path: Path) -> Generator[BinaryIO]:
+    """Yield a handle to a sibling temp file that replaces ``path`` on success.
+
+    The temp file lives in the destination directory so the final rename is
+    atomic; if the block raises, the partial file is removed and ``path`` is
+    left untouched.
+    """
+    fd, tmp_name = _sibling_tempfile(path)
+    try:
+        with os.fdopen(fd, "wb") as handle:
+            yield handle
+        os.replace(tmp_name, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.unlink(tmp_name)
+        raise
+
+
+def write_atomic(path: Path, data: bytes) -> None:
+    """Write bytes to a sibling temp file, then rename it into place."""
+    with atomic_writer(path) as handle:
+        handle.write(data)
+
+
+def copy_chunks(
+    chunks: Iterable[bytes], handle: SupportsWrite, source_stage: str
+) -> int:
+    """Write every chunk to ``handle`` and return the byte count.
+
+    Time spent producing chunks is recorded under ``source_stage`` and time
+    spent writing them under ``write``, so interleaved network (or decode)
+    and disk work can be told apart.
+    """
+    written = 0
+    started = time.perf_counter()
+    writing = 0.0
+    for chunk in chunks:
+        mark = time.perf_counter()
+        handle.write(chunk)
+        written += len(chunk)
+        writing += time.perf_counter() - mark
+    record_stage(source_stage, time.perf_counter() - started - writing, written)
+    record_stage("write", writing, written)
+    return written
+
+
+def iter_b64decode(payload: str, chunk_size: int = WRITE_CHUNK_SIZE) -> Iterator[bytes]:
+    """Decode a base64 string a slice at a time.
+
+    Slices are a multiple of four characters, so each decodes independently
+    and only one decoded chunk is alive at once instead of the whole image.
+    """
+    step = max(4, (chunk_size // 3) * 4)
+    for start in range(0, len(payload), step):
+        try:
+            yield base64.b64decode(payload[start : start + step], validate=True)
+        except binascii.Error as exc:
+            raise ValueError(f"Invalid base64 image payload: {exc}") from None
+
+
+# ioctl request that clones a file's extents (btrfs, XFS, bcachefs).
+_FICLONE = 0x40049409
+
+
+def link_atomic(source: Path, destination: Path) -> str:
+    """Make ``destination`` share ``source``'s bytes without a partial state.
+
+    Tries a hardlink, then a copy-on-write reflink, then a plain copy, and
+    returns which one was used. Files in this package are always replaced
+    by rename, never rewritten in place, so linked paths stay independent.
+    """
+    with contextlib.suppress(OSError):
+        if destination.exists() and os.path.samefile(source, destination):
+            return "hardlink"
+    fd, tmp_name = _sibling_tempfile(destination)
+    os.close(fd)
+    try:
+        method = _link_or_clone(source, tmp_name)
+        os.replace(tmp_name, destination)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.unlink(tmp_name)
+        raise
+    return method
+
+
+def _link_or_clone(source: Path, tmp_name: str) -> str:
+    os.unlink(tmp_name)
+    try:
+        os.link(source, tmp_name)
+        return "hardlink"
+    except OSError:
+        pass
+    with open(source, "rb") as src, open(tmp_name, "wb") as dst:
+        try:
+            import fcntl
+
+            fcntl.ioctl(dst.fileno(), _FICLONE, src.fileno())
+            return "reflink"
+        except (ImportError, OSError):
+            shutil.copyfileobj(src, dst)
+            return "copy"
+
+
+def file_sha256(path: Path) -> str:
+    """Return the hex SHA-256 of a file's contents."""
+    with path.open("rb") as handle:
+        return hashlib.file_digest(handle, "sha256").hexdigest()
+
+
+def copy_atomic(source: Path, destination: Path) -> None:
+    """Copy a file so readers never observe a partially written destination."""
+    fd, tmp_name = _sibling_tempfile(destination)
+    os.close(fd)
+    try:
+        shutil.copyfile(source, tmp_name)
+        os.replace(tmp_name, destination)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.unlink(tmp_name)
+        raise
@@ -0,0 +1,497 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from collections.abc import Generator, Sequence
+from dataclasses import replace
+from pathlib import Path
+
+import pytest
+from langlearn_types import (
+    EvaluationResult,
+    ImageProviderId,
+    ImageRequest,
+    ImageResult,
+)
+
+from langlearn_imagegen.cache import ResultCache
+from langlearn_imagegen.core import (
+    PROVIDER_CONCURRENCY,
+    BatchGenerationError,
+    ImageClient,
+    set_provider_concurrency,
+)
+from langlearn_imagegen.manifest import JobManifest
+from langlearn_imagegen.providers import PROVIDER_REGISTRY, get_circuit_breaker
+from langlearn_imagegen.resilience import RetryPolicy
+from langlearn_imagegen.singleflight import AsyncSingleFlight
+from langlearn_imagegen.storage import MemorySink, storage_metadata, write_chunks
+
+
+class FakeProvider:
+    def __init__(self, delay: float = 0.0, failures: int = 0) -> None:
+        self._delay = delay
+        self._failures = failures
+        self.calls = 0
+
+    def generate_image(self, request: ImageRequest) -> ImageResult:
+        self.calls += 1
+        time.sleep(self._delay)
+        if request.prompt == "bad":
+            raise RuntimeError("boom")
+        if self.calls <= self._failures:
+            raise ConnectionError("reset by peer")
+        return ImageResult(
+            path=Path(f"{request.prompt}.png"),
+            prompt=request.prompt,
+            provider=ImageProviderId.openai,
+            revised_prompt=None,
+            model=None,
+            metadata=dict(request.metadata),
+        )
+
+    def generate_images(self, requests: Sequence[ImageRequest]) -> list[ImageResult]:
+        return [self.generate_image(request) for request in requests]
+
+
+class SlowEvaluator:
+    def __init__(self, delay: float) -> None:
+        self._delay = delay
+
+    def evaluate(self, result: ImageResult) -> EvaluationResult:
+        time.sleep(self._delay)
+        passed = result.prompt != "house"
+        return EvaluationResult(
+            passed=passed, score=1.0 if passed else 0.0, reason=None, metadata={}
+        )
+
+
+class OverlapEvaluator(SlowEvaluator):
+    """Holds the first image's verdict until the last image is evaluated."""
+
+    def __init__(self) -> None:
+        super().__init__(delay=0.0)
+        self.last_started = threading.Event()
+        self.overlapped = False
+
+    def evaluate(self, result: ImageResult) -> EvaluationResult:
+        if result.prompt == "cat":
+            self.last_started.set()
+        elif result.prompt == "apple":
+            self.overlapped = self.last_started.wait(5)
+        return super().evaluate(result)
+
+
+class GroupingProvider(FakeProvider):
+    def __init__(self) -> None:
+        super().__init__()
+        self.group_sizes: list[int] = []
+
+    def generate_images(self, requests: Sequence[ImageRequest]) -> list[ImageResult]:
+        self.group_sizes.append(len(requests))
+        return super().generate_images(requests)
+
+
+class CandidateProvider(FakeProvider):
+    def iter_candidates(
+        self, request: ImageRequest, count: int
+    ) -> Generator[ImageResult]:
+        output_dir = Path(request.metadata["output_dir"])
+        for index in range(count):
+            self.calls += 1
+            time.sleep(0.02)
+            path = output_dir / f"candidate_{index}.png"
+            path.write_bytes(b"image")
+            yield ImageResult(
+                path=path,
+                prompt=request.prompt,
+                provider=ImageProviderId.openai,
+                revised_prompt=None,
+                model=None,
+                metadata={"index": str(index)},
+            )
+
+
+class ScoreEvaluator:
+    def evaluate(self, result: ImageResult) -> EvaluationResult:
+        score = int(result.metadata["index"]) / 10
+        return EvaluationResult(passed=True, score=score, reason=None, metadata={})
+
+
+@pytest.fixture
+def fake_provider(monkeypatch: pytest.MonkeyPatch) -> None:
+    def factory(**_: object) -> FakeProvider:
+        return FakeProvider(delay=0.01)
+
+    monkeypatch.setitem(PROVIDER_REGISTRY, "fake", factory)
+
+
+@pytest.mark.usefixtures("fake_provider")
+def test_run_batch_preserves_order_and_isolates_failures() -> None:
+    prompts = ["apple", "bad", "house", "dog"]
+    client = ImageClient(provider_name="fake", max_workers=4)
+
+    items = client.run_batch([ImageRequest(prompt=p) for p in prompts])
+
+    assert [item.index for item in items] == [0, 1, 2, 3]
+    assert [item.ok for item in items] == [True, False, True, True]
+    assert items[0].result is not None
+    assert items[0].result.prompt == "apple"
+    assert str(items[1].error) == "boom"
+
+
+def test_iter_batch_reads_lazily_and_bounds_in_flight_items() -> None:
+    provider = FakeProvider(delay=0.01)
+    client = ImageClient(provider_name="fake", provider=provider, max_workers=2)
+    consumed: list[int] = []
+
+    def requests() -> Generator[ImageRequest]:
+        for index in range(50):
+            consumed.append(index)
+            yield ImageRequest(prompt=f"word{index}")
+
+    batch = client.iter_batch(requests())
+    first = next(batch)
+    in_flight_at_first = len(consumed)
+    rest = list(batch)
+
+    assert in_flight_at_first <= 5
+    assert sorted(item.index for item in [first, *rest]) == list(range(50))
+    assert all(item.ok for item in rest)
+
+
+@pytest.mark.usefixtures("fake_provider")
+def test_generate_batch_raises_with_partial_results() -> None:
+    client = ImageClient(provider_name="fake")
+
+    with pytest.raises(BatchGenerationError) as excinfo:
+        client.generate_batch([ImageRequest(prompt="a"), ImageRequest(prompt="bad")])
+
+    assert [item.ok for item in excinfo.value.items] == [True, False]
+
+
+@pytest.mark.usefixtures("fake_provider")
+def test_arun_batch_matches_sync_outcomes() -> None:
+    client = ImageClient(provider_name="fake", max_workers=2)
+    requests = [ImageRequest(prompt=p) for p in ["cat", "bad", "tree"]]
+
+    items = asyncio.run(client.arun_batch(requests))
+
+    assert [item.ok for item in items] == [True, False, True]
+    assert items[2].result is not None
+    assert items[2].result.prompt == "tree"
+
+
+def test_async_calls_share_the_provider_concurrency_ceiling(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    class PeakProvider(FakeProvider):
+        def __init__(self) -> None:
+            super().__init__()
+            self.active = 0
+            self.peak = 0
+
+        async def agenerate_image(self, request: ImageRequest) -> ImageResult:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+            await asyncio.sleep(0.01)
+            self.active -= 1
+            return self.generate_image(request)
+
+        async def agenerate_images(
+            self, requests: Sequence[ImageRequest]
+        ) -> list[ImageResult]:
+            return [await self.agenerate_image(request) for request in requests]
+
+    monkeypatch.setitem(PROVIDER_CONCURRENCY, "limited", 1)
+    set_provider_concurrency("limited", 1)
+    provider = PeakProvider()
+    client = ImageClient(provider_name="limited", provider=provider)
+
+    async def scenario() -> list[ImageResult]:
+        words = ["cat", "dog", "tree", "house"]
+        return await asyncio.gather(
+            *(client.agenerate(ImageRequest(prompt=word)) for word in words)
+        )
+
+    assert len(asyncio.run(scenario())) == 4
+    assert provider.peak == 1
+
+
+def test_run_batch_coalesces_identical_in_flight_requests() -> None:
+    provider = FakeProvider(delay=0.1)
+    client = ImageClient(provider_name="fake", provider=provider, max_workers=4)
+
+    items = client.run_batch([ImageRequest(prompt="apple") for _ in range(4)])
+
+    assert provider.calls == 1
+    assert all(item.ok for item in items)
+    coalesced = [item.result.metadata.get("coalesced") for item in items if item.result]
+    assert coalesced.count("true") == 3
+
+
+def test_batches_send_compatible_requests_through_generate_images() -> None:
+    def requests() -> list[ImageRequest]:
+        decks = [
+            ImageRequest(prompt="apple", metadata={"output_dir": d}) for d in "abc"
+        ]
+        return [*decks, ImageRequest(prompt="pear")]
+
+    provider = GroupingProvider()
+    client = ImageClient(provider_name="fake", provider=provider, max_workers=4)
+    items = client.run_batch(requests())
+
+    assert all(item.ok for item in items)
+    assert [item.request.prompt for item in items] == ["apple"] * 3 + ["pear"]
+    assert provider.group_sizes == [3]
+    assert provider.calls == 4
+
+    provider = GroupingProvider()
+    client = ImageClient(provider_name="fake", provider=provider, max_workers=4)
+    items = asyncio.run(client.arun_batch(requests()))
+
+    assert all(item.ok for item in items)
+    assert provider.group_sizes == [3]
+    assert provider.calls == 4
+
+
+def test_cancelled_leader_does_not_cancel_followers() -> None:
+    group = AsyncSingleFlight[str]()
+    release = asyncio.Event()
+
+    async def fetch() -> str:
+        await release.wait()
+        return "image"
+
+    async def scenario() -> tuple[str, bool]:
+        leader = asyncio.create_task(group.do("apple", fetch))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(group.do("apple", fetch))
+        await asyncio.sleep(0)
+        leader.cancel()
+        await asyncio.sleep(0)
+        release.set()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await follower
+
+    assert asyncio.run(scenario()) == ("image", True)
+
+
+def test_transient_failures_retry_then_fall_back(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    backup = FakeProvider()
+
+    def backup_factory(**_: object) -> FakeProvider:
+        return backup
+
+    monkeypatch.setitem(PROVIDER_REGISTRY, "backup", backup_factory)
+    policy = RetryPolicy(max_attempts=3, base_delay=0.0)
+
+    flaky = FakeProvider(failures=2)
+    client = ImageClient(provider_name="flaky", provider=flaky, retry_policy=policy)
+    assert client.generate(ImageRequest(prompt="flaky")).prompt == "flaky"
+    assert flaky.calls == 3
+
+    down = FakeProvider(failures=100)
+    client = ImageClient(
+        provider_name="down",
+        provider=down,
+        retry_policy=RetryPolicy(max_attempts=2, base_delay=0.0),
+        fallback_provider="backup",
+    )
+    result = client.generate(ImageRequest(prompt="apple"))
+    assert down.calls == 2
+    assert result.metadata["fallback_from"] == "down"
+    assert get_circuit_breaker("down").snapshot()["consecutive_failures"] == 2
+
+
+@pytest.mark.usefixtures("fake_provider")
+def test_evaluation_is_pipelined_and_attached_per_item() -> None:
+    prompts = ["apple", "house", "dog", "cat"]
+    evaluator = OverlapEvaluator()
+    client = ImageClient(
+        provider_name="fake",
+        evaluator=evaluator,
+        max_workers=1,
+        evaluation_workers=4,
+    )
+
+    items = client.run_batch([ImageRequest(prompt=p) for p in prompts])
+
+    # With one generation slot, the last image can only reach evaluation
+    # while the first is still being evaluated if the two stages overlap.
+    assert evaluator.overlapped
+    assert [item.ok for item in items] == [True, False, True, True]
+    assert all(item.result is not None for item in items)
+    assert [item.evaluation.passed for item in items if item.evaluation] == [
+        True,
+        False,
+        True,
+        True,
+    ]
+
+    async_items = asyncio.run(
+        client.arun_batch([ImageRequest(prompt=p) for p in prompts])
+    )
+    assert [item.ok for item in async_items] == [True, False, True, True]
+    with pytest.raises(BatchGenerationError) as raised:
+        client.generate_batch([ImageRequest(prompt=p) for p in prompts])
+    assert sum(item.result is not None for item in raised.value.items) == 4
+
+
+def test_generate_best_keeps_first_candidate_over_threshold(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+) -> None:
+    provider = CandidateProvider()
+
+    def factory(**_: object) -> CandidateProvider:
+        return provider
+
+    monkeypatch.setitem(PROVIDER_REGISTRY, "candidates", factory)
+    client = ImageClient(provider_name="candidates", evaluator=ScoreEvaluator())
+    metadata = {"output_dir": str(tmp_path), "filename": "best.png"}
+
+    result = client.generate_best(
+        ImageRequest(prompt="apple", metadata=metadata), candidates=8, threshold=0.3
+    )
+
+    assert result.path == tmp_path / "best.png"
+    assert result.metadata["candidate_score"] == "0.3"
+    assert provider.calls < 8
+    assert [path.name for path in tmp_path.iterdir()] == ["best.png"]
+
+    with pytest.raises(ValueError, match="none of 8 candidates"):
+        client.generate_best(
+            ImageRequest(prompt="apple", metadata=metadata), candidates=8, threshold=2
+        )
+    assert [path.name for path in tmp_path.iterdir()] == ["best.png"]
+
+
+def test_generate_best_promotes_and_discards_through_the_sink() -> None:
+    class SinkCandidateProvider(FakeProvider):
+        def __init__(self) -> None:
+            super().__init__()
+            self.sink = MemorySink()
+
+        def iter_candidates(
+            self, request: ImageRequest, count: int
+        ) -> Generator[ImageResult]:
+            for index in range(count):
+                self.calls += 1
+                path = Path(f"candidate_{index}.png")
+                write_chunks(self.sink, path, [b"image"])
+                yield ImageResult(
+                    path=path,
+                    prompt=request.prompt,
+                    provider=ImageProviderId.openai,
+                    revised_prompt=None,
+                    model=None,
+                    metadata={"index": str(index), **storage_metadata(self.sink, path)},
+                )
+
+    provider = SinkCandidateProvider()
+    client = ImageClient(
+        provider_name="openai", provider=provider, evaluator=ScoreEvaluator()
+    )
+    request = ImageRequest(prompt="apple", metadata={"filename": "best.png"})
+
+    result = client.generate_best(request, candidates=4, threshold=0.2)
+
+    assert result.path.name == "best.png"
+    assert result.path in provider.sink
+    assert len(provider.sink) == 1
+    assert result.metadata["storage_uri"].endswith("best.png")
+
+
+def test_generate_best_is_served_from_the_result_cache(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+) -> None:
+    provider = CandidateProvider()
+
+    def factory(**_: object) -> CandidateProvider:
+        return provider
+
+    monkeypatch.setitem(PROVIDER_REGISTRY, "candidates", factory)
+    client = ImageClient(
+        provider_name="candidates",
+        evaluator=ScoreEvaluator(),
+        result_cache=ResultCache(tmp_path / "cache"),
+    )
+
+    results: list[ImageResult] = []
+    for deck in ("a", "b"):
+        (tmp_path / deck).mkdir()
+        metadata = {"output_dir": str(tmp_path / deck), "filename": "best.png"}
+        request = ImageRequest(prompt="apple", metadata=metadata)
+        results.append(asyncio.run(client.agenerate_best(request, candidates=4)))
+
+    assert provider.calls == 1
+    assert results[1].metadata["cache"] == "hit"
+    assert results[1].path.read_bytes() == b"image"
+
+
+def test_run_batch_resumes_from_manifest(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+) -> None:
+    class WritingProvider(FakeProvider):
+        def generate_image(self, request: ImageRequest) -> ImageResult:
+            result = super().generate_image(request)
+            result.path.write_bytes(b"image")
+            return result
+
+    provider = WritingProvider()
+    monkeypatch.chdir(tmp_path)
+
+    def factory(**_: object) -> WritingProvider:
+        return provider
+
+    monkeypatch.setitem(PROVIDER_REGISTRY, "writing", factory)
+    client = ImageClient(provider_name="writing")
+    requests = [ImageRequest(prompt=p) for p in ["apple", "bad", "dog"]]
+
+    with JobManifest(tmp_path / "job.jsonl") as manifest:
+        first = client.run_batch(requests, manifest=manifest)
+    assert [item.ok for item in first] == [True, False, True]
+
+    provider.calls = 0
+    with JobManifest(tmp_path / "job.jsonl") as manifest:
+        assert manifest.summary() == {"completed": 2, "failed": 1}
+        second = client.run_batch(requests, manifest=manifest)
+
+    assert provider.calls == 1
+    assert [item.index for item in second] == [0, 1, 2]
+    assert second[0].result is not None
+    assert second[0].result.metadata["manifest"] == "resumed"
+    assert str(second[1].error) == "boom"
+
+
+def test_manifest_resumes_items_stored_in_the_sink(tmp_path: Path) -> None:
+    class SinkProvider(FakeProvider):
+        def __init__(self) -> None:
+            super().__init__()
+            self.sink = MemorySink()
+
+        def generate_image(self, request: ImageRequest) -> ImageResult:
+            result = super().generate_image(request)
+            write_chunks(self.sink, result.path, [b"image"])
+            metadata = {**result.metadata, **storage_metadata(self.sink, result.path)}
+            return replace(result, metadata=metadata)
+
+    provider = SinkProvider()
+    client = ImageClient(provider_name="openai", provider=provider)
+    requests = [ImageRequest(prompt=p) for p in ["apple", "dog"]]
+
+    with JobManifest(tmp_path / "job.jsonl") as manifest:
+        client.run_batch(requests, manifest=manifest)
+        provider.calls = 0
+        provider.sink.discard(Path("dog.png"))
+        second = client.run_batch(requests, manifest=manifest)
+
+    assert provider.calls == 1
+    assert second[0].result is not None
+    assert second[0].result.metadata["manifest"] == "resumed"
+    assert second[1].result is not None
+    assert "manifest" not in second[1].result.metadata
@@ -0,0 +1,188 @@
+from __future__ import annotations
+
+import asyncio
+import json
+from collections.abc import Sequence
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from langlearn_types import ImageProviderId, ImageRequest, ImageResult
+
+from langlearn_imagegen.assets import AssetIndex
+from langlearn_imagegen.cache import ResultCache
+from langlearn_imagegen.core import ImageClient
+from langlearn_imagegen.providers import PROVIDER_REGISTRY
+from langlearn_imagegen.resilience import RetryPolicy
+from langlearn_imagegen.utils import request_fingerprint, resolve_output_path
+
+if TYPE_CHECKING:
+    import pytest
+
+
+class CountingProvider:
+    def __init__(self, failures: int = 0) -> None:
+        self.calls = 0
+        self._failures = failures
+
+    def generate_image(self, request: ImageRequest) -> ImageResult:
+        self.calls += 1
+        if self.calls <= self._failures:
+            raise ConnectionError("reset by peer")
+        path = resolve_output_path(request.prompt, "openai", request.metadata, "png")
+        path.write_bytes(f"image-{self.calls}".encode())
+        return ImageResult(
+            path=path,
+            prompt=request.prompt,
+            provider=ImageProviderId.openai,
+            revised_prompt="revised",
+            model="m",
+            metadata=dict(request.metadata),
+        )
+
+    def generate_images(self, requests: Sequence[ImageRequest]) -> list[ImageResult]:
+        return [self.generate_image(request) for request in requests]
+
+
+def test_fingerprint_ignores_output_location() -> None:
+    first = ImageRequest(prompt="apple", metadata={"output_dir": "a"})
+    second = ImageRequest(prompt="apple", metadata={"output_dir": "b"})
+    styled = ImageRequest(prompt="apple", style="cartoon")
+
+    assert request_fingerprint(first, "openai") == request_fingerprint(second, "openai")
+    assert request_fingerprint(first, "openai") != request_fingerprint(styled, "openai")
+
+
+def test_client_serves_repeat_requests_from_cache(tmp_path: Path) -> None:
+    provider = CountingProvider()
+    client = ImageClient(
+        provider_name="openai",
+        provider=provider,
+        result_cache=ResultCache(tmp_path / "cache"),
+    )
+
+    first = client.generate(
+        ImageRequest(prompt="apple", metadata={"output_dir": str(tmp_path / "a")})
+    )
+    second = client.generate(
+        ImageRequest(prompt="apple", metadata={"output_dir": str(tmp_path / "b")})
+    )
+
+    assert provider.calls == 1
+    assert second.path != first.path
+    assert second.path.read_bytes() == b"image-1"
+    assert second.revised_prompt == "revised"
+    assert second.metadata["cache"] == "hit"
+
+
+def test_editing_an_output_leaves_the_cached_image_unchanged(tmp_path: Path) -> None:
+    provider = CountingProvider()
+    client = ImageClient(
+        provider_name="openai",
+        provider=provider,
+        result_cache=ResultCache(tmp_path / "cache"),
+    )
+    request = ImageRequest(prompt="fig", metadata={"output_dir": str(tmp_path / "a")})
+
+    first = client.generate(request)
+    with first.path.open("r+b") as handle:
+        handle.write(b"edited!")
+    second = client.generate(
+        ImageRequest(prompt="fig", metadata={"output_dir": str(tmp_path / "b")})
+    )
+
+    assert provider.calls == 1
+    assert second.metadata["cache"] == "hit"
+    assert second.path.read_bytes() == b"image-1"
+
+
+def test_expired_entries_are_misses(tmp_path: Path) -> None:
+    provider = CountingProvider()
+    client = ImageClient(
+        provider_name="openai",
+        provider=provider,
+        result_cache=ResultCache(tmp_path / "cache", ttl=0),
+    )
+    request = ImageRequest(prompt="house", metadata={"output_dir": str(tmp_path)})
+
+    client.generate(request)
+    client.generate(request)
+
+    assert provider.calls == 2
+
+
+def test_fallback_results_are_not_cached(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    backup = CountingProvider()
+
+    def backup_factory(**_: object) -> CountingProvider:
+        return backup
+
+    monkeypatch.setitem(PROVIDER_REGISTRY, "backup", backup_factory)
+    primary = CountingProvider(failures=1)
+    client = ImageClient(
+        provider_name="openai",
+        provider=primary,
+        result_cache=ResultCache(tmp_path / "cache"),
+        retry_policy=RetryPolicy(max_attempts=1, base_delay=0.0),
+        fallback_provider="backup",
+    )
+    request = ImageRequest(prompt="plum", metadata={"output_dir": str(tmp_path)})
+
+    assert client.generate(request).metadata["fallback_from"] == "openai"
+    second = client.generate(request)
+
+    assert primary.calls == 2
+    assert "cache" not in second.metadata
+    assert "fallback_from" not in second.metadata
+
+
+def test_malformed_records_are_dropped(tmp_path: Path) -> None:
+    cache = ResultCache(tmp_path / "cache")
+    request = ImageRequest(prompt="pear", metadata={"output_dir": str(tmp_path)})
+    key = request_fingerprint(request, "openai")
+    record_path = tmp_path / "cache" / key[:2] / f"{key}.json"
+    record_path.parent.mkdir(parents=True)
+    record_path.write_text(json.dumps({"created": 0.0}), "utf-8")
+
+    assert cache.lookup(key, request, "openai") is None
+    assert not record_path.exists()
+
+
+def test_client_indexes_delivered_images(tmp_path: Path) -> None:
+    provider = CountingProvider()
+    with AssetIndex(tmp_path / "assets.sqlite") as index:
+        client = ImageClient(
+            provider_name="openai", provider=provider, asset_index=index
+        )
+        for prompt, language in [("apple", "de"), ("apple", "fr"), ("dog", "de")]:
+            client.generate(
+                ImageRequest(
+                    prompt=prompt,
+                    language=language,
+                    metadata={"output_dir": str(tmp_path / language)},
+                )
+            )
+
+        found = index.lookup("apple", language="fr")
+        assert len(found) == 1
+        assert found[0].path.parent == (tmp_path / "fr").resolve()
+        assert found[0].revised_prompt == "revised"
+        assert "timing_total_ms" in found[0].metadata
+        assert len(index.list_assets(language="de")) == 2
+
+        found[0].path.unlink()
+        assert index.lookup("apple", language="fr") == []
+        assert index.prune() == 1
+
+
+def test_asset_index_failures_do_not_fail_generation(tmp_path: Path) -> None:
+    index = AssetIndex(tmp_path / "assets.sqlite")
+    index.close()
+    client = ImageClient(
+        provider_name="openai", provider=CountingProvider(), asset_index=index
+    )
+    request = ImageRequest(prompt="fig", metadata={"output_dir": str(tmp_path)})
+
+    assert client.generate(request).path.exists()
+    assert asyncio.run(client.agenerate(request)).path.exists()
@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+import httpx
+from langlearn_types import ImageRequest
+
+from langlearn_imagegen.core import ImageClient
+from langlearn_imagegen.metrics import METRICS, MetricsRegistry, StageTimings
+from langlearn_imagegen.providers.pexels import PexelsProvider
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+
+def test_stage_timings_reach_metadata_and_registry(tmp_path: Path) -> None:
+    image = b"x" * 5000
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/v1/search":
+            photo = {"id": 7, "src": {"original": "https://img.test/7.jpeg"}}
+            return httpx.Response(200, json={"photos": [photo]})
+        return httpx.Response(200, content=image)
+
+    provider = PexelsProvider(api_key="test")
+    provider._http = httpx.Client(  # pyright: ignore[reportPrivateUsage]
+        transport=httpx.MockTransport(handler)
+    )
+    METRICS.reset()
+
+    client = ImageClient(provider_name="pexels", provider=provider)
+    result = client.generate(
+        ImageRequest(prompt="dog", metadata={"output_dir": str(tmp_path)})
+    )
+
+    for stage in ("pexels_search", "download", "write", "resolve_path", "total"):
+        assert float(result.metadata[f"timing_{stage}_ms"]) >= 0
+    assert result.metadata["bytes_download"] == "5000"
+    assert result.metadata["bytes_write"] == "5000"
+
+    snapshot = METRICS.snapshot()
+    assert {
+        "name": "generations_total",
+        "labels": {"outcome": "ok", "provider": "pexels"},
+        "value": 1.0,
+    } in snapshot["counters"]
+    stages = {
+        str(item["labels"]["stage"])  # type: ignore[index]
+        for item in snapshot["histograms"]
+        if item["name"] == "stage_seconds"
+    }
+    assert {"pexels_search", "download", "write"} <= stages
+
+
+def test_prometheus_rendering() -> None:
+    registry = MetricsRegistry(buckets=(0.1, 1.0))
+    timings = StageTimings()
+    timings.add("download", 0.5, 2048)
+    registry.record_generation("openai", timings, "ok")
+
+    text = registry.render_prometheus()
+    assert (
+        'langlearn_imagegen_generations_total{outcome="ok",provider="openai"} 1' in text
+    )
+    assert (
+        'langlearn_imagegen_stage_seconds_bucket{provider="openai",'
+        'stage="download",le="1"} 1' in text
+    )
+    assert (
+        'langlearn_imagegen_stage_bytes_total{provider="openai",'
+        'stage="download"} 2048' in text
+    )
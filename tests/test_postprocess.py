@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+from collections.abc import Sequence
+from pathlib import Path
+
+import pytest
+from langlearn_types import ImageProviderId, ImageRequest, ImageResult
+
+from langlearn_imagegen.cache import ResultCache
+from langlearn_imagegen.core import ImageClient
+from langlearn_imagegen.postprocess import PostProcessor, PostProcessSpec
+from langlearn_imagegen.utils import resolve_output_path
+
+Image = pytest.importorskip("PIL.Image")
+
+
+class LargeImageProvider:
+    def generate_image(self, request: ImageRequest) -> ImageResult:
+        path = resolve_output_path(request.prompt, "openai", request.metadata, "png")
+        Image.new("RGB", (400, 200), "red").save(path)
+        return ImageResult(
+            path=path,
+            prompt=request.prompt,
+            provider=ImageProviderId.openai,
+            revised_prompt=None,
+            model=None,
+            metadata=dict(request.metadata),
+        )
+
+    def generate_images(self, requests: Sequence[ImageRequest]) -> list[ImageResult]:
+        return [self.generate_image(request) for request in requests]
+
+
+def test_spec_round_trips_and_rejects_unknown_options() -> None:
+    spec = PostProcessSpec.parse("max=1600, format=webp, thumb.small=128")
+
+    assert spec.format == "WEBP"
+    assert PostProcessSpec.parse(str(spec)) == spec
+    with pytest.raises(ValueError, match="Unknown postprocess option"):
+        PostProcessSpec.parse("width=10")
+    with pytest.raises(ValueError, match="at most 100"):
+        PostProcessSpec.parse("quality=101")
+
+
+def test_client_resizes_reencodes_and_writes_thumbnails(tmp_path: Path) -> None:
+    postprocessor = PostProcessor(max_workers=1)
+    client = ImageClient(
+        provider_name="openai",
+        provider=LargeImageProvider(),
+        postprocessor=postprocessor,
+    )
+    metadata = {
+        "output_dir": str(tmp_path),
+        "postprocess": "max=100,format=webp,thumb.small=20",
+    }
+    try:
+        result = client.generate(ImageRequest(prompt="apple", metadata=metadata))
+    finally:
+        postprocessor.close()
+
+    assert result.path.suffix == ".webp"
+    assert not result.path.with_suffix(".png").exists()
+    assert (result.metadata["image_width"], result.metadata["image_height"]) == (
+        "100",
+        "50",
+    )
+    assert result.metadata["variant_small_size"] == "20x10"
+    with Image.open(result.metadata["variant_small"]) as thumbnail:
+        assert thumbnail.format == "WEBP"
+    assert "timing_postprocess_ms" in result.metadata
+
+
+def test_cache_hits_are_not_processed_again(tmp_path: Path) -> None:
+    class RecordingPostProcessor(PostProcessor):
+        def __init__(self) -> None:
+            super().__init__(max_workers=1)
+            self.specs: list[PostProcessSpec] = []
+
+        def process(self, result: ImageResult, spec: PostProcessSpec) -> ImageResult:
+            self.specs.append(spec)
+            return super().process(result, spec)
+
+    postprocessor = RecordingPostProcessor()
+    client = ImageClient(
+        provider_name="openai",
+        provider=LargeImageProvider(),
+        result_cache=ResultCache(tmp_path / "cache"),
+        postprocessor=postprocessor,
+    )
+    results: list[ImageResult] = []
+    try:
+        for deck in ("a", "b"):
+            metadata = {
+                "output_dir": str(tmp_path / deck),
+                "postprocess": "max=100,format=webp",
+            }
+            request = ImageRequest(prompt="apple", metadata=metadata)
+            results.append(client.generate(request))
+    finally:
+        postprocessor.close()
+
+    assert len(postprocessor.specs) == 1
+    assert results[1].metadata["cache"] == "hit"
+    assert results[1].path.suffix == ".webp"
@@ -0,0 +1,459 @@
+from __future__ import annotations
+
+import asyncio
+import base64
+import io
+import json
+import threading
+import time
+from collections.abc import Iterator, Sequence
+from typing import TYPE_CHECKING, Any
+
+import httpx
+import pytest
+from langlearn_types import ImageProviderId, ImageRequest, ImageResult
+from openai import OpenAI
+
+from langlearn_imagegen.blobs import BlobStore
+from langlearn_imagegen.providers import (
+    PROVIDER_REGISTRY,
+    get_provider,
+    get_rate_limiter,
+    invalidate_provider_cache,
+    routed,
+)
+from langlearn_imagegen.providers.openai import OpenAIProvider
+from langlearn_imagegen.providers.openai_batch import DeferredBatch
+from langlearn_imagegen.providers.pexels import PexelsProvider
+from langlearn_imagegen.ratelimit import RateLimiter, parse_rate
+from langlearn_imagegen.transport import download_to_file
+from langlearn_imagegen.utils import iter_b64decode, resolve_output_path
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+
+class ClosingProvider:
+    def __init__(self) -> None:
+        self.closed = False
+
+    def close(self) -> None:
+        self.closed = True
+
+
+@pytest.fixture
+def closing_provider(monkeypatch: pytest.MonkeyPatch) -> Iterator[None]:
+    def factory(**_: object) -> ClosingProvider:
+        return ClosingProvider()
+
+    monkeypatch.setitem(PROVIDER_REGISTRY, "fake", factory)
+    invalidate_provider_cache("fake")
+    yield
+    invalidate_provider_cache("fake")
+
+
+@pytest.mark.usefixtures("closing_provider")
+def test_get_provider_caches_by_options() -> None:
+    first = get_provider("fake", cache=True, model="a", api_key="k1")
+    assert get_provider("fake", cache=True, model="a", api_key="k1") is first
+    assert get_provider("fake", cache=True, model="b", api_key="k1") is not first
+    assert get_provider("fake", cache=True, model="a", api_key="k2") is not first
+    assert get_provider("fake", model="a", api_key="k1") is not first
+
+    assert invalidate_provider_cache("fake") == 3
+    assert isinstance(first, ClosingProvider)
+    assert first.closed
+    assert get_provider("fake", cache=True, model="a", api_key="k1") is not first
+
+
+def test_async_pool_replaced_on_new_loop_is_closed() -> None:
+    provider = OpenAIProvider(api_key="test", base_url="http://openai.test/v1")
+
+    async def pool() -> httpx.AsyncClient:
+        http = provider._ahttp()  # pyright: ignore[reportPrivateUsage]
+        await asyncio.sleep(0)
+        return http
+
+    first = asyncio.run(pool())
+    second = asyncio.run(pool())
+
+    assert second is not first
+    assert first.is_closed
+    provider.close()
+    assert second.is_closed
+
+
+class GatedProvider:
+    def __init__(self, gate: threading.Event | None = None) -> None:
+        self.gate = gate
+
+    def generate_image(self, request: ImageRequest) -> ImageResult:
+        if self.gate is not None:
+            self.gate.wait(5)
+        path = resolve_output_path(request.prompt, "openai", request.metadata, "png")
+        path.write_bytes(b"image")
+        return ImageResult(
+            path=path,
+            prompt=request.prompt,
+            provider=ImageProviderId.openai,
+            revised_prompt=None,
+            model=None,
+            metadata=dict(request.metadata),
+        )
+
+    def generate_images(self, requests: Sequence[ImageRequest]) -> list[ImageResult]:
+        return [self.generate_image(request) for request in requests]
+
+
+def test_routed_provider_hedges_slow_members_and_prefers_fast_ones(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    gate = threading.Event()
+    monkeypatch.setattr(routed, "_windows", {})
+
+    def slow_factory(**_: object) -> GatedProvider:
+        return GatedProvider(gate)
+
+    monkeypatch.setitem(PROVIDER_REGISTRY, "slow", slow_factory)
+
+    def fast_factory(**_: object) -> GatedProvider:
+        return GatedProvider()
+
+    monkeypatch.setitem(PROVIDER_REGISTRY, "fast", fast_factory)
+    invalidate_provider_cache()
+    provider = routed.RoutedProvider(["slow", "fast"], hedge=True, hedge_delay=0.05)
+    target = tmp_path / "apple.png"
+    request = ImageRequest(prompt="apple", metadata={"output_path": str(target)})
+    try:
+        result = provider.generate_image(request)
+        assert result.path == target
+        assert target.read_bytes() == b"image"
+        assert result.metadata["routed_to"] == "fast"
+        assert result.metadata["route_hedged"] == "true"
+        assert result.metadata["output_path"] == str(target)
+
+        # The abandoned attempt finishes later and cleans up after itself.
+        gate.set()
+        deadline = time.monotonic() + 5
+        while routed.routing_status().get("slow", {}).get("samples") != 1:
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+        time.sleep(0.05)
+        assert sorted(path.name for path in tmp_path.iterdir()) == ["apple.png"]
+        assert provider.ranked() == ["fast", "slow"]
+    finally:
+        provider.close()
+        invalidate_provider_cache()
+
+
+class AsyncGatedProvider(GatedProvider):
+    """Writes its staged file at once, then holds it until ``gate`` is set."""
+
+    async def agenerate_image(self, request: ImageRequest) -> ImageResult:
+        path = resolve_output_path(request.prompt, "openai", request.metadata, "png")
+        path.write_bytes(b"partial")
+        if self.gate is not None:
+            await asyncio.sleep(5)
+        return self.generate_image(request)
+
+    async def agenerate_images(
+        self, requests: Sequence[ImageRequest]
+    ) -> list[ImageResult]:
+        return [await self.agenerate_image(request) for request in requests]
+
+
+def test_routed_async_hedge_cleans_up_losers(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(routed, "_windows", {})
+
+    def slow_factory(**_: object) -> AsyncGatedProvider:
+        return AsyncGatedProvider(threading.Event())
+
+    monkeypatch.setitem(PROVIDER_REGISTRY, "slow", slow_factory)
+
+    def fast_factory(**_: object) -> AsyncGatedProvider:
+        return AsyncGatedProvider()
+
+    monkeypatch.setitem(PROVIDER_REGISTRY, "fast", fast_factory)
+    invalidate_provider_cache()
+    provider = routed.RoutedProvider(["slow", "fast"], hedge=True, hedge_delay=0.05)
+    target = tmp_path / "apple.png"
+    request = ImageRequest(prompt="apple", metadata={"output_path": str(target)})
+    try:
+        result = asyncio.run(provider.agenerate_image(request))
+
+        assert result.metadata["routed_to"] == "fast"
+        assert sorted(path.name for path in tmp_path.iterdir()) == ["apple.png"]
+        # The cancelled loser did not finish, so it leaves no latency sample.
+        assert routed.routing_status().get("slow", {}).get("samples", 0) == 0
+    finally:
+        provider.close()
+        invalidate_provider_cache()
+
+
+def test_pexels_reuses_one_search_for_alternatives(tmp_path: Path) -> None:
+    searches: list[int] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.host == "api.pexels.com":
+            per_page = int(request.url.params["per_page"])
+            searches.append(per_page)
+            photos = [
+                {"id": i, "src": {"original": f"https://images.pexels.com/{i}.jpeg"}}
+                for i in range(per_page)
+            ]
+            return httpx.Response(200, json={"photos": photos})
+        return httpx.Response(200, content=request.url.path.encode())
+
+    provider = PexelsProvider(api_key="test", search_per_page=10)
+    client = httpx.Client(transport=httpx.MockTransport(handler))
+    provider._http = client  # pyright: ignore[reportPrivateUsage]
+    metadata = {"output_dir": str(tmp_path)}
+
+    first = provider.generate_image(ImageRequest(prompt="cat", metadata=metadata))
+    third = provider.generate_image(
+        ImageRequest(prompt="cat", metadata={**metadata, "pexels_index": "2"})
+    )
+    candidates = provider.generate_candidates(
+        ImageRequest(prompt="cat", metadata=metadata), 5
+    )
+
+    assert searches == [10]
+    assert first.metadata["pexels_id"] == "0"
+    assert third.metadata["pexels_id"] == "2"
+    assert [c.metadata["pexels_candidate"] for c in candidates] == list("01234")
+    assert candidates[4].path.read_bytes() == b"/4.jpeg"
+
+
+def test_pexels_blob_store_downloads_each_photo_once(tmp_path: Path) -> None:
+    downloads: list[str] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.host == "api.pexels.com":
+            photo = {"id": 7, "src": {"original": "https://images.pexels.com/7.jpeg"}}
+            return httpx.Response(200, json={"photos": [photo]})
+        downloads.append(request.url.path)
+        return httpx.Response(200, content=b"jpeg bytes")
+
+    provider = PexelsProvider(api_key="test", blob_store=BlobStore(tmp_path / "blobs"))
+    provider._http = httpx.Client(  # pyright: ignore[reportPrivateUsage]
+        transport=httpx.MockTransport(handler)
+    )
+
+    first, second = (
+        provider.generate_image(
+            ImageRequest(prompt="cat", metadata={"output_dir": str(tmp_path / name)})
+        )
+        for name in ("a", "b")
+    )
+
+    assert downloads == ["/7.jpeg"]
+    assert first.metadata["blob_reused"] == "false"
+    assert second.metadata["blob_reused"] == "true"
+    assert first.metadata["blob_sha256"] == second.metadata["blob_sha256"]
+    assert second.path.read_bytes() == b"jpeg bytes"
+    if second.metadata["blob_link"] == "hardlink":
+        assert first.path.samefile(second.path)
+
+
+def test_pexels_skips_hits_that_duplicate_the_deck(tmp_path: Path) -> None:
+    np = pytest.importorskip("numpy")
+    image = pytest.importorskip("PIL.Image")
+    from langlearn_imagegen.phash import PerceptualIndex
+
+    def picture(seed: int, width: int) -> bytes:
+        noise = np.random.default_rng(seed).integers(0, 255, (8, 9), dtype=np.uint8)
+        resized = image.fromarray(noise).resize((width, width * 8 // 9))
+        buffer = io.BytesIO()
+        resized.convert("RGB").save(buffer, "JPEG")
+        return buffer.getvalue()
+
+    # Hits 0 and 1 are the same picture at different sizes; hit 2 differs.
+    pictures = {"0": picture(1, 900), "1": picture(1, 450), "2": picture(2, 900)}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.host == "api.pexels.com":
+            per_page = int(request.url.params["per_page"])
+            photos = [
+                {
+                    "id": int(key),
+                    "src": {
+                        "original": f"https://images.pexels.com/{key}.jpeg",
+                        "small": f"https://images.pexels.com/{key}.jpeg?h=130",
+                    },
+                }
+                for key in pictures
+            ]
+            return httpx.Response(200, json={"photos": photos[:per_page]})
+        return httpx.Response(200, content=pictures[request.url.path[1:2]])
+
+    deck = tmp_path / "kitten.jpeg"
+    deck.write_bytes(picture(1, 180))
+    index = PerceptualIndex(tmp_path / "phash.txt")
+    index.add(deck)
+    provider = PexelsProvider(api_key="test", perceptual_index=index)
+    provider._http = httpx.Client(  # pyright: ignore[reportPrivateUsage]
+        transport=httpx.MockTransport(handler)
+    )
+
+    result = provider.generate_image(
+        ImageRequest(prompt="cat", metadata={"output_dir": str(tmp_path)})
+    )
+
+    assert result.metadata["pexels_id"] == "2"
+    assert result.metadata["phash_skipped"] == "2"
+    assert index.find_duplicate(index.add(result.path), exclude=result.path) is None
+    index.close()
+    assert len(PerceptualIndex(tmp_path / "phash.txt")) == 2
+
+
+def test_openai_candidates_respect_the_per_call_image_limit(tmp_path: Path) -> None:
+    image = {"b64_json": base64.b64encode(b"png").decode()}
+    calls: list[int] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.read())
+        if body["model"] == "dall-e-3" and body.get("n", 1) != 1:
+            return httpx.Response(400, json={"error": {"message": "n must be 1"}})
+        calls.append(body.get("n", 1))
+        return httpx.Response(200, json={"data": [image] * calls[-1]})
+
+    def provider(model: str) -> OpenAIProvider:
+        built = OpenAIProvider(
+            api_key="test", base_url="http://openai.test/v1", model=model
+        )
+        built._client = OpenAI(  # pyright: ignore[reportPrivateUsage]
+            api_key="test",
+            base_url="http://openai.test/v1",
+            http_client=httpx.Client(transport=httpx.MockTransport(handler)),
+        )
+        return built
+
+    request = ImageRequest(prompt="apple", metadata={"output_dir": str(tmp_path)})
+
+    candidates = list(provider("dall-e-3").iter_candidates(request, 3))
+    assert calls == [1, 1, 1]
+    assert len({candidate.path for candidate in candidates}) == 3
+
+    calls.clear()
+    candidates = list(provider("gpt-image-1.5").iter_candidates(request, 12))
+    assert calls == [10, 2]
+    assert len({candidate.path for candidate in candidates}) == 12
+
+
+def test_openai_groups_requests_and_collects_deferred_batches(
+    tmp_path: Path,
+) -> None:
+    image = {"b64_json": base64.b64encode(b"png").decode()}
+    calls: list[int] = []
+    batch_lines: list[dict[str, Any]] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        path = request.url.path
+        if path == "/v1/images/generations":
+            calls.append(json.loads(request.read()).get("n", 1))
+            return httpx.Response(200, json={"data": [image] * calls[-1]})
+        if path == "/v1/files":
+            body = request.read().decode()
+            batch_lines.extend(
+                json.loads(line) for line in body.splitlines() if line.startswith("{")
+            )
+            return httpx.Response(200, json={"id": "file-in", "object": "file"})
+        if path.startswith("/v1/batches"):
+            batch = {"id": "b1", "status": "completed", "output_file_id": "file-out"}
+            return httpx.Response(200, json=batch)
+        output = [
+            {
+                "custom_id": line["custom_id"],
+                "response": {
+                    "status_code": 200,
+                    "body": {"data": [image] * line["body"]["n"]},
+                },
+            }
+            for line in batch_lines
+        ]
+        return httpx.Response(200, text="\n".join(map(json.dumps, output)))
+
+    provider = OpenAIProvider(api_key="test", base_url="http://openai.test/v1")
+    provider._client = OpenAI(  # pyright: ignore[reportPrivateUsage]
+        api_key="test",
+        base_url="http://openai.test/v1",
+        http_client=httpx.Client(transport=httpx.MockTransport(handler)),
+    )
+    requests = [
+        ImageRequest(
+            prompt="apple", metadata={"output_dir": str(tmp_path), "filename": name}
+        )
+        for name in ("a.png", "b.png", "c.png", "a.png")
+    ]
+    requests.append(ImageRequest(prompt="pear", metadata={"output_dir": str(tmp_path)}))
+
+    results = provider.generate_images(requests)
+
+    assert calls == [3, 1]
+    assert [result.path.name for result in results[:4]] == [
+        "a.png",
+        "b.png",
+        "c.png",
+        "a.png",
+    ]
+    assert results[0].metadata["openai_n"] == "3"
+    assert results[3].metadata["coalesced"] == "true"
+
+    job = provider.submit_deferred(requests)
+    job.save(tmp_path / "job.json")
+    outcomes = provider.collect_deferred(DeferredBatch.load(tmp_path / "job.json"))
+
+    assert [line["body"]["n"] for line in batch_lines] == [3, 1]
+    assert not any(isinstance(outcome, Exception) for outcome in outcomes)
+    assert (tmp_path / "b.png").read_bytes() == b"png"
+
+
+def test_rate_limiter_honours_retry_after_and_quota_headers() -> None:
+    assert parse_rate("200/hour") == (200 / 3600, 200)
+
+    limiter = RateLimiter(rate=10.0, burst=10)
+    limiter.observe(200, {"X-Ratelimit-Limit": "200", "X-Ratelimit-Remaining": "7"})
+    limiter.observe(429, {"Retry-After": "30"})
+
+    snapshot = limiter.snapshot()
+    assert snapshot["limit"] == 200
+    assert snapshot["remaining"] == 7
+    assert snapshot["throttled_responses"] == 1
+    paused = snapshot["paused_for_seconds"]
+    assert isinstance(paused, float)
+    assert 29 < paused <= 30
+
+
+def test_rate_limiters_are_per_api_key(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setenv("PEXELS_API_KEY", "env-key")
+
+    default = get_rate_limiter("pexels")
+    assert default is not None
+    assert get_rate_limiter("pexels", "env-key") is default
+    assert get_rate_limiter("pexels", "other-key") is not default
+
+
+def test_streamed_writes_decode_in_chunks_and_never_leave_partials(
+    tmp_path: Path,
+) -> None:
+    data = bytes(range(256)) * 41
+    chunks = list(iter_b64decode(base64.b64encode(data).decode(), chunk_size=300))
+    assert len(chunks) > 1
+    assert b"".join(chunks) == data
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/missing.jpg":
+            return httpx.Response(404)
+        return httpx.Response(200, content=data)
+
+    client = httpx.Client(transport=httpx.MockTransport(handler))
+    target = tmp_path / "image.jpg"
+    assert download_to_file(client, "https://img.test/ok.jpg", target) == len(data)
+    assert target.read_bytes() == data
+
+    with pytest.raises(httpx.HTTPStatusError):
+        download_to_file(client, "https://img.test/missing.jpg", target)
+    assert target.read_bytes() == data
+    assert [p.name for p in tmp_path.iterdir()] == ["image.jpg"]
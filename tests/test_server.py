@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import asyncio
+import json
+from collections.abc import Sequence
+from pathlib import Path
+from typing import cast
+
+import pytest
+from langlearn_types import ImageProviderId, ImageRequest, ImageResult
+from mcp.shared.memory import create_connected_server_and_client_session
+
+from langlearn_imagegen.providers import PROVIDER_REGISTRY, invalidate_provider_cache
+from langlearn_imagegen.server import mcp
+
+
+class EchoProvider:
+    def generate_image(self, request: ImageRequest) -> ImageResult:
+        if request.prompt == "bad":
+            raise RuntimeError("boom")
+        return ImageResult(
+            path=Path(f"{request.prompt}.png"),
+            prompt=request.prompt,
+            provider=ImageProviderId.openai,
+            revised_prompt=None,
+            model=None,
+            metadata=dict(request.metadata),
+        )
+
+    def generate_images(self, requests: Sequence[ImageRequest]) -> list[ImageResult]:
+        return [self.generate_image(request) for request in requests]
+
+
+@pytest.fixture(autouse=True)
+def echo_provider(monkeypatch: pytest.MonkeyPatch) -> None:
+    def factory(**_: object) -> EchoProvider:
+        return EchoProvider()
+
+    monkeypatch.setitem(PROVIDER_REGISTRY, "openai", factory)
+    monkeypatch.delenv("LANGLEARN_IMAGEGEN_CACHE_DIR", raising=False)
+    invalidate_provider_cache("openai")
+
+
+def _payload(result: object) -> dict[str, object]:
+    content = getattr(result, "content", [])
+    loaded: dict[str, object] = json.loads(content[0].text)
+    return loaded
+
+
+def test_generate_images_reports_progress_and_per_item_errors() -> None:
+    updates: list[float] = []
+    requests = [
+        {"prompt": prompt, "provider": "openai"} for prompt in ("a", "bad", "c")
+    ]
+    requests.append({"prompt": "d", "provider": "unknown"})
+
+    async def scenario() -> dict[str, object]:
+        async def on_progress(
+            progress: float, total: float | None, message: str | None
+        ) -> None:
+            updates.append(progress)
+
+        async with create_connected_server_and_client_session(mcp) as session:
+            result = await session.call_tool(
+                "generate_images",
+                {"requests": requests},
+                progress_callback=on_progress,
+            )
+        return _payload(result)
+
+    payload = asyncio.run(scenario())
+
+    assert payload["total"] == 4
+    assert payload["failed"] == 2
+    items = cast("list[dict[str, object]]", payload["items"])
+    assert [item["ok"] for item in items] == [True, False, True, False]
+    assert items[1]["error"] == "boom"
+    assert "unknown" in str(items[3]["error"])
+    assert sorted(updates) == [2, 3, 4]
+
+
+def test_submit_batch_then_poll_status() -> None:
+    async def scenario() -> dict[str, object]:
+        async with create_connected_server_and_client_session(mcp) as session:
+            submitted = _payload(
+                await session.call_tool(
+                    "submit_batch",
+                    {"requests": [{"prompt": "x", "provider": "openai"}]},
+                )
+            )
+            for _ in range(100):
+                status = _payload(
+                    await session.call_tool(
+                        "batch_status", {"job_id": submitted["job_id"]}
+                    )
+                )
+                if status["status"] != "running":
+                    return status
+                await asyncio.sleep(0.01)
+        raise AssertionError("batch did not finish")
+
+    status = asyncio.run(scenario())
+
+    assert status["status"] == "completed"
+    assert status["completed"] == 1
+    assert status["failed"] == 0
@@ -1,7 +1,33 @@
 from __future__ import annotations
 
+import subprocess
+import sys
+
 from langlearn_imagegen import __version__
 
 
 def test_version_present() -> None:
     assert __version__
+
+
+# Modules the fast CLI paths must never load.
+HEAVY_MODULES = ("openai", "httpx", "mcp", "asyncio", "PIL")
+
+
+def test_cli_cold_start_stays_light() -> None:
+    # A fresh interpreter, so modules imported by other tests do not count.
+    completed = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import sys, langlearn_imagegen.cli; print(*sys.modules, sep='\\n')",
+        ],
+        capture_output=True,
+        check=True,
+        text=True,
+    )
+
+    modules = completed.stdout.splitlines()
+    assert "langlearn_imagegen.cli" in modules
+    loaded = [name for name in modules if name.split(".")[0] in HEAVY_MODULES]
+    assert loaded == []
@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import re
+from collections.abc import Iterator
+from pathlib import Path
+
+import httpx
+import pytest
+from langlearn_types import ImageRequest
+
+from langlearn_imagegen.providers.pexels import PexelsProvider
+from langlearn_imagegen.storage import MIN_PART_SIZE, MemorySink, S3Sink, write_chunks
+
+
+def test_memory_sink_keeps_images_off_disk(tmp_path: Path) -> None:
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.host == "api.pexels.com":
+            photo = {"id": 7, "src": {"original": "https://images.pexels.com/7.jpeg"}}
+            return httpx.Response(200, json={"photos": [photo]})
+        return httpx.Response(200, content=b"jpeg bytes")
+
+    sink = MemorySink()
+    provider = PexelsProvider(api_key="test", sink=sink)
+    provider._http = httpx.Client(  # pyright: ignore[reportPrivateUsage]
+        transport=httpx.MockTransport(handler)
+    )
+
+    result = provider.generate_image(
+        ImageRequest(prompt="cat", metadata={"output_dir": str(tmp_path / "deck")})
+    )
+
+    assert not (tmp_path / "deck").exists()
+    assert result.metadata["storage"] == "memory"
+    view = sink.read(result.path)
+    assert isinstance(view, memoryview)
+    assert view.readonly
+    assert view.tobytes() == b"jpeg bytes"
+
+
+def test_s3_sink_uploads_large_images_in_parts_and_aborts_failures() -> None:
+    objects: dict[str, bytes] = {}
+    uploads: dict[str, dict[int, bytes]] = {}
+    calls: list[str] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        assert request.headers["authorization"].startswith(
+            "AWS4-HMAC-SHA256 Credential=key/"
+        )
+        key = request.url.path.removeprefix("/")
+        params = request.url.params
+        calls.append(f"{request.method} {'&'.join(sorted(params))}")
+        if request.method == "POST" and "uploads" in params:
+            uploads["u1"] = {}
+            body = "<InitiateMultipartUploadResult><UploadId>u1</UploadId>"
+            return httpx.Response(200, text=body + "</InitiateMultipartUploadResult>")
+        if request.method == "PUT" and "uploadId" in params:
+            parts = uploads[params["uploadId"]]
+            parts[int(params["partNumber"])] = request.read()
+            return httpx.Response(200, headers={"ETag": f'"{len(parts)}"'})
+        if request.method == "POST":
+            numbers = re.findall(
+                r"<PartNumber>(\d+)</PartNumber>", request.read().decode()
+            )
+            parts = uploads.pop(params["uploadId"])
+            objects[key] = b"".join(parts[int(number)] for number in numbers)
+            return httpx.Response(200, text="<CompleteMultipartUploadResult/>")
+        if request.method == "DELETE":
+            uploads.pop(params["uploadId"])
+            return httpx.Response(204)
+        objects[key] = request.read()
+        return httpx.Response(200)
+
+    sink = S3Sink(
+        "bucket",
+        "deck",
+        endpoint="https://s3.test",
+        access_key="key",
+        secret_key="secret",
+        part_size=MIN_PART_SIZE,
+    )
+    sink._http = httpx.Client(  # pyright: ignore[reportPrivateUsage]
+        transport=httpx.MockTransport(handler)
+    )
+    chunk = b"x" * (1024 * 1024)
+
+    write_chunks(sink, Path("small.png"), [b"png"])
+    write_chunks(sink, Path("large.png"), [chunk] * 11)
+
+    def failing() -> Iterator[bytes]:
+        yield from [chunk] * 6
+        raise ConnectionError("download dropped")
+
+    with pytest.raises(ConnectionError):
+        write_chunks(sink, Path("broken.png"), failing())
+
+    assert objects == {
+        "bucket/deck/small.png": b"png",
+        "bucket/deck/large.png": chunk * 11,
+    }
+    assert uploads == {}
+    assert calls.count("PUT partNumber&uploadId") == 4
+    assert calls[-1] == "DELETE uploadId"
+    assert sink.uri(Path("large.png")) == "s3://bucket/deck/large.png"